@@ -0,0 +1,411 @@
+""" Per-packet cost of the Titan and VMX codecs against the previous hand-written encoding.
+    Runs without hardware from the repository root: python -m benchmarks.bench_codecs """
+import random
+import struct
+import timeit
+from types import SimpleNamespace
+
+import numpy
+from funcad.funcad import Funcad
+
+from robocad.internal.common.packet_codec import StudicaTitanCodec, AlgaritmTitanCodec, StudicaVmxCodec, \
+    AlgaritmVmxCodec, get_normal_diff
+
+
+NUMBER = 20000
+
+
+# previous implementations, kept here as the reference
+
+class LegacyStudicaTitan:
+    def __init__(self, robot_internal):
+        self.robot_internal = robot_internal
+
+    def set_up_rx_data(self, data: bytearray) -> None:
+        if data[42] != 33:
+            if data[0] == 1:
+                if data[24] == 111:
+                    raw_enc_0: int = (data[2] & 0xff) << 8 | (data[1] & 0xff)
+                    raw_enc_1: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
+                    raw_enc_2: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
+                    raw_enc_3: int = (data[8] & 0xff) << 8 | (data[7] & 0xff)
+                    self.set_up_encoders(raw_enc_0, raw_enc_1, raw_enc_2, raw_enc_3)
+
+                    self.robot_internal.limit_l_0 = Funcad.access_bit(data[9], 1)
+                    self.robot_internal.limit_h_0 = Funcad.access_bit(data[9], 2)
+                    self.robot_internal.limit_l_1 = Funcad.access_bit(data[9], 3)
+                    self.robot_internal.limit_h_1 = Funcad.access_bit(data[9], 4)
+                    self.robot_internal.limit_l_2 = Funcad.access_bit(data[9], 5)
+                    self.robot_internal.limit_h_2 = Funcad.access_bit(data[9], 6)
+                    self.robot_internal.limit_l_3 = Funcad.access_bit(data[10], 1)
+                    self.robot_internal.limit_h_3 = Funcad.access_bit(data[10], 2)
+
+    def set_up_tx_data(self) -> bytearray:
+        tx_data: bytearray = bytearray([0] * 48)
+        tx_data[0] = 1
+
+        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.robot_internal.speed_motor_0 / 100 * 65535)))
+        tx_data[2] = motor_speeds[2]
+        tx_data[3] = motor_speeds[3]
+
+        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.robot_internal.speed_motor_1 / 100 * 65535)))
+        tx_data[4] = motor_speeds[2]
+        tx_data[5] = motor_speeds[3]
+
+        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.robot_internal.speed_motor_2 / 100 * 65535)))
+        tx_data[6] = motor_speeds[2]
+        tx_data[7] = motor_speeds[3]
+
+        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.robot_internal.speed_motor_3 / 100 * 65535)))
+        tx_data[8] = motor_speeds[2]
+        tx_data[9] = motor_speeds[3]
+
+        tx_data[10] = int('1' + ("1" if self.robot_internal.speed_motor_0 >= 0 else "0") +
+                                ("1" if self.robot_internal.speed_motor_1 >= 0 else "0") +
+                                ("1" if self.robot_internal.speed_motor_2 >= 0 else "0") +
+                                ("1" if self.robot_internal.speed_motor_3 >= 0 else "0") + '001', 2)
+
+        # third bit is for ProgramIsRunning
+        tx_data[11] = int('1' + '0100001', 2)
+
+        tx_data[20] = 222
+
+        return tx_data
+
+    def set_up_encoders(self, enc_0: int, enc_1: int, enc_2: int, enc_3: int) -> None:
+        self.robot_internal.enc_motor_0 -= get_normal_diff(enc_0, self.robot_internal.raw_enc_motor_0)
+        self.robot_internal.enc_motor_1 -= get_normal_diff(enc_1, self.robot_internal.raw_enc_motor_1)
+        self.robot_internal.enc_motor_2 -= get_normal_diff(enc_2, self.robot_internal.raw_enc_motor_2)
+        self.robot_internal.enc_motor_3 -= get_normal_diff(enc_3, self.robot_internal.raw_enc_motor_3)
+
+        self.robot_internal.raw_enc_motor_0 = enc_0
+        self.robot_internal.raw_enc_motor_1 = enc_1
+        self.robot_internal.raw_enc_motor_2 = enc_2
+        self.robot_internal.raw_enc_motor_3 = enc_3
+
+
+class LegacyAlgaritmTitan:
+    def __init__(self, robot_internal):
+        self.robot_internal = robot_internal
+
+    def set_up_rx_data(self, data: bytearray) -> None:
+        if data[0] == 1:
+            if data[40] == 222:
+                self.robot_internal.enc_motor_0 = ((data[4] & 0xff) << 24) | ((data[3] & 0xff) << 16) | ((data[2] & 0xff) << 8) | (data[1] & 0xff)
+                self.robot_internal.enc_motor_1 = ((data[8] & 0xff) << 24) | ((data[7] & 0xff) << 16) | ((data[6] & 0xff) << 8) | (data[5] & 0xff)
+                self.robot_internal.enc_motor_2 = ((data[12] & 0xff) << 24) | ((data[11] & 0xff) << 16) | ((data[10] & 0xff) << 8) | (data[9] & 0xff)
+                self.robot_internal.enc_motor_3 = ((data[16] & 0xff) << 24) | ((data[15] & 0xff) << 16) | ((data[14] & 0xff) << 8) | (data[13] & 0xff)
+
+                self.robot_internal.limit_l_0 = Funcad.access_bit(data[17], 7)
+                self.robot_internal.limit_h_0 = Funcad.access_bit(data[17], 6)
+                self.robot_internal.limit_l_1 = Funcad.access_bit(data[17], 5)
+                self.robot_internal.limit_h_1 = Funcad.access_bit(data[17], 4)
+                self.robot_internal.limit_l_2 = Funcad.access_bit(data[17], 3)
+                self.robot_internal.limit_h_2 = Funcad.access_bit(data[17], 2)
+                self.robot_internal.limit_l_3 = Funcad.access_bit(data[17], 1)
+                self.robot_internal.limit_h_3 = Funcad.access_bit(data[17], 0)
+
+                self.robot_internal.is_step_1_busy = (data[18] != 0)
+                self.robot_internal.is_step_2_busy = (data[19] != 0)
+
+    def set_up_tx_data(self) -> bytearray:
+        tx_data: bytearray = bytearray([0] * 48)
+        tx_data[0] = 1
+
+        tx_data[1] = int(numpy.clip(self.robot_internal.speed_motor_0, -100, 100)).to_bytes(1, 'big', signed = True)[0]
+        tx_data[2] = int(numpy.clip(self.robot_internal.speed_motor_1, -100, 100)).to_bytes(1, 'big', signed = True)[0]
+        tx_data[3] = int(numpy.clip(self.robot_internal.speed_motor_2, -100, 100)).to_bytes(1, 'big', signed = True)[0]
+        tx_data[4] = int(numpy.clip(self.robot_internal.speed_motor_3, -100, 100)).to_bytes(1, 'big', signed = True)[0]
+
+        # for ProgramIsRunning and directions
+        tx_data[5] = int('11' +
+                        ("1" if self.robot_internal.step_motor_1_direction else "0") +
+                        ("1" if self.robot_internal.step_motor_2_direction else "0") +
+                        ("1" if self.robot_internal.use_pid else "0") + '001', 2)
+
+        tx_data[6] = int(self.robot_internal.additional_servo_1)
+        tx_data[7] = int(self.robot_internal.additional_servo_2)
+
+        step1_steps: bytearray = Funcad.int_to_4_bytes(abs(self.robot_internal.step_motor_1_steps))
+        tx_data[8] = step1_steps[0]
+        tx_data[9] = step1_steps[1]
+        tx_data[10] = step1_steps[2]
+        tx_data[11] = step1_steps[3]
+        step2_steps: bytearray = Funcad.int_to_4_bytes(abs(self.robot_internal.step_motor_2_steps))
+        tx_data[12] = step2_steps[0]
+        tx_data[13] = step2_steps[1]
+        tx_data[14] = step2_steps[2]
+        tx_data[15] = step2_steps[3]
+
+        step1_steps_ps: bytearray = Funcad.int_to_4_bytes(abs(self.robot_internal.step_motor_1_steps_per_s))
+        tx_data[16] = step1_steps_ps[0]
+        tx_data[17] = step1_steps_ps[1]
+        tx_data[18] = step1_steps_ps[2]
+        tx_data[19] = step1_steps_ps[3]
+        step2_steps_ps: bytearray = Funcad.int_to_4_bytes(abs(self.robot_internal.step_motor_2_steps_per_s))
+        tx_data[20] = step2_steps_ps[0]
+        tx_data[21] = step2_steps_ps[1]
+        tx_data[22] = step2_steps_ps[2]
+        tx_data[23] = step2_steps_ps[3]
+
+        packed_p = struct.pack('<f', self.robot_internal.p_pid)
+        tx_data[24] = packed_p[0]
+        tx_data[25] = packed_p[1]
+        tx_data[26] = packed_p[2]
+        tx_data[27] = packed_p[3]
+        packed_i = struct.pack('<f', self.robot_internal.i_pid)
+        tx_data[28] = packed_i[0]
+        tx_data[29] = packed_i[1]
+        tx_data[30] = packed_i[2]
+        tx_data[31] = packed_i[3]
+        packed_d = struct.pack('<f', self.robot_internal.d_pid)
+        tx_data[32] = packed_d[0]
+        tx_data[33] = packed_d[1]
+        tx_data[34] = packed_d[2]
+        tx_data[35] = packed_d[3]
+
+        tx_data[40] = 222
+
+        return tx_data
+
+
+class LegacyStudicaVmx:
+    def __init__(self, robot_internal, robot):
+        self.robot_internal = robot_internal
+        self.robot = robot
+        self.toggler = 0
+
+    def set_up_rx_data(self, data: bytearray) -> None:
+        if data[0] == 1:
+            yaw_ui: int = (data[2] & 0xff) << 8 | (data[1] & 0xff)
+            us1_ui: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
+            self.robot_internal.ultrasound_1 = us1_ui / 100
+            us2_ui: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
+            self.robot_internal.ultrasound_2 = us2_ui / 100
+
+            power: float = ((data[8] & 0xff) << 8 | (data[7] & 0xff)) / 100
+            self.robot.power = power
+
+            # calc yaw unlim
+            new_yaw = (yaw_ui / 100) * (1 if Funcad.access_bit(data[9], 1) else -1)
+            self.calc_yaw_unlim(new_yaw, self.robot_internal.yaw)
+            self.robot_internal.yaw = new_yaw
+
+            self.robot_internal.flex_0 = Funcad.access_bit(data[9], 2)
+            self.robot_internal.flex_1 = Funcad.access_bit(data[9], 3)
+            self.robot_internal.flex_2 = Funcad.access_bit(data[9], 4)
+            self.robot_internal.flex_3 = Funcad.access_bit(data[9], 5)
+            self.robot_internal.flex_4 = Funcad.access_bit(data[9], 6)
+        elif data[0] == 2:
+            self.robot_internal.analog_1 = (data[2] & 0xff) << 8 | (data[1] & 0xff)
+            self.robot_internal.analog_2 = (data[4] & 0xff) << 8 | (data[3] & 0xff)
+            self.robot_internal.analog_3 = (data[6] & 0xff) << 8 | (data[5] & 0xff)
+            self.robot_internal.analog_4 = (data[8] & 0xff) << 8 | (data[7] & 0xff)
+
+            self.robot_internal.flex_5 = Funcad.access_bit(data[9], 1)
+            self.robot_internal.flex_6 = Funcad.access_bit(data[9], 2)
+            self.robot_internal.flex_7 = Funcad.access_bit(data[9], 3)
+
+    def set_up_tx_data(self) -> bytearray:
+        tx_list: bytearray = bytearray([0x00] * 10)
+
+        if self.toggler == 0:
+            tx_list[0] = 1
+
+            tx_list[9] = 222
+        return tx_list
+
+    def calc_yaw_unlim(self, new_yaw: float, old_yaw: float):
+        delta_yaw = new_yaw - old_yaw
+        if delta_yaw < -180:
+            delta_yaw = 180 - old_yaw
+            delta_yaw += 180 + new_yaw
+        elif delta_yaw > 180:
+            delta_yaw = (180 + old_yaw) * -1
+            delta_yaw += (180 - new_yaw) * -1
+        self.robot_internal.yaw_unlim += delta_yaw
+
+
+class LegacyAlgaritmVmx:
+    def __init__(self, robot_internal, robot):
+        self.robot_internal = robot_internal
+        self.robot = robot
+        self.toggler = 0
+
+    def set_up_rx_data(self, data: bytearray) -> None:
+        if data[0] == 1:
+            self.robot_internal.analog_1 = (data[2] & 0xff) << 8 | (data[1] & 0xff)
+            self.robot_internal.analog_2 = (data[4] & 0xff) << 8 | (data[3] & 0xff)
+            self.robot_internal.analog_3 = (data[6] & 0xff) << 8 | (data[5] & 0xff)
+            self.robot_internal.analog_4 = (data[8] & 0xff) << 8 | (data[7] & 0xff)
+            self.robot_internal.analog_5 = (data[10] & 0xff) << 8 | (data[9] & 0xff)
+            self.robot_internal.analog_6 = (data[12] & 0xff) << 8 | (data[11] & 0xff)
+            self.robot_internal.analog_7 = (data[14] & 0xff) << 8 | (data[13] & 0xff)
+        elif data[0] == 2:
+            self.robot_internal.analog_8 = (data[2] & 0xff) << 8 | (data[1] & 0xff)
+
+            us1_ui: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
+            self.robot_internal.ultrasound_1 = us1_ui / 100
+            us2_ui: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
+            self.robot_internal.ultrasound_2 = us2_ui / 100
+            us3_ui: int = (data[8] & 0xff) << 8 | (data[7] & 0xff)
+            self.robot_internal.ultrasound_3 = us3_ui / 100
+            us4_ui: int = (data[10] & 0xff) << 8 | (data[9] & 0xff)
+            self.robot_internal.ultrasound_4 = us4_ui / 100
+
+            self.robot_internal.inputs[0] = Funcad.access_bit(data[11], 0) == 1
+            self.robot_internal.inputs[1] = Funcad.access_bit(data[11], 1) == 1
+            self.robot_internal.inputs[2] = Funcad.access_bit(data[11], 2) == 1
+            self.robot_internal.inputs[3] = Funcad.access_bit(data[11], 3) == 1
+        elif data[0] == 3:
+            yaw_ui: int = (data[2] & 0xff) << 8 | (data[1] & 0xff)
+            new_yaw = (yaw_ui / 100) * (1 if Funcad.access_bit(data[7], 1) else -1)
+            self.robot_internal.yaw_unlim += self.calc_angle_unlim(new_yaw, self.robot_internal.yaw)
+            self.robot_internal.yaw = new_yaw
+
+            pitch_ui: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
+            new_pitch = (pitch_ui / 100) * (1 if Funcad.access_bit(data[7], 2) else -1)
+            self.robot_internal.pitch_unlim += self.calc_angle_unlim(new_pitch, self.robot_internal.pitch)
+            self.robot_internal.pitch = new_pitch
+
+            roll_ui: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
+            new_roll = (roll_ui / 100) * (1 if Funcad.access_bit(data[7], 3) else -1)
+            self.robot_internal.roll_unlim += self.calc_angle_unlim(new_roll, self.robot_internal.roll)
+            self.robot_internal.roll = new_roll
+
+            power: float = ((data[9] & 0xff) << 8 | (data[8] & 0xff)) / 100
+            self.robot.power = power
+
+    def set_up_tx_data(self) -> bytearray:
+        tx_list: bytearray = bytearray([0x00] * 16)
+
+        if self.toggler == 0:
+            tx_list[0] = 1
+
+            tx_list[1] = int(self.robot_internal.servo_angles[0])
+            tx_list[2] = int(self.robot_internal.servo_angles[1])
+            tx_list[3] = int(self.robot_internal.servo_angles[2])
+            tx_list[4] = int(self.robot_internal.servo_angles[3])
+            tx_list[5] = int(self.robot_internal.servo_angles[4])
+            tx_list[6] = int(self.robot_internal.servo_angles[5])
+            tx_list[7] = int(self.robot_internal.servo_angles[6])
+            tx_list[8] = int(self.robot_internal.servo_angles[7])
+
+            tx_list[9] = int('1' + ("1" if self.robot_internal.outputs[0] else "0") +
+                                   ("1" if self.robot_internal.outputs[1] else "0") +
+                                   ("1" if self.robot_internal.outputs[2] else "0") +
+                                   ("1" if self.robot_internal.outputs[3] else "0") + '001', 2)
+        return tx_list
+
+    def calc_angle_unlim(self, new_angle: float, old_angle: float) -> float:
+        delta_angle = new_angle - old_angle
+        if delta_angle < -180:
+            delta_angle = 180 - old_angle
+            delta_angle += 180 + new_angle
+        elif delta_angle > 180:
+            delta_angle = (180 + old_angle) * -1
+            delta_angle += (180 - new_angle) * -1
+        return delta_angle
+
+
+def make_internal() -> SimpleNamespace:
+    internal = SimpleNamespace()
+    for i in range(4):
+        setattr(internal, 'speed_motor_%d' % i, random.uniform(-120, 120))
+        setattr(internal, 'enc_motor_%d' % i, 0)
+        setattr(internal, 'raw_enc_motor_%d' % i, 0)
+    internal.step_motor_1_direction = True
+    internal.step_motor_2_direction = False
+    internal.use_pid = True
+    internal.additional_servo_1 = 90.5
+    internal.additional_servo_2 = 12
+    internal.step_motor_1_steps = -1234
+    internal.step_motor_2_steps = 56789
+    internal.step_motor_1_steps_per_s = 300
+    internal.step_motor_2_steps_per_s = -77
+    internal.p_pid, internal.i_pid, internal.d_pid = 0.5, 0.01, 1.25
+    internal.servo_angles = [random.uniform(0, 255) for _ in range(8)]
+    internal.outputs = [True, False, False, True]
+    internal.inputs = [False] * 4
+    internal.ultrasound_1 = internal.ultrasound_2 = internal.ultrasound_3 = internal.ultrasound_4 = 0
+    for name in ('yaw', 'pitch', 'roll'):
+        setattr(internal, name, 0)
+        setattr(internal, name + '_unlim', 0)
+    return internal
+
+
+def values(internal: SimpleNamespace) -> dict:
+    return {k: v for k, v in vars(internal).items() if not k.startswith(('speed', 'step', 'servo', 'outputs'))}
+
+
+def bench(name: str, legacy, current) -> None:
+    before = timeit.timeit(legacy, number=NUMBER) / NUMBER * 1e6
+    after = timeit.timeit(current, number=NUMBER) / NUMBER * 1e6
+    print("%-24s %8.2f us -> %6.2f us  (x%.1f)" % (name, before, after, before / after))
+
+
+def bench_titan() -> None:
+    internal = make_internal()
+    studica, algaritm = StudicaTitanCodec(), AlgaritmTitanCodec()
+    legacy_studica, legacy_algaritm = LegacyStudicaTitan(internal), LegacyAlgaritmTitan(internal)
+    assert studica.encode(internal) == legacy_studica.set_up_tx_data()
+    assert algaritm.encode(internal) == legacy_algaritm.set_up_tx_data()
+
+    rx = bytearray(random.getrandbits(8) for _ in range(48))
+    rx[0], rx[24], rx[40], rx[42] = 1, 111, 222, 0
+    legacy_internal, current_internal = make_internal(), make_internal()
+    legacy_studica.robot_internal = legacy_algaritm.robot_internal = legacy_internal
+    legacy_studica.set_up_rx_data(rx)
+    studica.decode(rx, current_internal)
+    assert values(legacy_internal) == values(current_internal)
+    legacy_algaritm.set_up_rx_data(rx)
+    algaritm.decode(rx, current_internal)
+    assert values(legacy_internal) == values(current_internal)
+    legacy_studica.robot_internal = legacy_algaritm.robot_internal = internal
+
+    bench("studica titan tx", legacy_studica.set_up_tx_data, lambda: studica.encode(internal))
+    bench("studica titan rx", lambda: legacy_studica.set_up_rx_data(rx), lambda: studica.decode(rx, internal))
+    bench("algaritm titan tx", legacy_algaritm.set_up_tx_data, lambda: algaritm.encode(internal))
+    bench("algaritm titan rx", lambda: legacy_algaritm.set_up_rx_data(rx), lambda: algaritm.decode(rx, internal))
+
+
+def vmx_pages(pages: tuple, length: int) -> list:
+    packets = []
+    for page in pages:
+        packet = bytearray(random.getrandbits(8) for _ in range(length))
+        packet[0] = page
+        packets.append(packet)
+    return packets
+
+
+def bench_vmx() -> None:
+    internal, robot = make_internal(), SimpleNamespace(power=0)
+    studica, algaritm = StudicaVmxCodec(), AlgaritmVmxCodec()
+    legacy_studica, legacy_algaritm = LegacyStudicaVmx(internal, robot), LegacyAlgaritmVmx(internal, robot)
+    assert studica.encode(internal) == legacy_studica.set_up_tx_data()
+    assert algaritm.encode(internal) == legacy_algaritm.set_up_tx_data()
+
+    studica_pages, algaritm_pages = vmx_pages((1, 2), 10), vmx_pages((1, 2, 3), 16)
+    legacy_internal, legacy_robot = make_internal(), SimpleNamespace(power=0)
+    current_internal, current_robot = make_internal(), SimpleNamespace(power=0)
+    for legacy, codec, pages in ((LegacyStudicaVmx(legacy_internal, legacy_robot), studica, studica_pages),
+                                 (LegacyAlgaritmVmx(legacy_internal, legacy_robot), algaritm, algaritm_pages)):
+        for packet in pages:
+            legacy.set_up_rx_data(packet)
+            codec.decode(packet, current_internal, current_robot)
+            assert values(legacy_internal) == values(current_internal)
+            assert legacy_robot.power == current_robot.power
+
+    bench("studica vmx tx", legacy_studica.set_up_tx_data, lambda: studica.encode(internal))
+    bench("algaritm vmx tx", legacy_algaritm.set_up_tx_data, lambda: algaritm.encode(internal))
+    for packet in studica_pages:
+        bench("studica vmx rx page %d" % packet[0], lambda: legacy_studica.set_up_rx_data(packet),
+              lambda: studica.decode(packet, internal, robot))
+    for packet in algaritm_pages:
+        bench("algaritm vmx rx page %d" % packet[0], lambda: legacy_algaritm.set_up_rx_data(packet),
+              lambda: algaritm.decode(packet, internal, robot))
+
+
+if __name__ == '__main__':
+    bench_titan()
+    bench_vmx()
@@ -196,13 +196,47 @@ class RobotAlgaritm(Robot):
                 self.__algaritm_internal.limit_h_2, self.__algaritm_internal.limit_l_2,
                 self.__algaritm_internal.limit_h_3, self.__algaritm_internal.limit_l_3]
 
+    @property
+    def sensors_tick(self) -> int:
+        """ id of the simulator frame the sensor values came from """
+        return self.__algaritm_internal.sensors_tick
+
     @property
     def camera_image(self):
+        """ In the simulator the image is read-only and the same array is returned until the next frame,
+            copy it (camera_image.copy()) before drawing on it """
         return self.__algaritm_internal.get_camera()
+
+    # in the simulator camera frames are received only while subscribed,
+    # the first camera_image read subscribes automatically
+    def subscribe_camera(self, max_fps: float = None):
+        self.__algaritm_internal.subscribe_camera(max_fps)
+
+    def unsubscribe_camera(self):
+        self.__algaritm_internal.unsubscribe_camera()
+
+    def step(self):
+        """ lockstep simulation: sends the commands and waits for the sensors of the next simulator tick """
+        self.__algaritm_internal.step()
     
     @property
     def lidar_data(self):
         return self.__algaritm_internal.get_lidar()
+
+    def next_lidar_scan(self, timeout: float = None):
+        """ Waits for a lidar scan that was not read yet (real robot only), None on timeout.
+            The scan has scan_id, timestamp and ranges (one value for each degree) """
+        return self.__algaritm_internal.get_next_lidar_scan(timeout)
+
+    @property
+    def lidar_points(self):
+        """ (N, 2) float32 array of x, y (mm, robot frame by conf.lidar_offset and conf.lidar_rotation)
+            of the valid points of the latest lidar scan, None without a real lidar """
+        return self.__algaritm_internal.get_lidar_points()
+
+    def lidar_points_into(self, out):
+        """ lidar_points written into the preallocated (M, 2) float32 array out if they fit """
+        return self.__algaritm_internal.get_lidar_points(out)
     
     # port is from 1 to 8 included
     def set_angle_servo(self, value: float, port: int):
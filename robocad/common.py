@@ -215,10 +215,29 @@ class CommonRobot(Robot):
     def led_3(self, value):
         self.__common_internal.led_3 = value
 
+    @property
+    def sensors_tick(self) -> int:
+        """ id of the simulator frame the sensor values came from """
+        return self.__common_internal.sensors_tick
+
     @property
     def camera_image(self):
+        """ In the simulator the image is read-only and the same array is returned until the next frame,
+            copy it (camera_image.copy()) before drawing on it """
         return self.__common_internal.get_camera()
 
+    # in the simulator camera frames are received only while subscribed,
+    # the first camera_image read subscribes automatically
+    def subscribe_camera(self, max_fps: float = None):
+        self.__common_internal.subscribe_camera(max_fps)
+
+    def unsubscribe_camera(self):
+        self.__common_internal.unsubscribe_camera()
+
+    def step(self):
+        """ lockstep simulation: sends the commands and waits for the sensors of the next simulator tick """
+        self.__common_internal.step()
+
     # port is from 1 to 10 included
     def set_angle_servo(self, value: float, port: int):
         self.__common_internal.set_servo_angle(value, port - 1)
@@ -1,16 +1,19 @@
-import struct
 import sys
 import os
 import time
-import numpy
 from threading import Thread
 
-from funcad.funcad import Funcad
-
 from .common.shared import LibHolder
 from .common.robot import Robot
 from .common.connection_base import ConnectionBase
 from .common.connection_sim import ConnectionSim
+from .common.packet_codec import AlgaritmTitanCodec, AlgaritmVmxCodec
+from .common.rate import Rate
+from .common.timing import LoopTimings
+from .common.bus_process import BusProcess, BusSpec
+from .common.realtime import apply_thread_realtime
+from .common.page_scheduler import PageScheduler, PageCounter
+from .common.channel_codec import ChannelMap, ChannelCodec, Register, RegisterKinds, registers
 from .common.connection_real import ConnectionReal
 from .common.updaters import RepkaUpdater
 from .common.robot_configuration import DefaultAlgaritmConfiguration
@@ -76,18 +79,29 @@ class AlgaritmInternal:
 
         self.servo_angles: list = [255.0] * 8
 
+        # id of the simulator frame the sensor values came from
+        self.sensors_tick: int = 0
+
         self.__connection: ConnectionBase = None
         if not self.__robot.on_real_robot:
-            self.__connection = ConnectionSim(self.__robot)
+            self.__connection = ConnectionSim(self.__robot, conf)
             self.__robocad_conn = RobocadConnection()
             self.__robocad_conn.start(self.__connection, self.__robot, self)
         else:
+            self.__titan: TitanCOM = None
+            self.__vmx: VMXSPI = None
+            self.__bus: BusProcess = None
+            if conf.real_bus_process:
+                # forked before the threads of the connection are started
+                self.__bus = BusProcess()
+                self.__bus.start_bus(self.__robot, self, conf, AlgaritmBus)
             updater = RepkaUpdater(self.__robot)
             self.__connection = ConnectionReal(self.__robot, updater, conf)
-            self.__titan = TitanCOM()
-            self.__titan.start_com(self.__connection, self.__robot, self, conf)
-            self.__vmx = VMXSPI()
-            self.__vmx.start_spi(self.__connection, self.__robot, self, conf)
+            if self.__bus is None:
+                self.__titan = TitanCOM()
+                self.__titan.start_com(self.__connection, self.__robot, self, conf)
+                self.__vmx = VMXSPI()
+                self.__vmx.start_spi(self.__connection, self.__robot, self, conf)
 
     def stop(self):
         self.__connection.stop()
@@ -99,12 +113,29 @@ class AlgaritmInternal:
                 self.__titan.stop()
             if self.__vmx is not None:
                 self.__vmx.stop()
+            if self.__bus is not None:
+                self.__bus.stop()
 
     def get_camera(self):
         return self.__connection.get_camera()
+
+    def subscribe_camera(self, max_fps: float = None):
+        self.__connection.subscribe_camera(max_fps)
+
+    def unsubscribe_camera(self):
+        self.__connection.unsubscribe_camera()
+
+    def step(self):
+        self.__connection.step()
     
     def get_lidar(self):
         return self.__connection.get_lidar()
+
+    def get_next_lidar_scan(self, timeout: float = None):
+        return self.__connection.get_next_lidar_scan(timeout)
+
+    def get_lidar_points(self, out=None):
+        return self.__connection.get_lidar_points(out)
     
     def set_servo_angle(self, angle: float, pin: int):
         self.servo_angles[pin] = angle
@@ -130,10 +161,36 @@ class AlgaritmInternal:
             self.step_motor_2_direction = False
 
 
+ALGARITM_CHANNEL = ChannelMap(
+    commands=registers('speed_motor_{}', 'f', 4) +
+    # make to range 0.05-0.25
+    registers('servo_angles[{}]', 'f', 8, scale=0.0011111, offset=0.05) +
+    [Register('additional_servo_1', 'f'),
+     Register('additional_servo_2', 'f'),
+     Register('step_motor_1_steps', 'f'),
+     Register('step_motor_2_steps', 'f'),
+     Register('step_motor_1_steps_per_s', 'f'),
+     Register('step_motor_2_steps_per_s', 'f'),
+     Register('step_motor_1_direction', 'f', RegisterKinds.FLAG),
+     Register('step_motor_2_direction', 'f', RegisterKinds.FLAG),
+     Register('use_pid', 'f', RegisterKinds.FLAG),
+     Register('p_pid', 'f'),
+     Register('i_pid', 'f'),
+     Register('d_pid', 'f')] +
+    registers('outputs[{}]', 'f', 4, kind=RegisterKinds.FLAG),
+    sensors=registers('enc_motor_{}', 'i', 4) +
+    registers('ultrasound_{}', 'f', 4, first=1) +
+    registers('analog_{}', 'H', 8, first=1) +
+    [Register('yaw', 'f'), Register('pitch', 'f'), Register('roll', 'f')] +
+    [Register(name % i, 'B', RegisterKinds.FLAG) for i in range(4) for name in ('limit_h_%d', 'limit_l_%d')] +
+    registers('inputs[{}]', 'B', 4, kind=RegisterKinds.FLAG) +
+    [Register('is_step_1_busy', 'B', RegisterKinds.FLAG),
+     Register('is_step_2_busy', 'B', RegisterKinds.FLAG)])
+
+
 class RobocadConnection:
     def __init__(self):
-        self.__update_thread = None
-        self.__stop_update_thread = False
+        self.__connection: ConnectionSim = None
 
     def start(self, connection: ConnectionSim, robot: Robot, robot_internal: AlgaritmInternal):
         self.__connection: ConnectionSim = connection
@@ -142,104 +199,40 @@ class RobocadConnection:
 
         self.__robot.power = 12  # todo: control from ConnectionSim from robocad
 
-        self.__stop_update_thread = False
-        self.__update_thread = Thread(target=self.__update)
-        self.__update_thread.daemon = True
-        self.__update_thread.start()
+        self.__codec = ChannelCodec(ALGARITM_CHANNEL)
+        self.__sensors_tick = -1
+        # the loop (thread or asyncio) is run by the connection
+        self.__connection.start_update(self.__update)
 
     def stop(self):
-        self.__stop_update_thread = True
-        if self.__update_thread is not None:
-            self.__update_thread.join()
-    
-    def __set_data(self, values: tuple) -> None:
-        self.__connection.set_data(RobocadConnection.join_algaritm_channel(values))
+        if self.__connection is not None:
+            self.__connection.stop_update()
 
-    def __get_data(self) -> tuple:
-        return RobocadConnection.parse_algaritm_channel(self.__connection.get_data())
-    
     def __update(self):
-        while not self.__stop_update_thread:
-            # set data
-            values = [self.__robot_internal.speed_motor_0,
-                      self.__robot_internal.speed_motor_1,
-                      self.__robot_internal.speed_motor_2,
-                      self.__robot_internal.speed_motor_3]
-            values.extend([(0.0011111 * i + 0.05) for i in self.__robot_internal.servo_angles]) # make to range 0.05-0.25
-            values.append(self.__robot_internal.additional_servo_1)
-            values.append(self.__robot_internal.additional_servo_2)
-            values.append(self.__robot_internal.step_motor_1_steps)
-            values.append(self.__robot_internal.step_motor_2_steps)
-            values.append(self.__robot_internal.step_motor_1_steps_per_s)
-            values.append(self.__robot_internal.step_motor_2_steps_per_s)
-            values.append(1 if self.__robot_internal.step_motor_1_direction else 0)
-            values.append(1 if self.__robot_internal.step_motor_2_direction else 0)
-            values.append(1 if self.__robot_internal.use_pid else 0)
-            values.append(self.__robot_internal.p_pid)
-            values.append(self.__robot_internal.i_pid)
-            values.append(self.__robot_internal.d_pid)
-            values.append(1 if self.__robot_internal.outputs[0] else 0)
-            values.append(1 if self.__robot_internal.outputs[1] else 0)
-            values.append(1 if self.__robot_internal.outputs[2] else 0)
-            values.append(1 if self.__robot_internal.outputs[3] else 0)
-            self.__set_data(tuple(values))
-
-            # get data
-            values = self.__get_data()
-            if len(values) > 0:
-                self.__robot_internal.enc_motor_0 = values[0]
-                self.__robot_internal.enc_motor_1 = values[1]
-                self.__robot_internal.enc_motor_2 = values[2]
-                self.__robot_internal.enc_motor_3 = values[3]
-                self.__robot_internal.ultrasound_1 = values[4]
-                self.__robot_internal.ultrasound_2 = values[5]
-                self.__robot_internal.ultrasound_3 = values[6]
-                self.__robot_internal.ultrasound_4 = values[7]
-                self.__robot_internal.analog_1 = values[8]
-                self.__robot_internal.analog_2 = values[9]
-                self.__robot_internal.analog_3 = values[10]
-                self.__robot_internal.analog_4 = values[11]
-                self.__robot_internal.analog_5 = values[12]
-                self.__robot_internal.analog_6 = values[13]
-                self.__robot_internal.analog_7 = values[14]
-                self.__robot_internal.analog_8 = values[15]
-                self.__robot_internal.yaw = values[16]
-                self.__robot_internal.pitch = values[17]
-                self.__robot_internal.roll = values[18]
-
-                self.__robot_internal.limit_h_0 = values[19] == 1
-                self.__robot_internal.limit_l_0 = values[20] == 1
-                self.__robot_internal.limit_h_1 = values[21] == 1
-                self.__robot_internal.limit_l_1 = values[22] == 1
-                self.__robot_internal.limit_h_2 = values[23] == 1
-                self.__robot_internal.limit_l_2 = values[24] == 1
-                self.__robot_internal.limit_h_3 = values[25] == 1
-                self.__robot_internal.limit_l_3 = values[26] == 1
-
-                self.__robot_internal.inputs[0] = values[27] == 1
-                self.__robot_internal.inputs[1] = values[28] == 1
-                self.__robot_internal.inputs[2] = values[29] == 1
-                self.__robot_internal.inputs[3] = values[30] == 1
-
-                self.__robot_internal.is_step_1_busy = values[31] == 1
-                self.__robot_internal.is_step_2_busy = values[32] == 1
-            
-            # задержка для слабых компов
-            time.sleep(0.004)
-    
+        # set data
+        self.__connection.set_data(self.__codec.encode(self.__robot_internal))
+
+        # get data, the same frame is not decoded again
+        data = self.__connection.get_data()
+        tick = self.__connection.data_tick
+        if tick != self.__sensors_tick and self.__codec.decode(data, self.__robot_internal):
+            self.__sensors_tick = tick
+            # id of the simulator frame the values came from
+            self.__robot_internal.sensors_tick = tick
+
     @staticmethod
     def join_algaritm_channel(lst: tuple) -> bytes:
         if len(lst) < 28:
             return b''
-        return struct.pack('28f', *lst)
-    
+        return ALGARITM_CHANNEL.command_struct.pack(*lst)
+
     @staticmethod
     def parse_algaritm_channel(data: bytes) -> tuple:
         if len(data) < 74:
             return tuple()
-        return struct.unpack('<4i4f8H3f14B', data)
+        return ALGARITM_CHANNEL.sensor_struct.unpack_from(data)
+
 
-    
 class TitanCOM:
     def __init__(self):
         self.__th: Thread = None
@@ -250,6 +243,12 @@ class TitanCOM:
         self.__robot: Robot = robot
         self.__robot_internal: AlgaritmInternal = robot_internal
         self.__conf: DefaultAlgaritmConfiguration = conf
+        self.__codec = AlgaritmTitanCodec()
+
+        self.__rate = Rate(conf.titan_hz, conf.rate_policy)
+        self.__robot.robot_info.loop_rates['titan'] = self.__rate
+        self.__timings = LoopTimings()
+        self.__robot.robot_info.loop_timings['titan'] = self.__timings
 
         self.__stop_th: bool = False
         self.__th: Thread = Thread(target=self.com_loop)
@@ -262,25 +261,25 @@ class TitanCOM:
             self.__th.join()
 
     def com_loop(self) -> None:
+        apply_thread_realtime(self.__robot, self.__conf, 'titan')
         try:
             com_result = self.__connection.com_ini(self.__conf.titan_port, self.__conf.titan_baud)
             if com_result != 0:
                 self.__robot.write_log("Failed to open COM")
                 return
 
-            start_time: int = round(time.time() * 10000)
             send_count_time: float = time.time()
             comm_counter = 0
             while not self.__stop_th:
-                tx_time: float = round(time.time() * 10000)
+                tx_time = time.perf_counter_ns()
                 tx_data = self.set_up_tx_data()
-                self.__robot.robot_info.tx_com_time_dev = round(time.time() * 10000) - tx_time
 
+                rw_time = time.perf_counter_ns()
                 rx_data: bytearray = self.__connection.com_rw(tx_data)
 
-                rx_time: float = round(time.time() * 10000)
+                rx_time = time.perf_counter_ns()
                 self.set_up_rx_data(rx_data)
-                self.__robot.robot_info.rx_com_time_dev = round(time.time() * 10000) - rx_time
+                sleep_time = time.perf_counter_ns()
 
                 comm_counter += 1
                 if time.time() - send_count_time > 1:
@@ -288,9 +287,15 @@ class TitanCOM:
                     self.__robot.robot_info.com_count_dev = comm_counter
                     comm_counter = 0
 
-                time.sleep(0.001)
-                self.__robot.robot_info.com_time_dev = round(time.time() * 10000) - start_time
-                start_time = round(time.time() * 10000)
+                self.__rate.sleep()
+                end_time = time.perf_counter_ns()
+                self.__timings.record(tx_time, rw_time, rx_time, sleep_time, end_time)
+
+                # legacy last values in 0.1 ms
+                robot_info = self.__robot.robot_info
+                robot_info.tx_com_time_dev = (rw_time - tx_time) // 100000
+                robot_info.rx_com_time_dev = (sleep_time - rx_time) // 100000
+                robot_info.com_time_dev = (end_time - tx_time) // 100000
         except Exception as e:
             self.__connection.com_stop()
             exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -299,92 +304,18 @@ class TitanCOM:
             self.__robot.write_log(str(e))
 
     def set_up_rx_data(self, data: bytearray) -> None:
-        if data[0] == 1:
-            if data[40] == 222:
-                self.__robot_internal.enc_motor_0 = ((data[4] & 0xff) << 24) | ((data[3] & 0xff) << 16) | ((data[2] & 0xff) << 8) | (data[1] & 0xff)
-                self.__robot_internal.enc_motor_1 = ((data[8] & 0xff) << 24) | ((data[7] & 0xff) << 16) | ((data[6] & 0xff) << 8) | (data[5] & 0xff)
-                self.__robot_internal.enc_motor_2 = ((data[12] & 0xff) << 24) | ((data[11] & 0xff) << 16) | ((data[10] & 0xff) << 8) | (data[9] & 0xff)
-                self.__robot_internal.enc_motor_3 = ((data[16] & 0xff) << 24) | ((data[15] & 0xff) << 16) | ((data[14] & 0xff) << 8) | (data[13] & 0xff)
-
-                self.__robot_internal.limit_l_0 = Funcad.access_bit(data[17], 7)
-                self.__robot_internal.limit_h_0 = Funcad.access_bit(data[17], 6)
-                self.__robot_internal.limit_l_1 = Funcad.access_bit(data[17], 5)
-                self.__robot_internal.limit_h_1 = Funcad.access_bit(data[17], 4)
-                self.__robot_internal.limit_l_2 = Funcad.access_bit(data[17], 3)
-                self.__robot_internal.limit_h_2 = Funcad.access_bit(data[17], 2)
-                self.__robot_internal.limit_l_3 = Funcad.access_bit(data[17], 1)
-                self.__robot_internal.limit_h_3 = Funcad.access_bit(data[17], 0)
-
-                self.__robot_internal.is_step_1_busy = (data[18] != 0)
-                self.__robot_internal.is_step_2_busy = (data[19] != 0)
-
-                # reset step motor data when is_busy flag is True
-                # because we need to do step things only once
-                if self.__robot_internal.is_step_1_busy: self.__robot_internal.step_motor_reset(1)
-                if self.__robot_internal.is_step_2_busy: self.__robot_internal.step_motor_reset(2)
+        if self.__codec.decode(data, self.__robot_internal):
+            # reset step motor data when is_busy flag is True
+            # because we need to do step things only once
+            if self.__robot_internal.is_step_1_busy: self.__robot_internal.step_motor_reset(1)
+            if self.__robot_internal.is_step_2_busy: self.__robot_internal.step_motor_reset(2)
         else:
             self.__robot.write_log("received wrong data " + " ".join(map(str, data)))
 
     def set_up_tx_data(self) -> bytearray:
-        tx_data: bytearray = bytearray([0] * 48)
-        tx_data[0] = 1
-
-        tx_data[1] = int(numpy.clip(self.__robot_internal.speed_motor_0, -100, 100)).to_bytes(1, 'big', signed = True)[0]
-        tx_data[2] = int(numpy.clip(self.__robot_internal.speed_motor_1, -100, 100)).to_bytes(1, 'big', signed = True)[0]
-        tx_data[3] = int(numpy.clip(self.__robot_internal.speed_motor_2, -100, 100)).to_bytes(1, 'big', signed = True)[0]
-        tx_data[4] = int(numpy.clip(self.__robot_internal.speed_motor_3, -100, 100)).to_bytes(1, 'big', signed = True)[0]
-
-        # for ProgramIsRunning and directions
-        tx_data[5] = int('11' +
-                        ("1" if self.__robot_internal.step_motor_1_direction else "0") +
-                        ("1" if self.__robot_internal.step_motor_2_direction else "0") + 
-                        ("1" if self.__robot_internal.use_pid else "0") + '001', 2)
-        
-        tx_data[6] = int(self.__robot_internal.additional_servo_1)
-        tx_data[7] = int(self.__robot_internal.additional_servo_2)
-
-        step1_steps: bytearray = Funcad.int_to_4_bytes(abs(self.__robot_internal.step_motor_1_steps))
-        tx_data[8] = step1_steps[0]
-        tx_data[9] = step1_steps[1]
-        tx_data[10] = step1_steps[2]
-        tx_data[11] = step1_steps[3]
-        step2_steps: bytearray = Funcad.int_to_4_bytes(abs(self.__robot_internal.step_motor_2_steps))
-        tx_data[12] = step2_steps[0]
-        tx_data[13] = step2_steps[1]
-        tx_data[14] = step2_steps[2]
-        tx_data[15] = step2_steps[3]
-
-        step1_steps_ps: bytearray = Funcad.int_to_4_bytes(abs(self.__robot_internal.step_motor_1_steps_per_s))
-        tx_data[16] = step1_steps_ps[0]
-        tx_data[17] = step1_steps_ps[1]
-        tx_data[18] = step1_steps_ps[2]
-        tx_data[19] = step1_steps_ps[3]
-        step2_steps_ps: bytearray = Funcad.int_to_4_bytes(abs(self.__robot_internal.step_motor_2_steps_per_s))
-        tx_data[20] = step2_steps_ps[0]
-        tx_data[21] = step2_steps_ps[1]
-        tx_data[22] = step2_steps_ps[2]
-        tx_data[23] = step2_steps_ps[3]
-
-        packed_p = struct.pack('<f', self.__robot_internal.p_pid)
-        tx_data[24] = packed_p[0]
-        tx_data[25] = packed_p[1]
-        tx_data[26] = packed_p[2]
-        tx_data[27] = packed_p[3]
-        packed_i = struct.pack('<f', self.__robot_internal.i_pid)
-        tx_data[28] = packed_i[0]
-        tx_data[29] = packed_i[1]
-        tx_data[30] = packed_i[2]
-        tx_data[31] = packed_i[3]
-        packed_d = struct.pack('<f', self.__robot_internal.d_pid)
-        tx_data[32] = packed_d[0]
-        tx_data[33] = packed_d[1]
-        tx_data[34] = packed_d[2]
-        tx_data[35] = packed_d[3]
-
-        tx_data[40] = 222
-
-        return tx_data
-    
+        return self.__codec.encode(self.__robot_internal)
+
+
 class VMXSPI:
     def __init__(self):
         self.__th: Thread = None
@@ -396,7 +327,15 @@ class VMXSPI:
         self.__robot_internal: AlgaritmInternal = robot_internal
         self.__conf: DefaultAlgaritmConfiguration = conf
 
-        self.__toggler: int = 0
+        self.__codec = AlgaritmVmxCodec()
+        self.__page_scheduler: PageScheduler = None
+        if conf.vmx_page_weights:
+            self.__page_scheduler = PageScheduler(conf.vmx_page_weights, AlgaritmVmxCodec.PAGES)
+        self.__page_counter = PageCounter()
+        self.__rate = Rate(conf.vmx_hz, conf.rate_policy)
+        self.__robot.robot_info.loop_rates['vmx'] = self.__rate
+        self.__timings = LoopTimings()
+        self.__robot.robot_info.loop_timings['vmx'] = self.__timings
         self.__stop_th: bool = False
         self.__th: Thread = Thread(target=self.spi_loop)
         self.__th.daemon = True
@@ -408,35 +347,42 @@ class VMXSPI:
             self.__th.join()
 
     def spi_loop(self) -> None:
+        apply_thread_realtime(self.__robot, self.__conf, 'vmx')
         try:
             spi_result = self.__connection.spi_ini(self.__conf.vmx_port, self.__conf.vmx_ch, self.__conf.vmx_speed, self.__conf.vmx_mode)
             if spi_result != 0:
                 self.__robot.write_log("Failed to open SPI")
                 return
 
-            start_time: float = round(time.time() * 10000)
             send_count_time: float = time.time()
             comm_counter = 0
             while not self.__stop_th:
-                tx_time: float = round(time.time() * 10000)
+                tx_time = time.perf_counter_ns()
                 tx_list = self.set_up_tx_data()
-                self.__robot.robot_info.tx_spi_time_dev = round(time.time() * 10000) - tx_time
 
+                rw_time = time.perf_counter_ns()
                 rx_list: bytearray = self.__connection.spi_rw(tx_list)
 
-                rx_time: float = round(time.time() * 10000)
+                rx_time = time.perf_counter_ns()
                 self.set_up_rx_data(rx_list)
-                self.__robot.robot_info.rx_spi_time_dev = round(time.time() * 10000) - rx_time
+                sleep_time = time.perf_counter_ns()
 
                 comm_counter += 1
                 if time.time() - send_count_time > 1:
+                    self.__robot.robot_info.vmx_page_rates = self.__page_counter.rates(time.time() - send_count_time)
                     send_count_time = time.time()
                     self.__robot.robot_info.spi_count_dev = comm_counter
                     comm_counter = 0
 
-                time.sleep(0.002)
-                self.__robot.robot_info.spi_time_dev = round(time.time() * 10000) - start_time
-                start_time = round(time.time() * 10000)
+                self.__rate.sleep()
+                end_time = time.perf_counter_ns()
+                self.__timings.record(tx_time, rw_time, rx_time, sleep_time, end_time)
+
+                # legacy last values in 0.1 ms
+                robot_info = self.__robot.robot_info
+                robot_info.tx_spi_time_dev = (rw_time - tx_time) // 100000
+                robot_info.rx_spi_time_dev = (sleep_time - rx_time) // 100000
+                robot_info.spi_time_dev = (end_time - tx_time) // 100000
         except (Exception, EOFError) as e:
             self.__connection.spi_stop()
             exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -445,76 +391,50 @@ class VMXSPI:
             self.__robot.write_log(str(e))
 
     def set_up_rx_data(self, data: bytearray) -> None:
-        if data[0] == 1:
-            self.__robot_internal.analog_1 = (data[2] & 0xff) << 8 | (data[1] & 0xff)
-            self.__robot_internal.analog_2 = (data[4] & 0xff) << 8 | (data[3] & 0xff)
-            self.__robot_internal.analog_3 = (data[6] & 0xff) << 8 | (data[5] & 0xff)
-            self.__robot_internal.analog_4 = (data[8] & 0xff) << 8 | (data[7] & 0xff)
-            self.__robot_internal.analog_5 = (data[10] & 0xff) << 8 | (data[9] & 0xff)
-            self.__robot_internal.analog_6 = (data[12] & 0xff) << 8 | (data[11] & 0xff)
-            self.__robot_internal.analog_7 = (data[14] & 0xff) << 8 | (data[13] & 0xff)
-        elif data[0] == 2:
-            self.__robot_internal.analog_8 = (data[2] & 0xff) << 8 | (data[1] & 0xff)
-
-            us1_ui: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
-            self.__robot_internal.ultrasound_1 = us1_ui / 100
-            us2_ui: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
-            self.__robot_internal.ultrasound_2 = us2_ui / 100
-            us3_ui: int = (data[8] & 0xff) << 8 | (data[7] & 0xff)
-            self.__robot_internal.ultrasound_3 = us3_ui / 100
-            us4_ui: int = (data[10] & 0xff) << 8 | (data[9] & 0xff)
-            self.__robot_internal.ultrasound_4 = us4_ui / 100
-
-            self.__robot_internal.inputs[0] = Funcad.access_bit(data[11], 0) == 1
-            self.__robot_internal.inputs[1] = Funcad.access_bit(data[11], 1) == 1
-            self.__robot_internal.inputs[2] = Funcad.access_bit(data[11], 2) == 1
-            self.__robot_internal.inputs[3] = Funcad.access_bit(data[11], 3) == 1
-        elif data[0] == 3:
-            yaw_ui: int = (data[2] & 0xff) << 8 | (data[1] & 0xff)
-            new_yaw = (yaw_ui / 100) * (1 if Funcad.access_bit(data[7], 1) else -1)
-            self.__robot_internal.yaw_unlim += self.calc_angle_unlim(new_yaw, self.__robot_internal.yaw)
-            self.__robot_internal.yaw = new_yaw
-
-            pitch_ui: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
-            new_pitch = (pitch_ui / 100) * (1 if Funcad.access_bit(data[7], 2) else -1)
-            self.__robot_internal.pitch_unlim += self.calc_angle_unlim(new_pitch, self.__robot_internal.pitch)
-            self.__robot_internal.pitch = new_pitch
-
-            roll_ui: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
-            new_roll = (roll_ui / 100) * (1 if Funcad.access_bit(data[7], 3) else -1)
-            self.__robot_internal.roll_unlim += self.calc_angle_unlim(new_roll, self.__robot_internal.roll)
-            self.__robot_internal.roll = new_roll
-
-            power: float = ((data[9] & 0xff) << 8 | (data[8] & 0xff)) / 100
-            self.__robot.power = power
+        page = self.__codec.decode(data, self.__robot_internal, self.__robot)
+        if page != 0:
+            self.__page_counter.add(page)
 
     def set_up_tx_data(self) -> bytearray:
-        tx_list: bytearray = bytearray([0x00] * 16)
-
-        if self.__toggler == 0:
-            tx_list[0] = 1
-
-            tx_list[1] = int(self.__robot_internal.servo_angles[0])
-            tx_list[2] = int(self.__robot_internal.servo_angles[1])
-            tx_list[3] = int(self.__robot_internal.servo_angles[2])
-            tx_list[4] = int(self.__robot_internal.servo_angles[3])
-            tx_list[5] = int(self.__robot_internal.servo_angles[4])
-            tx_list[6] = int(self.__robot_internal.servo_angles[5])
-            tx_list[7] = int(self.__robot_internal.servo_angles[6])
-            tx_list[8] = int(self.__robot_internal.servo_angles[7])
-
-            tx_list[9] = int('1' + ("1" if self.__robot_internal.outputs[0] else "0") +
-                                   ("1" if self.__robot_internal.outputs[1] else "0") +
-                                   ("1" if self.__robot_internal.outputs[2] else "0") +
-                                   ("1" if self.__robot_internal.outputs[3] else "0") + '001', 2)
-        return tx_list
-
-    def calc_angle_unlim(self, new_angle: float, old_angle: float) -> float:
-        delta_angle = new_angle - old_angle
-        if delta_angle < -180:
-            delta_angle = 180 - old_angle
-            delta_angle += 180 + new_angle
-        elif delta_angle > 180:
-            delta_angle = (180 + old_angle) * -1
-            delta_angle += (180 - new_angle) * -1
-        return delta_angle
\ No newline at end of file
+        if self.__page_scheduler is None:
+            return self.__codec.encode(self.__robot_internal)
+        return self.__codec.encode(self.__robot_internal, self.__page_scheduler.next_page())
+
+
+ALGARITM_BUS = ChannelMap(
+    commands=registers('speed_motor_{}', 'd', 4) +
+    registers('servo_angles[{}]', 'd', 8) +
+    [Register('additional_servo_1', 'd'),
+     Register('additional_servo_2', 'd'),
+     Register('step_motor_1_steps', 'q'),
+     Register('step_motor_2_steps', 'q'),
+     Register('step_motor_1_steps_per_s', 'q'),
+     Register('step_motor_2_steps_per_s', 'q'),
+     Register('step_motor_1_direction', 'B', RegisterKinds.FLAG),
+     Register('step_motor_2_direction', 'B', RegisterKinds.FLAG),
+     Register('use_pid', 'B', RegisterKinds.FLAG),
+     Register('p_pid', 'd'),
+     Register('i_pid', 'd'),
+     Register('d_pid', 'd')] +
+    registers('outputs[{}]', 'B', 4, kind=RegisterKinds.FLAG),
+    sensors=registers('enc_motor_{}', 'q', 4) +
+    [Register(name % i, 'B', RegisterKinds.FLAG) for i in range(4) for name in ('limit_h_%d', 'limit_l_%d')] +
+    [Register('is_step_1_busy', 'B', RegisterKinds.FLAG),
+     Register('is_step_2_busy', 'B', RegisterKinds.FLAG)] +
+    [Register(name, 'd') for name in ('yaw', 'yaw_unlim', 'pitch', 'pitch_unlim', 'roll', 'roll_unlim')] +
+    registers('ultrasound_{}', 'd', 4, first=1) +
+    registers('analog_{}', 'H', 8, first=1) +
+    registers('inputs[{}]', 'B', 4, kind=RegisterKinds.FLAG))
+
+
+class AlgaritmBus(BusSpec):
+    TITAN = TitanCOM
+    VMX = VMXSPI
+    MAP = ALGARITM_BUS
+
+    @staticmethod
+    def on_sensors(robot_internal) -> None:
+        # step commands are reset in the bus process when the motor is busy, the same is done here,
+        # so the next command frame does not start the steps again
+        if robot_internal.is_step_1_busy: robot_internal.step_motor_reset(1)
+        if robot_internal.is_step_2_busy: robot_internal.step_motor_reset(2)
@@ -0,0 +1,214 @@
+import mmap
+import multiprocessing
+import os
+import struct
+from threading import Thread, Lock
+
+from .channel_codec import ChannelMap, ChannelCodec
+from .connection import FrameBuffer
+from .rate import Rate
+from .realtime import apply_thread_realtime, lock_memory
+from .robot import Robot
+from .robot_configuration import RobotConfiguration
+from .emulator import create_lib
+from .shared import LibHolder
+from .shm_connection import SeqlockBlock
+
+
+class BusSpec:
+    """ Platform part of the bus process: classes of the Titan and VMX loops and the map of the exchanged values.
+        MAP commands go from the robot to the bus process and sensors back, its registers have no scale """
+    TITAN: type = None
+    VMX: type = None
+    MAP: ChannelMap = None
+
+    @staticmethod
+    def on_sensors(robot_internal) -> None:
+        """ Runs in the robot process after new sensors are applied """
+        pass
+
+
+class BusSharedMemory:
+    """ Memory-mapped file shared by the robot and its bus process: command and sensor seqlock blocks """
+    CAPACITY = 1024
+
+    def __init__(self, path: str, create: bool = False):
+        self.path = path
+        block_size = SeqlockBlock.size_for(BusSharedMemory.CAPACITY)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if create:
+                # seqs of the previous run are dropped
+                os.ftruncate(fd, 0)
+            os.ftruncate(fd, 2 * block_size)
+            self.__mm = mmap.mmap(fd, 2 * block_size)
+        finally:
+            os.close(fd)
+        self.command_block = SeqlockBlock(self.__mm, 0, BusSharedMemory.CAPACITY)
+        self.sensor_block = SeqlockBlock(self.__mm, block_size, BusSharedMemory.CAPACITY)
+
+    def close(self) -> None:
+        self.command_block.release()
+        self.sensor_block.release()
+        self.__mm.close()
+
+
+class LibConnection:
+    """ Titan and VMX part of ConnectionReal for the bus process """
+    def __init__(self, lib: LibHolder):
+        self.__lib = lib
+
+    def spi_ini(self, path: str, channel: int, speed: int, mode: int) -> int:
+        return self.__lib.init_spi(path, channel, speed, mode)
+
+    def com_ini(self, path: str, baud: int) -> int:
+        return self.__lib.init_usb(path, baud)
+
+    def spi_rw(self, array: bytearray) -> bytearray:
+        return self.__lib.rw_spi(array)
+
+    def com_rw(self, array: bytearray) -> bytearray:
+        return self.__lib.rw_usb(array)
+
+    def spi_stop(self):
+        self.__lib.stop_spi()
+
+    def com_stop(self):
+        self.__lib.stop_usb()
+
+
+# power and the legacy loop fields of RobotInfo, sent after the sensors of the map
+STATUS_FIELDS = ('com_count_dev', 'com_time_dev', 'rx_com_time_dev', 'tx_com_time_dev',
+                 'spi_count_dev', 'spi_time_dev', 'rx_spi_time_dev', 'tx_spi_time_dev')
+STATUS_STRUCT = struct.Struct('<d' + 'd' * len(STATUS_FIELDS))
+
+
+def bus_main(robot: Robot, robot_internal, conf: RobotConfiguration, spec: type, lib_factory,
+             stop_event, parent_pid: int) -> None:
+    """ Bus process: Titan and VMX loops on the forked copy of the robot internal.
+        Commands are applied when the robot writes a new frame, sensors are written every sync period """
+    # locks are forked in their state, a thread of the parent could hold them and it does not exist here
+    robot.log_lock = Lock()
+    for handler in robot.logger.handlers:
+        handler.createLock()
+    # memory locks are not inherited by the fork
+    if conf.rt_lock_memory:
+        lock_memory(robot)
+    apply_thread_realtime(robot, conf, 'bus')
+    shm = BusSharedMemory(conf.real_bus_shm_path)
+    # sensors of the map are the commands of the bus process
+    codec = ChannelCodec(ChannelMap(commands=spec.MAP.sensors, sensors=spec.MAP.commands))
+    lib = create_lib(conf) if lib_factory is None else lib_factory(conf.lib_holder_first_path)
+    connection = LibConnection(lib)
+    titan = spec.TITAN()
+    titan.start_com(connection, robot, robot_internal, conf)
+    vmx = spec.VMX()
+    vmx.start_spi(connection, robot, robot_internal, conf)
+
+    frame_buffer = FrameBuffer(BusSharedMemory.CAPACITY)
+    command_seq = 0
+    rate = Rate(conf.real_bus_sync_hz, conf.rate_policy)
+    robot_info = robot.robot_info
+    try:
+        # robot process could be killed without stopping the bus
+        while not stop_event.is_set() and os.getppid() == parent_pid:
+            if shm.command_block.seq != command_seq:
+                view, seq = shm.command_block.read_into(frame_buffer)
+                if view is not None and codec.decode(view, robot_internal):
+                    command_seq = seq
+            shm.sensor_block.write(codec.encode(robot_internal) + STATUS_STRUCT.pack(
+                robot.power, *[getattr(robot_info, name) for name in STATUS_FIELDS]))
+            rate.sleep()
+    finally:
+        titan.stop()
+        vmx.stop()
+        shm.close()
+
+
+class BusProcess:
+    """ Runs the Titan and VMX loops of the real robot in a child process, so their timing does not depend
+        on the GIL of the user code. The child is forked with a copy of the robot internal, values are
+        exchanged through seqlock blocks of a shared memory file by a sync thread on each side.
+        The child re-creates the log locks, the other locks of the parent threads are not used there.
+        lib_factory(first_path) gives the LibHolder of the child, a mock could be used without hardware,
+        by default it is chosen by conf.lib_emulator """
+    def __init__(self):
+        self.__th: Thread = None
+        self.__stop_th: bool = False
+        self.__process = None
+        self.__shm: BusSharedMemory = None
+
+    def start_bus(self, robot: Robot, robot_internal, conf: RobotConfiguration, spec: type,
+                  lib_factory=None) -> None:
+        self.__robot: Robot = robot
+        self.__robot_internal = robot_internal
+        self.__conf: RobotConfiguration = conf
+        self.__spec = spec
+        self.__codec = ChannelCodec(spec.MAP)
+
+        self.__shm = BusSharedMemory(conf.real_bus_shm_path, create=True)
+        # fork: the child gets the robot internal as it is and does not run the user program again
+        context = multiprocessing.get_context('fork')
+        self.__stop_event = context.Event()
+        self.__process = context.Process(target=bus_main, name="robocad bus",
+                                         args=(robot, robot_internal, conf, spec, lib_factory,
+                                               self.__stop_event, os.getpid()))
+        self.__process.daemon = True
+        self.__process.start()
+        self.__robot.write_log("Bus process started: " + str(self.__process.pid))
+
+        self.__stop_th = False
+        self.__th = Thread(target=self.sync_loop)
+        self.__th.daemon = True
+        self.__th.start()
+
+    def stop(self):
+        self.__stop_th = True
+        if self.__th is not None:
+            self.__th.join()
+        if self.__process is not None:
+            self.__stop_event.set()
+            self.__process.join(1)
+            if self.__process.is_alive():
+                self.__process.terminate()
+            self.__process = None
+        if self.__shm is not None:
+            self.__shm.close()
+            self.__shm = None
+            try:
+                os.remove(self.__conf.real_bus_shm_path)
+            except OSError:
+                pass  # idc
+
+    def sync_loop(self) -> None:
+        apply_thread_realtime(self.__robot, self.__conf, 'bus')
+        command_block = self.__shm.command_block
+        sensor_block = self.__shm.sensor_block
+        frame_buffer = FrameBuffer(BusSharedMemory.CAPACITY)
+        sensor_size = self.__codec.map.sensor_struct.size
+        robot_info = self.__robot.robot_info
+        rate = Rate(self.__conf.real_bus_sync_hz, self.__conf.rate_policy)
+        commands = b''
+        sensor_seq = 0
+        iteration = 0
+        while not self.__stop_th:
+            new_commands = self.__codec.encode(self.__robot_internal)
+            if new_commands != commands:
+                command_block.write(new_commands)
+                commands = new_commands
+
+            if sensor_block.seq != sensor_seq:
+                view, seq = sensor_block.read_into(frame_buffer)
+                if view is not None and self.__codec.decode(view, self.__robot_internal):
+                    sensor_seq = seq
+                    status = STATUS_STRUCT.unpack_from(view, sensor_size)
+                    self.__robot.power = status[0]
+                    for name, value in zip(STATUS_FIELDS, status[1:]):
+                        setattr(robot_info, name, value)
+                    self.__spec.on_sensors(self.__robot_internal)
+
+            iteration += 1
+            if iteration % 1000 == 0 and not self.__process.is_alive():
+                self.__robot.write_log("Bus process stopped, exit code " + str(self.__process.exitcode))
+                break
+            rate.sleep()
@@ -0,0 +1,132 @@
+import functools
+import operator
+import re
+import struct
+
+
+class RegisterKinds:
+    NUMBER = 0
+    # bool attribute, 1/0 on the wire
+    FLAG = 1
+
+
+class Register:
+    """ One value of a channel frame.
+        name is an attribute of the robot internal or an item of its list attribute ('servo_values[3]'),
+        fmt is a struct code of the value. Commands could be sent as scale * value + offset """
+    FORMATS = 'bBhHiIqQefd?'
+    __NAME_RE = re.compile(r'^[A-Za-z_]\w*(\[\d+\])?$')
+
+    def __init__(self, name: str, fmt: str, kind: int = RegisterKinds.NUMBER, scale: float = None,
+                 offset: float = None):
+        if not Register.__NAME_RE.match(name):
+            raise ValueError("Wrong register name: " + name)
+        if len(fmt) != 1 or fmt not in Register.FORMATS:
+            raise ValueError("Wrong register format: " + fmt)
+        self.name = name
+        self.fmt = fmt
+        self.kind = kind
+        self.scale = scale
+        self.offset = offset
+        # 'servo_values[3]' is the item 3 of the attribute servo_values
+        self.attr, _, item = name.partition('[')
+        self.item = int(item[:-1]) if item else None
+
+    def command_conversion(self):
+        """ Function from the attribute value to the command value, None if the value is sent as it is """
+        steps = []
+        if self.item is not None:
+            steps.append(operator.itemgetter(self.item))
+        if self.kind == RegisterKinds.FLAG:
+            steps.append(operator.truth)
+        if self.scale is not None:
+            steps.append(functools.partial(operator.mul, self.scale))
+        if self.offset is not None:
+            steps.append(functools.partial(operator.add, self.offset))
+        return _chain(steps)
+
+    def sensor_conversion(self):
+        """ Function from the sensor value to the attribute value, None if the value is stored as it is """
+        if self.kind == RegisterKinds.FLAG:
+            return functools.partial(operator.eq, 1)
+        return None
+
+
+def _chain(steps: list):
+    if not steps:
+        return None
+    if len(steps) == 1:
+        return steps[0]
+    first, rest = steps[0], _chain(steps[1:])
+    return lambda value: rest(first(value))
+
+
+def registers(name: str, fmt: str, count: int, first: int = 0, kind: int = RegisterKinds.NUMBER, **kwargs) -> list:
+    """ Registers for numbered attributes: registers('enc_motor_{}', 'i', 4) or registers('inputs[{}]', 'B', 4) """
+    return [Register(name.format(i), fmt, kind, **kwargs) for i in range(first, first + count)]
+
+
+class ChannelMap:
+    """ Declarative map of a simulator channel: commands (robot -> simulator) and sensors (simulator -> robot).
+        Frames are little-endian structs of the registers in the given order. The map is compiled once into
+        struct.Struct objects and the conversions of the registers applied between an attrgetter and the frame """
+    def __init__(self, commands: list, sensors: list):
+        self.commands = tuple(commands)
+        self.sensors = tuple(sensors)
+        self.command_struct = struct.Struct('<' + ''.join(r.fmt for r in self.commands))
+        self.sensor_struct = struct.Struct('<' + ''.join(r.fmt for r in self.sensors))
+        self.__sensor_indexes = {r.name: i for i, r in enumerate(self.sensors)}
+
+        # commands: all the attributes are read by one attrgetter, then list items, flags and scales are converted
+        fetch = operator.attrgetter(*(r.attr for r in self.commands))
+        self.__fetch = fetch if len(self.commands) > 1 else lambda o: (fetch(o),)
+        self.__command_conversions = tuple((i, r.command_conversion()) for i, r in enumerate(self.commands)
+                                           if r.command_conversion() is not None)
+        # sensors: flags are converted, then stored into the attributes or the items of list attributes
+        self.__sensor_conversions = tuple((i, r.sensor_conversion()) for i, r in enumerate(self.sensors)
+                                          if r.sensor_conversion() is not None)
+        self.__sensor_attrs = tuple((i, r.attr) for i, r in enumerate(self.sensors) if r.item is None)
+        self.__sensor_items = tuple((i, operator.attrgetter(r.attr), r.item) for i, r in enumerate(self.sensors)
+                                    if r.item is not None)
+
+    def pack_commands(self, o) -> bytes:
+        values = list(self.__fetch(o))
+        for i, convert in self.__command_conversions:
+            values[i] = convert(values[i])
+        return self.command_struct.pack(*values)
+
+    def apply_sensors(self, o, values) -> None:
+        if self.__sensor_conversions:
+            values = list(values)
+            for i, convert in self.__sensor_conversions:
+                values[i] = convert(values[i])
+        for i, attr in self.__sensor_attrs:
+            setattr(o, attr, values[i])
+        for i, get_list, item in self.__sensor_items:
+            get_list(o)[item] = values[i]
+
+    def index(self, name: str) -> int:
+        """ Position of the sensor register in the state block """
+        return self.__sensor_indexes[name]
+
+
+class ChannelCodec:
+    """ Buffers of one connection for a ChannelMap.
+        Last decoded sensor values are also kept in the state block, a preallocated list in the map order
+        updated in place (copying into a numpy array costs more than the whole decode) """
+    def __init__(self, channel_map: ChannelMap):
+        self.map = channel_map
+        self.state = [0] * len(channel_map.sensors)
+
+    def encode(self, robot_internal) -> bytes:
+        # frame is kept by the talk channel thread, so it is not packed into a reused buffer
+        return self.map.pack_commands(robot_internal)
+
+    def decode(self, data, robot_internal) -> bool:
+        """ Unpacks the sensor frame into the state block and the robot internal, False if the frame is too short """
+        if len(data) < self.map.sensor_struct.size:
+            return False
+        values = self.map.sensor_struct.unpack_from(data)
+        self.state[:] = values
+        self.map.apply_sensors(robot_internal, values)
+        return True
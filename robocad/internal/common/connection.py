@@ -4,17 +4,146 @@ import time
 import warnings
 import struct
 
+from .rate import Rate
 from .robot import Robot
 
 
+LENGTH_STRUCT = struct.Struct('<I')
+WAIT_FOR_DATA = "Wait for data".encode('utf-16-le')
+
+# streaming protocol: the client asks once for a stream, a simulator that supports it
+# answers with STREAM_ACK and from then on every frame is (length, seq) + payload without requests.
+# an older simulator answers as usual, so the channel falls back to the polling handshake
+STREAM_DATA = "Stream data".encode('utf-16-le')
+STREAM_ACK = b'STRM'
+STREAM_HEADER_STRUCT = struct.Struct('<II')
+# commands are pushed only when changed, but at least this often (s)
+STREAM_KEEPALIVE = 0.5
+# the command channel polls if the sensor channel has not negotiated the stream by then (s)
+STREAM_NEGOTIATION_TIMEOUT = 2
+
+# camera frame: raw 640x480 RGB from older simulators, otherwise a header with the frame format and pixels
+LEGACY_CAMERA_SIZE = 640 * 480 * 3
+CAMERA_MAGIC = b'RCIM'
+CAMERA_HEADER_STRUCT = struct.Struct('<4sHHB3x')
+
+# lockstep protocol: the client sends (length, tick) + commands, the simulator advances one tick
+# and answers with (length, tick) + sensors of that tick
+STEP_HEADER_STRUCT = struct.Struct('<II')
+
+
+def recv_exact_into(sct: socket.socket, view: memoryview) -> None:
+    """ Fills the whole view from the socket, raises ConnectionAbortedError if the peer is gone """
+    got = 0
+    length = len(view)
+    while got < length:
+        n = sct.recv_into(view[got:], length - got)
+        if n == 0:
+            raise ConnectionAbortedError("socket closed by peer")
+        got += n
+
+
+class FrameBuffer:
+    """ Buffer pool for channel payloads.
+        Payload is received into a buffer that nobody holds a view of and published as a memoryview,
+        so a published frame stays intact as long as a reader keeps its view (or an array over it).
+        Usually the pool has three buffers: the published one, the previous one still being read
+        and the one being received """
+    # buffers in the pool, a buffer that is still held when the pool is full is replaced and left to its reader
+    MAX_BUFFERS = 8
+
+    def __init__(self, size: int = 0):
+        self.__buffers = [bytearray(size) for _ in range(3)]
+        self.__back = 0
+        self.__next_replaced = 0
+
+    def reserve(self, length: int) -> memoryview:
+        """ Returns a view of a free buffer with exactly length bytes """
+        index = self.__free_index()
+        buf = self.__buffers[index]
+        if len(buf) < length:
+            buf = bytearray(length)
+            self.__buffers[index] = buf
+        self.__back = index
+        return memoryview(buf)[:length]
+
+    def publish(self, length: int) -> memoryview:
+        """ Returns a view of the just received frame """
+        return memoryview(self.__buffers[self.__back])[:length]
+
+    def __free_index(self) -> int:
+        for index, buf in enumerate(self.__buffers):
+            if FrameBuffer.__is_free(buf):
+                return index
+        if len(self.__buffers) < FrameBuffer.MAX_BUFFERS:
+            self.__buffers.append(bytearray(0))
+            return len(self.__buffers) - 1
+        # the held buffer lives on with its views, the pool gets a new one instead
+        index = self.__next_replaced
+        self.__next_replaced = (index + 1) % FrameBuffer.MAX_BUFFERS
+        self.__buffers[index] = bytearray(0)
+        return index
+
+    @staticmethod
+    def __is_free(buf: bytearray) -> bool:
+        """ A bytearray with views (exports) can not be resized """
+        try:
+            buf.append(0)
+        except BufferError:
+            return False
+        buf.pop()
+        return True
+
+
+class StreamNegotiation:
+    """ Result of the stream request of the sensor channel. An older simulator takes every frame on the
+        command port as commands, so the command channel asks for a stream only after the simulator
+        has acknowledged it on the sensor channel """
+    def __init__(self):
+        self.__done = threading.Event()
+        self.supported = False
+
+    @property
+    def done(self) -> bool:
+        return self.__done.is_set()
+
+    def set_result(self, supported: bool) -> None:
+        """ Only the first result counts """
+        if not self.__done.is_set():
+            self.supported = supported
+            self.__done.set()
+
+    def wait(self, timeout: float) -> bool:
+        """ True if the stream is acknowledged, False if not or not known by the timeout """
+        return self.__done.wait(timeout) and self.supported
+
+
 class ListenPort:
-    def __init__(self, robot: Robot, port: int):
+    def __init__(self, robot: Robot, port: int, streaming: bool = False, rate: Rate = None, options: str = '',
+                 negotiation: StreamNegotiation = None):
         self.__port = port
         self.__robot = robot
+        self.__streaming = streaming
+        # result of the stream request is given to the command channel
+        self.__negotiation = negotiation
+        # rate of requests in polling mode
+        self.rate = rate if rate is not None else Rate(250)
+        # options are appended to the requests, e.g. the requested camera resolution
+        self.__options = (';' + options).encode('utf-16-le') if options else b''
 
         # other
         self.__stop_thread = False
         self.out_bytes = b''
+        # number of frames received on the channel
+        self.seq = 0
+        # (out_bytes, seq) set in one assignment, so they are read together by snapshot
+        self.__frame = (b'', 0)
+
+        self.__header = bytearray(LENGTH_STRUCT.size)
+        self.__header_view = memoryview(self.__header)
+        self.__frame_buffer = FrameBuffer()
+        request = WAIT_FOR_DATA + self.__options
+        self.__poll_request = LENGTH_STRUCT.pack(len(request)) + request
 
         self.__sct = None
         self.__thread = None
@@ -23,7 +152,7 @@ class ListenPort:
         self.__thread = threading.Thread(target=self.listening, args=())
         self.__thread.start()
 
-    def listening(self):
+    def connect(self) -> bool:
         self.__sct = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
         try:
             self.__sct.connect(('127.0.0.1', self.__port))
@@ -34,42 +163,95 @@ class ListenPort:
                 self.__sct.shutdown(socket.SHUT_RDWR)
                 self.__sct.close()
             except (OSError, Exception): pass  # idc
-            return
+            return False
+        # small request/answer frames should not wait for Nagle's algorithm
+        self.__sct.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         self.__robot.write_log("LP: Connected: " + str(self.__port))
-        while not self.__stop_thread:
-            try:
-                dt = "Wait for data".encode('utf-16-le')
-                dt_ln = struct.pack('<I', len(dt))
-                self.__sct.sendall(dt_ln)
-                self.__sct.sendall(dt)
-
-                data_size = self.__sct.recv(4)
-                if len(data_size) < 4:
-                    continue
-                length = (data_size[3] & 0xff) << 24 | (data_size[2] & 0xff) << 16 | \
-                            (data_size[1] & 0xff) << 8 | (data_size[0] & 0xff)
-                self.out_bytes = self.__sct.recv(length)
-                # задержка для слабых компов
-                time.sleep(0.004)
-            except (ConnectionAbortedError, BrokenPipeError, OSError):
-                # возникает при отключении сокета
-                break
+        return True
+
+    def disconnect(self) -> None:
         self.__robot.write_log("LP: Disconnected: " + str(self.__port))
         try:
             self.__sct.shutdown(socket.SHUT_RDWR)
             self.__sct.close()
         except (OSError, Exception): pass  # idc
+        self.__sct = None
+
+    def listening(self):
+        if not self.connect():
+            return
+        try:
+            if self.__streaming and self.__start_stream():
+                self.__robot.write_log("LP: Streaming: " + str(self.__port))
+                self.__stream_loop()
+            else:
+                self.__poll_loop()
+        except (ConnectionAbortedError, BrokenPipeError, OSError):
+            # возникает при отключении сокета
+            pass
+        self.disconnect()
+
+    def receive_once(self) -> None:
+        """ One request/response of the polling handshake, the frame is put to out_bytes """
+        self.__sct.sendall(self.__poll_request)
+        recv_exact_into(self.__sct, self.__header_view)
+        self.__receive_frame(LENGTH_STRUCT.unpack_from(self.__header)[0], self.seq + 1)
+
+    def snapshot(self) -> tuple:
+        """ out_bytes and seq of the same frame """
+        return self.__frame
+
+    def __receive_frame(self, length: int, seq: int) -> None:
+        recv_exact_into(self.__sct, self.__frame_buffer.reserve(length))
+        view = self.__frame_buffer.publish(length)
+        self.out_bytes = view
+        self.seq = seq
+        self.__frame = (view, seq)
+
+    def __start_stream(self) -> bool:
+        supported = False
+        try:
+            request = STREAM_DATA + self.__options
+            self.__sct.sendall(LENGTH_STRUCT.pack(len(request)) + request)
+            recv_exact_into(self.__sct, self.__header_view)
+            if self.__header == STREAM_ACK:
+                supported = True
+                return True
+            # older simulator answered with a usual frame
+            self.__robot.write_log("LP: Streaming is not supported, polling: " + str(self.__port))
+            self.__receive_frame(LENGTH_STRUCT.unpack_from(self.__header)[0], self.seq + 1)
+            return False
+        finally:
+            if self.__negotiation is not None:
+                self.__negotiation.set_result(supported)
+
+    def __poll_loop(self) -> None:
+        while not self.__stop_thread:
+            self.receive_once()
+            # задержка для слабых компов
+            self.rate.sleep()
+
+    def __stream_loop(self) -> None:
+        header = bytearray(STREAM_HEADER_STRUCT.size)
+        header_view = memoryview(header)
+        while not self.__stop_thread:
+            recv_exact_into(self.__sct, header_view)
+            length, seq = STREAM_HEADER_STRUCT.unpack_from(header)
+            self.__receive_frame(length, seq)
 
     def reset_out(self):
         self.out_bytes = b''
+        self.__frame = (b'', self.seq)
 
     def stop_listening(self):
         self.__stop_thread = True
         self.reset_out()
-        if self.__sct is not None:
+        # socket could be closed and reset by the channel thread meanwhile
+        sct = self.__sct
+        if sct is not None:
             try:
-                self.__sct.shutdown(socket.SHUT_RDWR)
+                sct.shutdown(socket.SHUT_RDWR)
             except (OSError, Exception):
                 self.__robot.write_log("Something went wrong while shutting down socket on port " +
                                                  str(self.__port))
@@ -81,7 +263,7 @@ class ListenPort:
                         self.__robot.write_log("Something went wrong. Rude disconnection on port " +
                                                          str(self.__port))
                         try:
-                            self.__sct.close()
+                            sct.close()
                         except (OSError, Exception):
                             self.__robot.write_log("Something went wrong while closing socket on port " +
                                                              str(self.__port))
@@ -89,13 +271,23 @@ class ListenPort:
 
 
 class TalkPort:
-    def __init__(self, robot: Robot, port: int):
+    def __init__(self, robot: Robot, port: int, streaming: bool = False, rate: Rate = None,
+                 negotiation: StreamNegotiation = None):
         self.__port = port
         self.__robot = robot
+        self.__streaming = streaming
+        # stream is requested only if the sensor channel got it, without negotiation the simulator must support it
+        self.__negotiation = negotiation
+        # rate of sending in polling mode
+        self.rate = rate if rate is not None else Rate(250)
 
         # other
         self.__stop_thread = False
         self.out_bytes = b''
+        # number of frames sent on the channel
+        self.seq = 0
+        self.__changed = threading.Event()
+        self.__answer_view = memoryview(bytearray(8))
 
         self.__sct = None
         self.__thread = None
@@ -104,7 +296,7 @@ class TalkPort:
         self.__thread = threading.Thread(target=self.talking, args=())
         self.__thread.start()
 
-    def talking(self):
+    def connect(self) -> bool:
         self.__sct = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
         try:
             self.__sct.connect(('127.0.0.1', self.__port))
@@ -115,26 +307,86 @@ class TalkPort:
                 self.__sct.shutdown(socket.SHUT_RDWR)
                 self.__sct.close()
             except (OSError, Exception): pass  # idc
-            return
-        
+            return False
+        # small request/answer frames should not wait for Nagle's algorithm
+        self.__sct.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
         self.__robot.write_log("TP: Connected: " + str(self.__port))
-        while not self.__stop_thread:
-            try:
-                dt_ln = struct.pack('<I', len(self.out_bytes))
-                self.__sct.sendall(dt_ln)
-                self.__sct.sendall(self.out_bytes)
-                _ = self.__sct.recv(4)  # ответ сервера
-                _ = self.__sct.recv(4)  # ответ сервера
-                # задержка для слабых компов
-                time.sleep(0.004)
-            except (ConnectionAbortedError, BrokenPipeError, OSError):
-                # возникает при отключении сокета
-                break
-        self.__robot.write_log("LP: Disconnected: " + str(self.__port))
+        return True
+
+    def disconnect(self) -> None:
+        self.__robot.write_log("TP: Disconnected: " + str(self.__port))
         try:
             self.__sct.shutdown(socket.SHUT_RDWR)
             self.__sct.close()
         except (OSError, Exception): pass  # idc
+        self.__sct = None
+
+    def talking(self):
+        if not self.connect():
+            return
+        try:
+            if self.__streaming and self.__start_stream():
+                self.__robot.write_log("TP: Streaming: " + str(self.__port))
+                self.__stream_loop()
+            else:
+                self.__poll_loop()
+        except (ConnectionAbortedError, BrokenPipeError, OSError):
+            # возникает при отключении сокета
+            pass
+        self.disconnect()
+
+    def send_once(self, data: bytes) -> None:
+        """ One send/answer of the polling handshake """
+        self.out_bytes = data
+        self.__sct.sendall(LENGTH_STRUCT.pack(len(data)) + data)
+        recv_exact_into(self.__sct, self.__answer_view)  # два ответа сервера по 4 байта
+        self.seq += 1
+
+    def push(self, data: bytes) -> None:
+        """ Sets data to send, in streaming mode only changed data is pushed """
+        if data != self.out_bytes:
+            self.out_bytes = data
+            self.__changed.set()
+
+    def __stream_supported(self) -> bool:
+        if self.__negotiation is None:
+            return True
+        deadline = time.monotonic() + STREAM_NEGOTIATION_TIMEOUT
+        while not self.__stop_thread and time.monotonic() < deadline:
+            if self.__negotiation.wait(0.05):
+                return True
+            if self.__negotiation.done:
+                break
+        self.__robot.write_log("TP: Streaming is not negotiated, polling: " + str(self.__port))
+        return False
+
+    def __start_stream(self) -> bool:
+        if not self.__stream_supported():
+            return False
+        self.__sct.sendall(LENGTH_STRUCT.pack(len(STREAM_DATA)) + STREAM_DATA)
+        answer = bytearray(4)
+        recv_exact_into(self.__sct, memoryview(answer))
+        if answer == STREAM_ACK:
+            return True
+        # older simulator took the request as data and sent the second answer
+        recv_exact_into(self.__sct, memoryview(answer))
+        self.__robot.write_log("TP: Streaming is not supported, polling: " + str(self.__port))
+        return False
+
+    def __poll_loop(self) -> None:
+        while not self.__stop_thread:
+            self.send_once(self.out_bytes)
+            # задержка для слабых компов
+            self.rate.sleep()
+
+    def __stream_loop(self) -> None:
+        while not self.__stop_thread:
+            self.__changed.wait(STREAM_KEEPALIVE)
+            self.__changed.clear()
+            out_bytes = self.out_bytes
+            self.seq += 1
+            self.__sct.sendall(STREAM_HEADER_STRUCT.pack(len(out_bytes), self.seq) + out_bytes)
 
     def reset_out(self):
         self.out_bytes = b''
@@ -142,9 +394,12 @@ class TalkPort:
     def stop_talking(self):
         self.__stop_thread = True
         self.reset_out()
-        if self.__sct is not None:
+        self.__changed.set()
+        # socket could be closed and reset by the channel thread meanwhile
+        sct = self.__sct
+        if sct is not None:
             try:
-                self.__sct.shutdown(socket.SHUT_RDWR)
+                sct.shutdown(socket.SHUT_RDWR)
             except (OSError, Exception):
                 self.__robot.write_log("Something went wrong while shutting down socket on port " +
                                                  str(self.__port))
@@ -156,8 +411,81 @@ class TalkPort:
                         self.__robot.write_log("Something went wrong. Rude disconnection on port " +
                                                          str(self.__port))
                         try:
-                            self.__sct.close()
+                            sct.close()
                         except (OSError, Exception):
                             self.__robot.write_log("Something went wrong while closing socket on port " +
                                                              str(self.__port))
                         st_time = time.time()
+
+
+class StepPort:
+    """ Channel of the lockstep mode, one call of step is one simulated tick """
+    def __init__(self, robot: Robot, port: int):
+        self.__port = port
+        self.__robot = robot
+
+        self.out_bytes = b''
+        # tick of the last received sensors
+        self.seq = 0
+        self.__commands = b''
+        self.__header = bytearray(STEP_HEADER_STRUCT.size)
+        self.__frame_buffer = FrameBuffer()
+
+        self.__sct = None
+
+    def connect(self) -> bool:
+        self.__sct = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        try:
+            self.__sct.connect(('127.0.0.1', self.__port))
+        except ConnectionRefusedError:
+            self.__robot.write_log("SP: Failed to connect on port " + str(self.__port))
+            print("SP: Failed to connect on port " + str(self.__port))
+            try:
+                self.__sct.close()
+            except (OSError, Exception): pass  # idc
+            self.__sct = None
+            return False
+        self.__sct.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.__robot.write_log("SP: Connected: " + str(self.__port))
+        return True
+
+    def disconnect(self) -> None:
+        sct = self.__sct
+        self.__sct = None
+        if sct is None:
+            return
+        self.__robot.write_log("SP: Disconnected: " + str(self.__port))
+        try:
+            sct.shutdown(socket.SHUT_RDWR)
+            sct.close()
+        except (OSError, Exception): pass  # idc
+
+    def push(self, data: bytes) -> None:
+        """ Sets commands sent with the next step """
+        self.__commands = data
+
+    def step(self) -> None:
+        """ Sends the commands and waits for the sensors of the next tick """
+        sct = self.__sct
+        if sct is None:
+            raise ConnectionAbortedError("lockstep simulator is not connected on port " + str(self.__port))
+        commands = self.__commands
+        try:
+            sct.sendall(STEP_HEADER_STRUCT.pack(len(commands), self.seq) + commands)
+            recv_exact_into(sct, memoryview(self.__header))
+            length, tick = STEP_HEADER_STRUCT.unpack_from(self.__header)
+            recv_exact_into(sct, self.__frame_buffer.reserve(length))
+        except (ConnectionAbortedError, BrokenPipeError, OSError):
+            # возникает при отключении сокета
+            self.disconnect()
+            raise
+        self.out_bytes = self.__frame_buffer.publish(length)
+        self.seq = tick
+
+    def snapshot(self) -> tuple:
+        """ out_bytes and seq of the same tick, step runs in the thread of the reader """
+        return self.out_bytes, self.seq
+
+    def reset_out(self):
+        self.out_bytes = b''
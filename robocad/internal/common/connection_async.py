@@ -0,0 +1,290 @@
+from abc import ABC, abstractmethod
+import asyncio
+import concurrent.futures
+import socket
+from threading import Thread
+
+from .connection import FrameBuffer, LENGTH_STRUCT, WAIT_FOR_DATA, STREAM_DATA, STREAM_ACK, \
+    STREAM_HEADER_STRUCT, STREAM_KEEPALIVE, STREAM_NEGOTIATION_TIMEOUT, StreamNegotiation
+from .rate import Rate
+from .robot import Robot
+
+
+async def sock_recv_exact_into(loop: asyncio.AbstractEventLoop, sct: socket.socket, view: memoryview) -> None:
+    """ Fills the whole view from the non-blocking socket, raises ConnectionAbortedError if the peer is gone """
+    got = 0
+    length = len(view)
+    while got < length:
+        n = await loop.sock_recv_into(sct, view[got:])
+        if n == 0:
+            raise ConnectionAbortedError("socket closed by peer")
+        got += n
+
+
+class AsyncSimLoop:
+    """ One event loop thread for all simulator channels and the codec step """
+    def __init__(self, robot: Robot):
+        self.__robot = robot
+        self.loop = asyncio.new_event_loop()
+        self.__thread = Thread(target=self.__run, daemon=True)
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def __run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def spawn(self, coro) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def cancel(self, future: concurrent.futures.Future, timeout: float = 1) -> None:
+        """ Cancels the coroutine and waits until it is finished """
+        if future is None:
+            return
+        future.cancel()
+        try:
+            future.result(timeout)
+        except (concurrent.futures.CancelledError, concurrent.futures.TimeoutError):
+            pass
+        except Exception as e:
+            self.__robot.write_log(str(e))
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.__thread.join(1)
+        if not self.loop.is_running():
+            self.loop.close()
+
+
+class AsyncChannel(ABC):
+    def __init__(self, robot: Robot, sim_loop: AsyncSimLoop, port: int, streaming: bool, name: str):
+        self._robot = robot
+        self._sim_loop = sim_loop
+        self._port = port
+        self._streaming = streaming
+        self.__name = name
+        self.__future: concurrent.futures.Future = None
+
+    def _start(self) -> None:
+        self.__future = self._sim_loop.spawn(self.__run())
+
+    def _stop(self) -> None:
+        self._sim_loop.cancel(self.__future)
+        self.__future = None
+
+    async def __run(self) -> None:
+        loop = asyncio.get_running_loop()
+        sct = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sct.setblocking(False)
+        # small request/answer frames should not wait for Nagle's algorithm
+        sct.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            try:
+                await loop.sock_connect(sct, ('127.0.0.1', self._port))
+            except OSError:
+                self._robot.write_log(self.__name + ": Failed to connect on port " + str(self._port))
+                print(self.__name + ": Failed to connect on port " + str(self._port))
+                return
+
+            self._robot.write_log(self.__name + ": Connected: " + str(self._port))
+            try:
+                if self._streaming and await self._start_stream(loop, sct):
+                    self._robot.write_log(self.__name + ": Streaming: " + str(self._port))
+                    await self._stream_loop(loop, sct)
+                else:
+                    await self._poll_loop(loop, sct)
+            except (ConnectionAbortedError, BrokenPipeError, OSError):
+                # возникает при отключении сокета
+                pass
+            self._robot.write_log(self.__name + ": Disconnected: " + str(self._port))
+        finally:
+            try:
+                sct.close()
+            except (OSError, Exception): pass  # idc
+
+    @abstractmethod
+    async def _start_stream(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> bool:
+        pass
+
+    @abstractmethod
+    async def _poll_loop(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> None:
+        pass
+
+    @abstractmethod
+    async def _stream_loop(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> None:
+        pass
+
+
+class AsyncListenChannel(AsyncChannel):
+    """ Same interface and protocol as ListenPort, runs as a coroutine on the AsyncSimLoop """
+    def __init__(self, robot: Robot, sim_loop: AsyncSimLoop, port: int, streaming: bool = False,
+                 rate: Rate = None, options: str = '', negotiation: StreamNegotiation = None):
+        super().__init__(robot, sim_loop, port, streaming, "ALP")
+        self.__negotiation = negotiation
+        self.rate = rate if rate is not None else Rate(250)
+        self.__options = (';' + options).encode('utf-16-le') if options else b''
+
+        self.out_bytes = b''
+        self.seq = 0
+        # (out_bytes, seq) set in one assignment, so they are read together by snapshot
+        self.__frame = (b'', 0)
+        # set by every received frame, created on the loop thread
+        self.__frame_event: asyncio.Event = None
+
+        self.__header = bytearray(LENGTH_STRUCT.size)
+        self.__frame_buffer = FrameBuffer()
+
+    def start_listening(self):
+        self._start()
+
+    def stop_listening(self):
+        self._stop()
+        self.reset_out()
+
+    def reset_out(self):
+        self.out_bytes = b''
+        self.__frame = (b'', self.seq)
+
+    def snapshot(self) -> tuple:
+        """ out_bytes and seq of the same frame """
+        return self.__frame
+
+    async def wait_frame(self, timeout: float) -> None:
+        """ Waits on the loop until the next frame is received or timeout is over """
+        if self.__frame_event is None:
+            self.__frame_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self.__frame_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.__frame_event.clear()
+
+    async def __receive_frame(self, loop: asyncio.AbstractEventLoop, sct: socket.socket, length: int,
+                              seq: int) -> None:
+        await sock_recv_exact_into(loop, sct, self.__frame_buffer.reserve(length))
+        view = self.__frame_buffer.publish(length)
+        self.out_bytes = view
+        self.seq = seq
+        self.__frame = (view, seq)
+        if self.__frame_event is not None:
+            self.__frame_event.set()
+
+    async def _start_stream(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> bool:
+        supported = False
+        try:
+            request = STREAM_DATA + self.__options
+            await loop.sock_sendall(sct, LENGTH_STRUCT.pack(len(request)) + request)
+            await sock_recv_exact_into(loop, sct, memoryview(self.__header))
+            if self.__header == STREAM_ACK:
+                supported = True
+                return True
+            # older simulator answered with a usual frame
+            self._robot.write_log("ALP: Streaming is not supported, polling: " + str(self._port))
+            await self.__receive_frame(loop, sct, LENGTH_STRUCT.unpack_from(self.__header)[0], self.seq + 1)
+            return False
+        finally:
+            if self.__negotiation is not None:
+                self.__negotiation.set_result(supported)
+
+    async def _poll_loop(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> None:
+        request = WAIT_FOR_DATA + self.__options
+        request = LENGTH_STRUCT.pack(len(request)) + request
+        header_view = memoryview(self.__header)
+        while True:
+            await loop.sock_sendall(sct, request)
+
+            await sock_recv_exact_into(loop, sct, header_view)
+            await self.__receive_frame(loop, sct, LENGTH_STRUCT.unpack_from(self.__header)[0], self.seq + 1)
+            await asyncio.sleep(self.rate.delay())
+
+    async def _stream_loop(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> None:
+        header = bytearray(STREAM_HEADER_STRUCT.size)
+        header_view = memoryview(header)
+        while True:
+            await sock_recv_exact_into(loop, sct, header_view)
+            length, seq = STREAM_HEADER_STRUCT.unpack_from(header)
+            await self.__receive_frame(loop, sct, length, seq)
+
+
+class AsyncTalkChannel(AsyncChannel):
+    """ Same interface and protocol as TalkPort, runs as a coroutine on the AsyncSimLoop """
+    def __init__(self, robot: Robot, sim_loop: AsyncSimLoop, port: int, streaming: bool = False,
+                 rate: Rate = None, negotiation: StreamNegotiation = None):
+        super().__init__(robot, sim_loop, port, streaming, "ATP")
+        # same as in TalkPort: the stream is requested only after the sensor channel got it
+        self.__negotiation = negotiation
+        self.rate = rate if rate is not None else Rate(250)
+
+        self.out_bytes = b''
+        self.seq = 0
+        # event is created on the loop thread
+        self.__changed: asyncio.Event = None
+
+    def start_talking(self):
+        self._start()
+
+    def stop_talking(self):
+        self._stop()
+        self.reset_out()
+
+    def reset_out(self):
+        self.out_bytes = b''
+
+    def push(self, data: bytes) -> None:
+        """ Sets data to send, in streaming mode only changed data is pushed """
+        if data != self.out_bytes:
+            self.out_bytes = data
+            self._sim_loop.loop.call_soon_threadsafe(self.__set_changed)
+
+    def __set_changed(self) -> None:
+        if self.__changed is not None:
+            self.__changed.set()
+
+    async def __stream_supported(self) -> bool:
+        if self.__negotiation is None:
+            return True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_NEGOTIATION_TIMEOUT
+        # the sensor channel runs on the same loop, so the result is polled, not waited for
+        while not self.__negotiation.done and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        if self.__negotiation.supported:
+            return True
+        self._robot.write_log("ATP: Streaming is not negotiated, polling: " + str(self._port))
+        return False
+
+    async def _start_stream(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> bool:
+        if not await self.__stream_supported():
+            return False
+        await loop.sock_sendall(sct, LENGTH_STRUCT.pack(len(STREAM_DATA)) + STREAM_DATA)
+        answer = bytearray(4)
+        await sock_recv_exact_into(loop, sct, memoryview(answer))
+        if answer == STREAM_ACK:
+            return True
+        # older simulator took the request as data and sent the second answer
+        await sock_recv_exact_into(loop, sct, memoryview(answer))
+        self._robot.write_log("ATP: Streaming is not supported, polling: " + str(self._port))
+        return False
+
+    async def _poll_loop(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> None:
+        answer_view = memoryview(bytearray(8))
+        while True:
+            out_bytes = self.out_bytes
+            await loop.sock_sendall(sct, LENGTH_STRUCT.pack(len(out_bytes)) + out_bytes)
+            await sock_recv_exact_into(loop, sct, answer_view)  # два ответа сервера по 4 байта
+            self.seq += 1
+            await asyncio.sleep(self.rate.delay())
+
+    async def _stream_loop(self, loop: asyncio.AbstractEventLoop, sct: socket.socket) -> None:
+        self.__changed = asyncio.Event()
+        while True:
+            # current data is sent right away, then on every change
+            self.__changed.clear()
+            out_bytes = self.out_bytes
+            self.seq += 1
+            await loop.sock_sendall(sct, STREAM_HEADER_STRUCT.pack(len(out_bytes), self.seq) + out_bytes)
+            try:
+                await asyncio.wait_for(self.__changed.wait(), STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                pass
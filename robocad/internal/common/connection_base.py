@@ -13,3 +13,18 @@ class ConnectionBase(ABC):
     @abstractmethod
     def get_lidar(self):
         pass
+
+    def get_next_lidar_scan(self, timeout: float = None):
+        return None
+
+    def get_lidar_points(self, out=None):
+        return None
+
+    def subscribe_camera(self, max_fps: float = None) -> None:
+        pass
+
+    def unsubscribe_camera(self) -> None:
+        pass
+
+    def step(self) -> None:
+        pass
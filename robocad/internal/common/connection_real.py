@@ -5,7 +5,8 @@ import cv2
 
 from .connection_base import ConnectionBase
 from .robot import Robot
-from .shared import LibHolder
+from .realtime import lock_memory
+from .emulator import create_lib
 from .updaters import Updater
 from .robot_configuration import RobotConfiguration, LidarTypes
 from .yd_lidar_x2 import YDLidarX2
@@ -16,7 +17,9 @@ class ConnectionReal(ConnectionBase):
     def __init__(self, robot: Robot, updater: Updater, conf: RobotConfiguration):
         self.__robot = robot
         self.__updater = updater
-        self.__lib = LibHolder(conf.lib_holder_first_path)
+        if conf.rt_lock_memory:
+            lock_memory(self.__robot)
+        self.__lib = create_lib(conf)
 
         try:
             self.__camera_instance = cv2.VideoCapture(conf.camera_index)
@@ -24,11 +27,14 @@ class ConnectionReal(ConnectionBase):
             self.__robot.write_log("Exception while creating camera instance: ")
             self.__robot.write_log(str(e))
 
+        self.__lidar_instance = None
         try:
             if (conf.lidar_type == LidarTypes.YD_LIDAR_X2):
-                self.__lidar_instance = YDLidarX2(robot, conf.lidar_port)
+                self.__lidar_instance = YDLidarX2(robot, conf.lidar_port, conf=conf)
             elif (conf.lidar_type == LidarTypes.N10_LIDAR):
-                self.__lidar_instance = N10Lidar(robot, conf.lidar_port)
+                self.__lidar_instance = N10Lidar(robot, conf.lidar_port, conf=conf)
+            self.__lidar_instance.mount_offset = conf.lidar_offset
+            self.__lidar_instance.mount_rotation = conf.lidar_rotation
             self.__lidar_instance.start()
         except Exception as e:
             self.__robot.write_log("Exception while creating lidar instance: ")
@@ -66,6 +72,16 @@ class ConnectionReal(ConnectionBase):
             # there could be an error if there is no lidar instance
             pass
         return None
+
+    def get_next_lidar_scan(self, timeout: float = None):
+        if self.__lidar_instance is None:
+            return None
+        return self.__lidar_instance.get_next_scan(timeout)
+
+    def get_lidar_points(self, out=None):
+        if self.__lidar_instance is None:
+            return None
+        return self.__lidar_instance.get_points(out)
     
     def spi_ini(self, path: str, channel: int, speed: int, mode: int) -> int:
         return self.__lib.init_spi(path, channel, speed, mode)
@@ -1,51 +1,298 @@
-from threading import Thread
-import time
+from threading import Thread, Lock
+from typing import Callable
+import asyncio
 
 import numpy as np
-import cv2
 
-from .connection import TalkPort, ListenPort
+from .connection import TalkPort, ListenPort, StepPort, StreamNegotiation, LEGACY_CAMERA_SIZE, CAMERA_MAGIC, CAMERA_HEADER_STRUCT
+from .connection_async import AsyncSimLoop, AsyncTalkChannel, AsyncListenChannel
 from .connection_base import ConnectionBase
+from .rate import Rate
+from .realtime import apply_thread_realtime, lock_memory
+from .shm_connection import SimSharedMemory, ShmTalkChannel, ShmListenChannel
 from .robot import Robot
+from .robot_configuration import RobotConfiguration, SimTransports, CameraFormats
 
 
 class ConnectionSim(ConnectionBase):
     __port_set_data: int = 65431
     __port_get_data: int = 65432
     __port_camera: int = 65438
+    __port_step: int = 65433
 
-    def __init__(self, robot: Robot):
+    def __init__(self, robot: Robot, conf: RobotConfiguration):
         self.__robot = robot
+        self.__conf = conf
+        if conf.rt_lock_memory:
+            lock_memory(self.__robot)
+        self.__streaming = conf.sim_streaming
 
-        self.__talk_channel = TalkPort(self.__robot, self.__port_set_data)
-        self.__talk_channel.start_talking()
-        self.__listen_channel = ListenPort(self.__robot, self.__port_get_data)
-        self.__listen_channel.start_listening()
-        self.__camera_channel = ListenPort(self.__robot, self.__port_camera)
-        self.__camera_channel.start_listening()
+        # decoded camera frame is cached until the next frame is received, so a repeated read costs nothing.
+        # reads get the cached array itself, it is read-only and must be copied before drawing on it
+        self.__camera_frame = None
+        self.__camera_seq = -1
+        # camera channel is created on subscription, but not after stop
+        self.__camera_channel = None
+        self.__stopped = False
+        self.__camera_max_fps = conf.sim_camera_max_fps
+        self.__channel_hz = conf.sim_channel_hz
+        self.__rate_policy = conf.rate_policy
+        self.__camera_lock = Lock()
+        self.__camera_request = (conf.sim_camera_width, conf.sim_camera_height, conf.sim_camera_format)
+
+        # codec step of the robot
+        self.__update_thread: Thread = None
+        self.__update_future = None
+        self.__stop_update = False
+        self.__update_rate = Rate(conf.sim_update_hz, conf.rate_policy)
+        # in lockstep mode the codec step is run by step() of the user program
+        self.__lockstep = conf.sim_lockstep
+        self.__step_update: Callable[[], None] = None
+        if self.__lockstep and (conf.sim_transport != SimTransports.TCP or conf.sim_coupled_exchange):
+            self.__robot.write_log("Lockstep mode uses its own TCP channel, transport options are ignored")
+        # commands and sensors are exchanged by the codec step itself
+        self.__coupled = conf.sim_coupled_exchange and conf.sim_transport == SimTransports.TCP \
+            and not self.__lockstep
+        if conf.sim_coupled_exchange and conf.sim_transport != SimTransports.TCP:
+            self.__robot.write_log("Coupled exchange is used only with TCP transport, ignored")
+        # tick (sensor frame id) of the data returned by the last get_data
+        self.data_tick = 0
+
+        self.__shm: SimSharedMemory = None
+        self.__loop: AsyncSimLoop = None
+        self.__step_channel: StepPort = None
+        if self.__lockstep:
+            self.__step_channel = StepPort(self.__robot, self.__port_step)
+            self.__step_channel.connect()
+            # sensors and commands of the lockstep mode go through the step channel only
+            self.__talk_channel = self.__listen_channel = self.__step_channel
+        elif conf.sim_transport == SimTransports.SHARED_MEMORY:
+            self.__shm = SimSharedMemory(conf.sim_shm_path)
+            self.__robot.write_log("Shared memory: " + conf.sim_shm_path)
+            self.__talk_channel = ShmTalkChannel(self.__shm.command_block)
+            self.__listen_channel = ShmListenChannel(self.__shm.sensor_block)
+        elif conf.sim_transport == SimTransports.ASYNC_TCP:
+            self.__loop = AsyncSimLoop(self.__robot)
+            self.__loop.start()
+            # commands are streamed only after the sensor channel got the stream
+            negotiation = StreamNegotiation()
+            self.__talk_channel = AsyncTalkChannel(self.__robot, self.__loop, self.__port_set_data, conf.sim_streaming,
+                                                   self.__channel_rate('sim talk'), negotiation)
+            self.__listen_channel = AsyncListenChannel(self.__robot, self.__loop, self.__port_get_data,
+                                                       conf.sim_streaming, self.__channel_rate('sim listen'),
+                                                       negotiation=negotiation)
+        else:
+            negotiation = StreamNegotiation()
+            self.__talk_channel = TalkPort(self.__robot, self.__port_set_data, conf.sim_streaming,
+                                           self.__channel_rate('sim talk'), negotiation)
+            self.__listen_channel = ListenPort(self.__robot, self.__port_get_data, conf.sim_streaming,
+                                               self.__channel_rate('sim listen'), negotiation=negotiation)
+        if not self.__coupled and not self.__lockstep:
+            self.__talk_channel.start_talking()
+            self.__listen_channel.start_listening()
 
     def stop(self) -> None:
-        self.__talk_channel.stop_talking()
-        self.__listen_channel.stop_listening()
-        self.__camera_channel.stop_listening()
+        with self.__camera_lock:
+            # camera reads during the shutdown must not start the channel again
+            self.__stopped = True
+        self.stop_update()
+        if self.__step_channel is not None:
+            self.__step_channel.disconnect()
+        else:
+            self.__talk_channel.stop_talking()
+            self.__listen_channel.stop_listening()
+        self.unsubscribe_camera()
+        if self.__shm is not None:
+            self.__shm.close()
+        if self.__loop is not None:
+            self.__loop.stop()
+
+    def __channel_rate(self, name: str, hz: float = None) -> Rate:
+        rate = Rate(self.__channel_hz if hz is None else hz, self.__rate_policy)
+        self.__robot.robot_info.loop_rates[name] = rate
+        return rate
+
+    def start_update(self, update: Callable[[], None]) -> None:
+        """ Runs the codec step of the robot (sets commands and parses sensors) until stop_update """
+        self.__stop_update = False
+        if self.__lockstep:
+            self.__step_update = update
+            return
+        self.__update_rate.reset()
+        self.__robot.robot_info.loop_rates['sim update'] = self.__update_rate
+        if self.__loop is not None:
+            self.__update_future = self.__loop.spawn(self.__async_update_loop(update))
+        else:
+            target = self.__coupled_update_loop if self.__coupled else self.__update_loop
+            self.__update_thread = Thread(target=target, args=(update,))
+            self.__update_thread.daemon = True
+            self.__update_thread.start()
+
+    def stop_update(self) -> None:
+        self.__stop_update = True
+        self.__step_update = None
+        if self.__coupled:
+            # the coupled step could wait for an answer of a stuck simulator, shutting the sockets down breaks it
+            self.__talk_channel.stop_talking()
+            self.__listen_channel.stop_listening()
+        if self.__update_thread is not None:
+            self.__update_thread.join()
+            self.__update_thread = None
+        if self.__update_future is not None:
+            self.__loop.cancel(self.__update_future)
+            self.__update_future = None
+
+    def step(self) -> None:
+        """ Lockstep mode: runs one codec step, so commands are sent and sensors of the next tick are received.
+            Does nothing in other modes, there the step is run by the update loop """
+        update = self.__step_update
+        if update is not None:
+            update()
+
+    def __update_loop(self, update: Callable[[], None]) -> None:
+        apply_thread_realtime(self.__robot, self.__conf, 'sim update')
+        while not self.__stop_update:
+            update()
+            # задержка для слабых компов
+            self.__update_rate.sleep()
+
+    def __coupled_update_loop(self, update: Callable[[], None]) -> None:
+        apply_thread_realtime(self.__robot, self.__conf, 'sim update')
+        if not self.__talk_channel.connect():
+            return
+        if not self.__listen_channel.connect():
+            self.__talk_channel.disconnect()
+            return
+        try:
+            while not self.__stop_update:
+                # set_data and get_data inside the step do the exchange
+                update()
+                # задержка для слабых компов
+                self.__update_rate.sleep()
+        except (ConnectionAbortedError, BrokenPipeError, OSError):
+            # возникает при отключении сокета
+            pass
+        self.__talk_channel.disconnect()
+        self.__listen_channel.disconnect()
+
+    async def __async_update_loop(self, update: Callable[[], None]) -> None:
+        # the loop thread also runs the channels
+        apply_thread_realtime(self.__robot, self.__conf, 'sim update')
+        while not self.__stop_update:
+            update()
+            # step runs when sensors arrive, the rate is the longest wait
+            await self.__listen_channel.wait_frame(self.__update_rate.delay())
+
+    def subscribe_camera(self, max_fps: float = None) -> None:
+        """ Starts the camera channel, max_fps limits how often frames are requested (0 - no limit) """
+        with self.__camera_lock:
+            if self.__stopped:
+                return
+            if max_fps is not None:
+                self.__camera_max_fps = max_fps
+            hz = self.__camera_max_fps if self.__camera_max_fps > 0 else self.__channel_hz
+            if self.__camera_channel is not None:
+                if self.__shm is None:
+                    self.__camera_channel.rate.hz = hz
+                return
+
+            if self.__shm is not None:
+                self.__camera_channel = ShmListenChannel(self.__shm.camera_block)
+                self.__shm.camera_request = self.__camera_request
+                self.__shm.camera_subscribed = True
+            else:
+                # default frame is requested as before, so older simulators get the same request
+                options = ''
+                if self.__camera_request != (640, 480, CameraFormats.RGB):
+                    options = "camera=%dx%d;format=%d" % self.__camera_request
+                if self.__loop is not None:
+                    self.__camera_channel = AsyncListenChannel(self.__robot, self.__loop, self.__port_camera,
+                                                               self.__streaming, self.__channel_rate('sim camera', hz),
+                                                               options)
+                else:
+                    self.__camera_channel = ListenPort(self.__robot, self.__port_camera, self.__streaming,
+                                                       self.__channel_rate('sim camera', hz), options)
+            self.__camera_channel.start_listening()
+            self.__robot.write_log("Camera subscribed")
+
+    def unsubscribe_camera(self) -> None:
+        """ Stops the camera channel, it is started again on the next camera read """
+        with self.__camera_lock:
+            if self.__camera_channel is None:
+                return
+            if self.__shm is not None:
+                self.__shm.camera_subscribed = False
+            self.__camera_channel.stop_listening()
+            self.__camera_channel = None
+            self.__robot.robot_info.loop_rates.pop('sim camera', None)
+            self.__camera_frame = None
+            self.__camera_seq = -1
+            self.__robot.write_log("Camera unsubscribed")
 
     def get_camera(self):
-        camera_data = self.__camera_channel.out_bytes
-        if len(camera_data) == 921600:
-            nparr = np.frombuffer(camera_data, np.uint8)
-            if nparr.size > 0:
-                img_rgb = nparr.reshape(480, 640, 3)
-                img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
-                rotated = cv2.rotate(img_bgr, cv2.ROTATE_180)
-                flipped = cv2.flip(rotated, 1)
-                return flipped
-        return None
+        if self.__stopped:
+            return None
+        camera_channel = self.__camera_channel
+        if camera_channel is None:
+            self.subscribe_camera()
+            camera_channel = self.__camera_channel
+            if camera_channel is None:
+                # stopped meanwhile
+                return None
+
+        # unsubscribe could drop the cache meanwhile, so it is read once
+        with self.__camera_lock:
+            cached_frame, cached_seq = self.__camera_frame, self.__camera_seq
+        camera_data, seq = camera_channel.snapshot()
+        if seq == cached_seq:
+            return cached_frame
+
+        length = len(camera_data)
+        if length == LEGACY_CAMERA_SIZE:
+            width, height, fmt, offset = 640, 480, CameraFormats.RGB, 0
+        elif length >= CAMERA_HEADER_STRUCT.size:
+            magic, width, height, fmt = CAMERA_HEADER_STRUCT.unpack_from(camera_data)
+            offset = CAMERA_HEADER_STRUCT.size
+            if magic != CAMERA_MAGIC:
+                return None
+        else:
+            return None
+
+        channels = 1 if fmt == CameraFormats.GRAY else 3
+        if length - offset != width * height * channels:
+            return None
+        img = np.frombuffer(camera_data, np.uint8, width * height * channels, offset)
+        if channels == 1:
+            # ROTATE_180 + horizontal flip is a vertical flip
+            frame = np.ascontiguousarray(img.reshape(height, width)[::-1])
+        else:
+            # RGB2BGR + ROTATE_180 + horizontal flip is a vertical flip with reversed channels,
+            # so the whole transform is one copy of a strided view
+            frame = np.ascontiguousarray(img.reshape(height, width, 3)[::-1, :, ::-1])
+        # the same array is returned until the next frame
+        frame.flags.writeable = False
+        with self.__camera_lock:
+            # frame of an unsubscribed channel is not cached
+            if self.__camera_channel is camera_channel:
+                self.__camera_frame, self.__camera_seq = frame, seq
+        return frame
     
     def get_lidar(self):
         return None
     
     def set_data(self, data: bytes):
-        self.__talk_channel.out_bytes = data
+        if self.__lockstep:
+            self.__step_channel.push(data)
+        elif self.__coupled:
+            self.__talk_channel.send_once(data)
+        else:
+            self.__talk_channel.push(data)
 
     def get_data(self) -> bytes:
-        return self.__listen_channel.out_bytes
+        if self.__lockstep:
+            self.__step_channel.step()
+        elif self.__coupled:
+            self.__listen_channel.receive_once()
+        # tick and data of the same frame
+        out_bytes, self.data_tick = self.__listen_channel.snapshot()
+        return out_bytes
@@ -0,0 +1,327 @@
+import argparse
+import os
+import struct
+import time
+from threading import Thread, Lock
+
+from .robot_configuration import RobotConfiguration, LibEmulators
+from .shared import LibHolder
+
+
+def _wrap_angle(angle: float) -> float:
+    return (angle + 180) % 360 - 180
+
+
+class EmulatedBoard:
+    """ Titan and VMX boards of Studica and Algaritm without the hardware.
+        The platform is recognized by the request packets. Encoders move with the motor speeds,
+        step motors are busy while their steps are done, yaw turns with yaw_rate (deg/s).
+        Limits, IMU angles, ultrasound, analog and digital inputs could be set by the test """
+    # encoder ticks per second at 100 % speed
+    TICKS_PER_SECOND = 1000
+    TITAN_LENGTH = 48
+    STUDICA_VMX_LENGTH = 10
+    ALGARITM_VMX_LENGTH = 16
+
+    STUDICA_TX_SPEEDS_STRUCT = struct.Struct('>4HB')
+    STUDICA_RX_STRUCT = struct.Struct('<B4HBB')
+    ALGARITM_TX_HEAD_STRUCT = struct.Struct('<4bBBB')
+    ALGARITM_TX_STEPS_STRUCT = struct.Struct('>4I')
+    ALGARITM_TX_PID_STRUCT = struct.Struct('<3f')
+    ALGARITM_RX_STRUCT = struct.Struct('<B4IBBB')
+    STUDICA_PAGE_STRUCT = struct.Struct('<B4HB')
+    ALGARITM_PAGE_1_STRUCT = struct.Struct('<B7H')
+    ALGARITM_PAGE_2_STRUCT = struct.Struct('<B5HB')
+    ALGARITM_PAGE_3_STRUCT = struct.Struct('<B3HBH')
+    ALGARITM_VMX_TX_STRUCT = struct.Struct('<8BB')
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__last_time: float = None
+
+        # received commands
+        self.speeds = [0.0] * 4
+        self.additional_servos = [0, 0]
+        self.use_pid = False
+        self.pid = (0.0, 0.0, 0.0)
+        self.servo_angles = [0] * 8
+        self.outputs = [False] * 4
+
+        # motion
+        self.encoders = [0.0] * 4
+        self.step_busy = [False, False]
+        self.__step_left = [0.0, 0.0]
+        self.__step_rate = [0, 0]
+        self.__step_command = [None, None]
+
+        # sensors
+        self.limits_l = [False] * 4
+        self.limits_h = [False] * 4
+        self.yaw = 0.0
+        self.pitch = 0.0
+        self.roll = 0.0
+        self.yaw_rate = 0.0
+        self.ultrasound = [0.0] * 4
+        self.analog = [0] * 8
+        self.flex = [False] * 8
+        self.inputs = [False] * 4
+        self.power = 12.0
+
+        # pages go round-robin like the old firmware until another page than 1 is requested
+        self.__follow_pages = False
+        self.__next_page = 0
+
+    def titan_request(self, tx) -> bytearray:
+        rx = bytearray(EmulatedBoard.TITAN_LENGTH)
+        if len(tx) < EmulatedBoard.TITAN_LENGTH or tx[0] != 1:
+            return rx
+        with self.__lock:
+            # byte 20 of Algaritm is a step value, byte 40 of Studica is always 0
+            if tx[40] == 222:
+                self.__algaritm_titan(tx, rx)
+            elif tx[20] == 222:
+                self.__studica_titan(tx, rx)
+        return rx
+
+    def vmx_request(self, tx) -> bytearray:
+        rx = bytearray(len(tx))
+        with self.__lock:
+            self.__advance()
+            if len(tx) == EmulatedBoard.STUDICA_VMX_LENGTH:
+                self.__studica_vmx(self.__page(tx[0], 2), rx)
+            elif len(tx) == EmulatedBoard.ALGARITM_VMX_LENGTH:
+                self.__algaritm_vmx(tx, self.__page(tx[0], 3), rx)
+        return rx
+
+    def __advance(self) -> None:
+        now = time.monotonic()
+        if self.__last_time is None:
+            self.__last_time = now
+        dt = now - self.__last_time
+        self.__last_time = now
+
+        ticks = EmulatedBoard.TICKS_PER_SECOND / 100 * dt
+        for i in range(4):
+            self.encoders[i] += self.speeds[i] * ticks
+        for i in range(2):
+            if self.step_busy[i]:
+                self.__step_left[i] -= self.__step_rate[i] * dt
+                if self.__step_left[i] <= 0:
+                    self.step_busy[i] = False
+        self.yaw = _wrap_angle(self.yaw + self.yaw_rate * dt)
+
+    def __page(self, requested: int, count: int) -> int:
+        if requested != 1 and 1 <= requested <= count:
+            self.__follow_pages = True
+        if self.__follow_pages:
+            return requested
+        self.__next_page = self.__next_page % count + 1
+        return self.__next_page
+
+    def __studica_titan(self, tx, rx: bytearray) -> None:
+        modules_0, modules_1, modules_2, modules_3, directions = \
+            EmulatedBoard.STUDICA_TX_SPEEDS_STRUCT.unpack_from(tx, 2)
+        for i, module in enumerate((modules_0, modules_1, modules_2, modules_3)):
+            speed = module / 65535 * 100
+            self.speeds[i] = speed if (directions >> (6 - i)) & 1 else -speed
+        self.__advance()
+
+        # the robot subtracts the 16-bit differences, so the raw values go backwards
+        raw = [-int(position) & 0xffff for position in self.encoders]
+        limits_0 = 0
+        for i in range(3):
+            limits_0 |= self.limits_l[i] << (1 + 2 * i) | self.limits_h[i] << (2 + 2 * i)
+        limits_1 = self.limits_l[3] << 1 | self.limits_h[3] << 2
+        EmulatedBoard.STUDICA_RX_STRUCT.pack_into(rx, 0, 1, *raw, limits_0, limits_1)
+        rx[24] = 111
+
+    def __algaritm_titan(self, tx, rx: bytearray) -> None:
+        speed_0, speed_1, speed_2, speed_3, flags, servo_1, servo_2 = \
+            EmulatedBoard.ALGARITM_TX_HEAD_STRUCT.unpack_from(tx, 1)
+        self.speeds[:] = (speed_0, speed_1, speed_2, speed_3)
+        self.use_pid = bool(flags >> 3 & 1)
+        self.additional_servos[:] = (servo_1, servo_2)
+        self.pid = EmulatedBoard.ALGARITM_TX_PID_STRUCT.unpack_from(tx, 24)
+        self.__advance()
+
+        steps_1, steps_2, steps_per_s_1, steps_per_s_2 = EmulatedBoard.ALGARITM_TX_STEPS_STRUCT.unpack_from(tx, 8)
+        commands = ((steps_1, steps_per_s_1, flags >> 5 & 1), (steps_2, steps_per_s_2, flags >> 4 & 1))
+        for i, command in enumerate(commands):
+            # a command is started once, the robot resets it when the motor is busy
+            if command != self.__step_command[i] and command[0] > 0 and not self.step_busy[i]:
+                self.step_busy[i] = True
+                self.__step_left[i] = command[0]
+                self.__step_rate[i] = command[1]
+                if command[1] == 0:
+                    self.step_busy[i] = False
+            self.__step_command[i] = command
+
+        limits = 0
+        for i in range(4):
+            limits |= self.limits_l[i] << (7 - 2 * i) | self.limits_h[i] << (6 - 2 * i)
+        encoders = [int(position) & 0xffffffff for position in self.encoders]
+        EmulatedBoard.ALGARITM_RX_STRUCT.pack_into(rx, 0, 1, *encoders, limits, self.step_busy[0], self.step_busy[1])
+        rx[40] = 222
+
+    def __studica_vmx(self, page: int, rx: bytearray) -> None:
+        if page == 1:
+            flags = (self.yaw >= 0) << 1
+            for i in range(5):
+                flags |= self.flex[i] << (2 + i)
+            EmulatedBoard.STUDICA_PAGE_STRUCT.pack_into(
+                rx, 0, 1, int(round(abs(self.yaw) * 100)),
+                int(self.ultrasound[0] * 100) & 0xffff, int(self.ultrasound[1] * 100) & 0xffff,
+                int(self.power * 100) & 0xffff, flags)
+        else:
+            flags = self.flex[5] << 1 | self.flex[6] << 2 | self.flex[7] << 3
+            EmulatedBoard.STUDICA_PAGE_STRUCT.pack_into(rx, 0, 2, *[value & 0xffff for value in self.analog[:4]],
+                                                        flags)
+
+    def __algaritm_vmx(self, tx, page: int, rx: bytearray) -> None:
+        values = EmulatedBoard.ALGARITM_VMX_TX_STRUCT.unpack_from(tx, 1)
+        self.servo_angles[:] = values[:8]
+        self.outputs[:] = [bool(values[8] >> bit & 1) for bit in (6, 5, 4, 3)]
+
+        if page == 1:
+            EmulatedBoard.ALGARITM_PAGE_1_STRUCT.pack_into(rx, 0, 1, *[value & 0xffff for value in self.analog[:7]])
+        elif page == 2:
+            inputs = 0
+            for i in range(4):
+                inputs |= self.inputs[i] << i
+            EmulatedBoard.ALGARITM_PAGE_2_STRUCT.pack_into(
+                rx, 0, 2, self.analog[7] & 0xffff, *[int(value * 100) & 0xffff for value in self.ultrasound], inputs)
+        else:
+            signs = (self.yaw >= 0) << 1 | (self.pitch >= 0) << 2 | (self.roll >= 0) << 3
+            EmulatedBoard.ALGARITM_PAGE_3_STRUCT.pack_into(
+                rx, 0, 3, int(round(abs(self.yaw) * 100)), int(round(abs(self.pitch) * 100)),
+                int(round(abs(self.roll) * 100)), signs, int(self.power * 100) & 0xffff)
+
+
+def _read_exact(fd: int, length: int, timeout: float) -> bytes:
+    import select  # только pty, select по fd не работает на Windows
+    data = b''
+    deadline = time.monotonic() + timeout
+    while len(data) < length:
+        left = deadline - time.monotonic()
+        if left <= 0 or not select.select([fd], [], [], left)[0]:
+            break
+        chunk = os.read(fd, length - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class TitanPty:
+    """ Emulated Titan behind a pseudo-terminal (POSIX only). slave_path is used as the serial port,
+        48-byte requests are read from the master side and answered by the board """
+    def __init__(self, board: EmulatedBoard):
+        import tty  # нужен termios, которого нет на Windows
+        self.__board = board
+        self.__master, self.__slave = os.openpty()
+        tty.setraw(self.__slave)
+        self.slave_path = os.ttyname(self.__slave)
+        self.__stop_thread = False
+        self.__thread: Thread = None
+
+    def start(self) -> None:
+        if self.__thread is not None:
+            return
+        self.__stop_thread = False
+        self.__thread = Thread(target=self.serve)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def serve(self) -> None:
+        try:
+            while not self.__stop_thread:
+                request = _read_exact(self.__master, EmulatedBoard.TITAN_LENGTH, 0.1)
+                if len(request) == EmulatedBoard.TITAN_LENGTH:
+                    os.write(self.__master, self.__board.titan_request(request))
+        except OSError:
+            pass  # возникает при закрытии pty
+
+    def stop(self) -> None:
+        self.__stop_thread = True
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        for fd in (self.__master, self.__slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass  # idc
+
+
+class EmulatorLib:
+    """ Same interface as LibHolder, the packets are answered by an EmulatedBoard.
+        With pty the Titan is served behind a pseudo-terminal, so rw_usb goes through the tty driver
+        (path of init_usb is replaced by the pty) """
+    # time to wait for the Titan answer in pty mode
+    PTY_TIMEOUT = 0.1
+
+    def __init__(self, first_path: str = '', board: EmulatedBoard = None, pty: bool = False):
+        self.board = board if board is not None else EmulatedBoard()
+        self.pty: TitanPty = TitanPty(self.board) if pty else None
+        self.__usb_fd: int = None
+
+    def init_spi(self, path: str, channel: int, speed: int, mode: int) -> int:
+        return 0
+
+    def init_usb(self, path: str, baud: int) -> int:
+        if self.pty is None:
+            return 0
+        try:
+            self.pty.start()
+            import tty
+            self.__usb_fd = os.open(self.pty.slave_path, os.O_RDWR | os.O_NOCTTY)
+            tty.setraw(self.__usb_fd)
+        except OSError:
+            return -1
+        return 0
+
+    def rw_spi(self, array: bytearray) -> bytearray:
+        return self.board.vmx_request(array)
+
+    def rw_usb(self, array: bytearray) -> bytearray:
+        if self.__usb_fd is None:
+            return self.board.titan_request(array)
+        os.write(self.__usb_fd, array)
+        rx = bytearray(len(array))
+        answer = _read_exact(self.__usb_fd, len(array), EmulatorLib.PTY_TIMEOUT)
+        rx[:len(answer)] = answer
+        return rx
+
+    def stop_spi(self):
+        pass
+
+    def stop_usb(self):
+        if self.__usb_fd is not None:
+            os.close(self.__usb_fd)
+            self.__usb_fd = None
+        if self.pty is not None:
+            self.pty.stop()
+
+
+def create_lib(conf: RobotConfiguration):
+    """ LibHolder of the real robot or its emulator, as chosen by conf.lib_emulator """
+    if conf.lib_emulator == LibEmulators.MEMORY:
+        return EmulatorLib(conf.lib_holder_first_path)
+    if conf.lib_emulator == LibEmulators.PTY:
+        return EmulatorLib(conf.lib_holder_first_path, pty=True)
+    return LibHolder(conf.lib_holder_first_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="robocad Titan emulator behind a pseudo-terminal, "
+                                                 "the printed port is used as titan_port of the native library")
+    parser.parse_args()
+
+    emulated_board = EmulatedBoard()
+    titan_pty = TitanPty(emulated_board)
+    print("Titan port: " + titan_pty.slave_path, flush=True)
+    try:
+        titan_pty.serve()
+    except KeyboardInterrupt:
+        pass
+    titan_pty.stop()
@@ -1,7 +1,50 @@
 from abc import ABC, abstractmethod
+import threading
+import time
+
+import numpy as np
+
+
+class LidarScan:
+    """ Completed scan of a lidar. scan_id increases with every scan,
+        timestamp is time.monotonic() of its completion """
+    def __init__(self, scan_id: int, timestamp: float, ranges: np.ndarray,
+                 angles: np.ndarray = None, distances: np.ndarray = None, intensities: np.ndarray = None):
+        self.scan_id = scan_id
+        self.timestamp = timestamp
+        # one value for each angular bin, bin i is centered at i * 360 / len(ranges) degrees
+        self.ranges = ranges
+        # raw mode only: every sample of the scan (float32 degrees, distances, intensities if the lidar gives them)
+        self.angles = angles
+        self.distances = distances
+        self.intensities = intensities
 
 
 class LidarBase(ABC):
+    """ Scans are double-buffered: the scan thread fills the back buffer (_back_scan) and publishes it whole
+        with _publish_scan, readers copy the front buffer under the lock, so a scan is never torn.
+        size is the number of angular bins, with raw the samples of a scan are kept too """
+    def __init__(self, size: int = 360, fill: int = 0, dtype=np.int32, raw: bool = False):
+        self.bins = size
+        self.raw = raw
+        self.__raw_front: tuple = (None, None, None)
+        # ranges out of (min_range, max_range] are not points
+        self.min_range = 0
+        self.max_range = 12000
+        # position (x to the right, y forward) and rotation (clockwise degrees) of the lidar on the robot
+        self.mount_offset = (0.0, 0.0)
+        self.mount_rotation = 0.0
+        self.__trig_key = None
+        self.__sin: np.ndarray = None
+        self.__cos: np.ndarray = None
+
+        self.__buffers = [np.full(size, fill, dtype=dtype), np.full(size, fill, dtype=dtype)]
+        self.__front = 0
+        self.__scan_id = 0
+        self.__timestamp = 0.0
+        self.__last_read_id = 0
+        self.__scan_cond = threading.Condition()
+
     @abstractmethod
     def start(self) -> None:
         pass
@@ -13,3 +56,83 @@ class LidarBase(ABC):
     @abstractmethod
     def stop(self) -> None:
         pass
+
+    @property
+    def scan_id(self) -> int:
+        """ id of the latest scan, 0 before the first one """
+        return self.__scan_id
+
+    def get_scan(self) -> LidarScan:
+        """ Copy of the latest scan """
+        with self.__scan_cond:
+            return self.__read_scan()
+
+    def get_next_scan(self, timeout: float = None, after_id: int = None) -> LidarScan:
+        """ Waits for a scan newer than after_id (by default the last one got from this lidar)
+            and returns its copy, None on timeout """
+        with self.__scan_cond:
+            if after_id is None:
+                after_id = self.__last_read_id
+            if not self.__scan_cond.wait_for(lambda: self.__scan_id > after_id, timeout):
+                return None
+            return self.__read_scan()
+
+    def get_points(self, out: np.ndarray = None, scan: LidarScan = None) -> np.ndarray:
+        """ Valid points of the latest scan (or of scan) as (N, 2) float32 x, y in the units of the ranges,
+            moved by the mounting of the lidar. Angles are clockwise from forward, as the lidars measure.
+            out is filled if it has room for the points, the returned array is its view then """
+        if scan is None:
+            scan = self.get_scan()
+        ranges = scan.ranges
+        sin, cos = self.__trig(ranges.size)
+        index = np.flatnonzero((ranges > self.min_range) & (ranges <= self.max_range))
+        count = index.size
+        if out is None or out.shape[0] < count:
+            out = np.empty((count, 2), dtype=np.float32)
+        points = out[:count]
+        distances = ranges[index].astype(np.float32)
+        np.multiply(distances, sin[index], out=points[:, 0])
+        np.multiply(distances, cos[index], out=points[:, 1])
+        offset_x, offset_y = self.mount_offset
+        if offset_x != 0 or offset_y != 0:
+            points += np.array((offset_x, offset_y), dtype=np.float32)
+        return points
+
+    def __trig(self, size: int) -> tuple:
+        """ sin and cos of the angles of the scan values, cached until the size or the rotation changes """
+        key = (size, self.mount_rotation)
+        if key != self.__trig_key:
+            angles = np.radians(np.arange(size) * (360 / size) + self.mount_rotation)
+            self.__sin = np.sin(angles).astype(np.float32)
+            self.__cos = np.cos(angles).astype(np.float32)
+            self.__trig_key = key
+        return self.__sin, self.__cos
+
+    @property
+    def _front_scan(self) -> np.ndarray:
+        """ Latest published scan, could be read only by the scan thread """
+        return self.__buffers[self.__front]
+
+    @property
+    def _back_scan(self) -> np.ndarray:
+        """ Buffer of the scan being filled, only the scan thread uses it """
+        return self.__buffers[1 - self.__front]
+
+    def _bin_index(self, angles: np.ndarray) -> np.ndarray:
+        """ Indexes of the nearest bins of the angles (degrees) """
+        return np.round(angles * (self.bins / 360)).astype(np.intp) % self.bins
+
+    def _publish_scan(self, raw: tuple = None) -> None:
+        """ Makes the back buffer the latest scan, the previous scan becomes the back buffer.
+            raw is (angles, distances, intensities) of the samples, the arrays are not changed after that """
+        with self.__scan_cond:
+            if raw is not None:
+                self.__raw_front = raw
+            self.__front = 1 - self.__front
+            self.__scan_id += 1
+            self.__timestamp = time.monotonic()
+            self.__scan_cond.notify_all()
+
+    def __read_scan(self) -> LidarScan:
+        self.__last_read_id = self.__scan_id
+        return LidarScan(self.__scan_id, self.__timestamp, self.__buffers[self.__front].copy(), *self.__raw_front)
@@ -2,7 +2,11 @@ from serial import Serial
 from typing import Callable
 import threading
 
+import numpy as np
+
 from .robot import Robot
+from .robot_configuration import RobotConfiguration
+from .realtime import apply_thread_realtime
 from .lidar import LidarBase
 
 class N10Lidar(LidarBase):
@@ -11,74 +15,158 @@ class N10Lidar(LidarBase):
     PKG_HEADER_1 = 0x5A
     MIN_PAYLOAD = 58
     POINT_PER_PACK = 16
-
-    def __init__(self, robot: Robot, port, baud=230400):
+    # seconds, a read returns what has come by then
+    READ_TIMEOUT = 0.1
+    # byte 57 is the sum of the previous bytes on some firmwares, others fill it differently
+    CHECK_CRC = False
+    # a warning is logged for the first failed checksum and then every this many
+    CRC_WARN_EVERY = 1000
+
+    HEADER = bytes((PKG_HEADER_0, PKG_HEADER_1))
+    # big-endian packet: header, length (= MIN_PAYLOAD), speed, start angle, 16 points, end angle, crc
+    # angles are in 0.01 degree
+    PACKET_DTYPE = np.dtype([('header', '>u2'),
+                             ('length', 'u1'),
+                             ('speed', '>u2'),
+                             ('start_angle', '>u2'),
+                             ('points', [('distance', '>u2'), ('intensity', 'u1')], (POINT_PER_PACK,)),
+                             ('end_angle', '>u2'),
+                             ('crc', 'u1')])
+
+    def __init__(self, robot: Robot, port, baud=230400, conf: RobotConfiguration = None):
+        # the latest distance of each bin, a scan is published every revolution
+        if conf is not None:
+            super().__init__(conf.lidar_bins, 0, np.int32, conf.lidar_raw)
+        else:
+            super().__init__(360, 0, np.int32)
         self.__robot = robot
-        self.serial = Serial(port, baud)
+        self.__conf = conf
+        self.serial = Serial(port, baud, timeout=N10Lidar.READ_TIMEOUT)
         self._shutdown = False
-
-        self._data = [0] * 360
+        self._scan_thread: threading.Thread = None
+        self.__check_crc = conf.lidar_check_crc if conf is not None else N10Lidar.CHECK_CRC
+        # packets with a wrong length or crc
+        self.error_cnt = 0
+        self.crc_error_cnt = 0
+
+        self.__last_start_angle = -1.0
+        # raw mode: samples of the current revolution
+        self.__raw_parts = []
+        self.__point_idx = np.arange(N10Lidar.POINT_PER_PACK)
     
-    def get_raw(self):
-        while self.serial.in_waiting < N10Lidar.MIN_PAYLOAD:
-            pass
-        return self.serial.read(self.serial.in_waiting)
+    def get_raw(self) -> bytes:
+        """ Waits for at least a packet (or READ_TIMEOUT) and returns the received bytes """
+        return self.serial.read(max(self.serial.in_waiting, N10Lidar.MIN_PAYLOAD))
     
     def _scan(self):
-        data = []
+        if self.__conf is not None:
+            apply_thread_realtime(self.__robot, self.__conf, 'lidar')
+        buffer = bytearray()
         while not self._shutdown:
-            [data.append(i) for i in self.get_raw()]
-
-            if len(data) < N10Lidar.MIN_PAYLOAD:
-                continue
-
-            if len(data) > N10Lidar.MIN_PAYLOAD * 100:
-                data = []
-
-            start = 0
-            while start < len(data)-2:
-                start = 0
-                while start < len(data)-2:
-                    if data[start] == N10Lidar.PKG_HEADER_0 and data[start+1] == N10Lidar.PKG_HEADER_1:
-                        break
-                    start += 1
-
-                _data = data[start:start+N10Lidar.MIN_PAYLOAD]
-
-                if len(_data) < N10Lidar.MIN_PAYLOAD:
+            buffer += self.get_raw()
+            consumed = self._parse(buffer)
+            del buffer[:consumed]
+            if len(buffer) > N10Lidar.MAX_BUF:
+                # garbage without headers
+                buffer.clear()
+
+    def __crc_failed(self):
+        self.crc_error_cnt += 1
+        if self.crc_error_cnt % N10Lidar.CRC_WARN_EVERY == 1:
+            self.__robot.write_log("Warning: N10 lidar packets fail the checksum (" + str(self.crc_error_cnt) +
+                                   " dropped), set conf.lidar_check_crc = False if the firmware fills it differently")
+
+    def _parse(self, buffer: bytearray) -> int:
+        """ Handles the complete packets of the buffer, returns the number of bytes that are not needed anymore """
+        size = N10Lidar.MIN_PAYLOAD
+        view = memoryview(buffer)
+        pos = 0
+        try:
+            while True:
+                # packets are found one after another, validated in a batch
+                offsets = []
+                start = buffer.find(N10Lidar.HEADER, pos)
+                while start != -1 and start + size <= len(buffer):
+                    offsets.append(start)
+                    start = buffer.find(N10Lidar.HEADER, start + size)
+                if not offsets:
                     break
-
-                start_angle = (_data[5] * 256 + _data[6])
-                end_angle = (_data[55] * 256 + _data[56])
-
-                final_data = []
-                diff = ((end_angle + 36000 - start_angle) % 36000) / (N10Lidar.POINT_PER_PACK - 1) / 100
-                _start_angle = start_angle / 100
-
-                for i in range(N10Lidar.POINT_PER_PACK):
-                    o = 7+(i*3)
-                    final_data.append(( round(_start_angle + diff * i) % 360 , (
-                        (_data[o] * 256) + 
-                        _data[o+1]) 
-                    ))
-                
-                data = data[N10Lidar.MIN_PAYLOAD:]
-
-                self.__handle_data(final_data)
+                packets = np.frombuffer(b"".join([view[o:o + size] for o in offsets]), dtype=N10Lidar.PACKET_DTYPE)
+                valid = packets['length'] == size
+                if self.__check_crc:
+                    raw = packets.view(np.uint8).reshape(-1, size)
+                    valid &= (raw[:, :size - 1].sum(axis=1, dtype=np.uint32) & 0xFF) == packets['crc']
+                if valid.all():
+                    self.__handle_data(packets)
+                    pos = offsets[-1] + size
+                    continue
+                # header bytes inside the data of a lost packet: search again after the wrong header
+                bad = int(np.argmin(valid))
+                self.error_cnt += 1
+                if packets['length'][bad] == size:
+                    self.__crc_failed()
+                if bad > 0:
+                    self.__handle_data(packets[:bad])
+                pos = offsets[bad] + 1
+            # an incomplete packet or the first byte of the header is kept
+            start = buffer.find(N10Lidar.HEADER, pos)
+            if start != -1:
+                return start
+            if len(buffer) > pos and buffer[-1] == N10Lidar.PKG_HEADER_0:
+                return len(buffer) - 1
+            return len(buffer)
+        finally:
+            view.release()
     
-    def __handle_data(self, data):
-        for i in data:
-            self._data[i[0]] = i[1]
+    def __handle_data(self, packets: np.ndarray):
+        start_angle = packets['start_angle'].astype(np.float64)
+        end_angle = packets['end_angle'].astype(np.float64)
+        diff = ((end_angle + 36000 - start_angle) % 36000) / (N10Lidar.POINT_PER_PACK - 1)
+        angles = ((start_angle[:, None] + diff[:, None] * self.__point_idx) / 100) % 360
+        bins = self._bin_index(angles)
+        points = packets['points']
+        # a revolution is complete when the start angle wraps
+        previous = np.concatenate(([self.__last_start_angle], start_angle[:-1]))
+        self.__last_start_angle = start_angle[-1]
+        begin = 0
+        for end in np.flatnonzero(start_angle < previous):
+            self.__fill(angles[begin:end], bins[begin:end], points[begin:end])
+            self._publish_scan(self.__take_raw())
+            # bins without points in the next revolution keep their values
+            np.copyto(self._back_scan, self._front_scan)
+            begin = end
+        self.__fill(angles[begin:], bins[begin:], points[begin:])
+
+    def __fill(self, angles: np.ndarray, bins: np.ndarray, points: np.ndarray):
+        distances = points['distance'].astype(np.uint16).ravel()
+        # the latest point of the bin wins
+        self._back_scan[bins.ravel()] = distances
+        if self.raw:
+            self.__raw_parts.append((angles.astype(np.float32).ravel(), distances,
+                                     points['intensity'].ravel()))
+
+    def __take_raw(self):
+        if not self.raw:
+            return None
+        parts = self.__raw_parts
+        self.__raw_parts = []
+        if not parts:
+            return np.empty(0, np.float32), np.empty(0, np.uint16), np.empty(0, np.uint8)
+        return tuple(np.concatenate(column) for column in zip(*parts))
 
     def stop(self):
         self.shutdown()
+        if self._scan_thread is not None:
+            self._scan_thread.join()
+            self._scan_thread = None
         
     def start(self):
+        self._shutdown = False
         self._scan_thread = threading.Thread(target = self._scan)
         self._scan_thread.start()
 
     def get_data(self):
-        return self._data
+        return self.get_scan().ranges.tolist()
 
     def shutdown(self):
         self._shutdown = True
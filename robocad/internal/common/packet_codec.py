@@ -0,0 +1,280 @@
+import struct
+
+
+# BITS[byte][n] is the same as Funcad.access_bit(byte, n)
+BITS = tuple(tuple((byte >> n) & 1 for n in range(8)) for byte in range(256))
+# same as BITS, but bool
+FLAGS = tuple(tuple(bool(bit) for bit in bits) for bits in BITS)
+
+
+def get_normal_diff(curr: int, last: int) -> int:
+    """ Difference of two 16-bit encoder values with the overflow """
+    diff: int = curr - last
+    if diff > 30000:
+        diff = -(last + (65535 - curr))
+    elif diff < -30000:
+        diff = curr + (65535 - last)
+    return diff
+
+
+class StudicaTitanCodec:
+    """ Titan packets of Studica. tx is a reused buffer, only the changing bytes are packed """
+    TX_LENGTH = 48
+    # from byte 2: speeds are 16-bit big-endian modules, then directions are bits of byte 10
+    TX_SPEEDS_STRUCT = struct.Struct('>4HB')
+    RX_STRUCT = struct.Struct('<B4HBB')
+
+    def __init__(self):
+        self.tx = bytearray(StudicaTitanCodec.TX_LENGTH)
+        self.tx[0] = 1
+        # third bit is for ProgramIsRunning
+        self.tx[11] = 0b10100001
+        self.tx[20] = 222
+
+    def encode(self, robot_internal) -> bytearray:
+        """ Returns the reused tx buffer, valid until the next encode """
+        speed_0 = robot_internal.speed_motor_0
+        speed_1 = robot_internal.speed_motor_1
+        speed_2 = robot_internal.speed_motor_2
+        speed_3 = robot_internal.speed_motor_3
+        StudicaTitanCodec.TX_SPEEDS_STRUCT.pack_into(
+            self.tx, 2,
+            abs(int(speed_0 / 100 * 65535)) & 0xffff,
+            abs(int(speed_1 / 100 * 65535)) & 0xffff,
+            abs(int(speed_2 / 100 * 65535)) & 0xffff,
+            abs(int(speed_3 / 100 * 65535)) & 0xffff,
+            0b10000001 | (speed_0 >= 0) << 6 | (speed_1 >= 0) << 5 | (speed_2 >= 0) << 4 | (speed_3 >= 0) << 3)
+        return self.tx
+
+    @staticmethod
+    def decode(data, robot_internal) -> bool:
+        """ Sets encoders and limits, False if the packet is wrong """
+        if data[42] == 33:
+            return False
+        if data[0] != 1 or data[24] != 111:
+            return True
+        _, enc_0, enc_1, enc_2, enc_3, limits_0, limits_1 = StudicaTitanCodec.RX_STRUCT.unpack_from(data)
+
+        robot_internal.enc_motor_0 -= get_normal_diff(enc_0, robot_internal.raw_enc_motor_0)
+        robot_internal.enc_motor_1 -= get_normal_diff(enc_1, robot_internal.raw_enc_motor_1)
+        robot_internal.enc_motor_2 -= get_normal_diff(enc_2, robot_internal.raw_enc_motor_2)
+        robot_internal.enc_motor_3 -= get_normal_diff(enc_3, robot_internal.raw_enc_motor_3)
+        robot_internal.raw_enc_motor_0 = enc_0
+        robot_internal.raw_enc_motor_1 = enc_1
+        robot_internal.raw_enc_motor_2 = enc_2
+        robot_internal.raw_enc_motor_3 = enc_3
+
+        bits = BITS[limits_0]
+        robot_internal.limit_l_0 = bits[1]
+        robot_internal.limit_h_0 = bits[2]
+        robot_internal.limit_l_1 = bits[3]
+        robot_internal.limit_h_1 = bits[4]
+        robot_internal.limit_l_2 = bits[5]
+        robot_internal.limit_h_2 = bits[6]
+        bits = BITS[limits_1]
+        robot_internal.limit_l_3 = bits[1]
+        robot_internal.limit_h_3 = bits[2]
+        return True
+
+
+class AlgaritmTitanCodec:
+    """ Titan packets of Algaritm. tx is a reused buffer, only the changing bytes are packed """
+    TX_LENGTH = 48
+    # from byte 1: signed speeds, flags byte, additional servos
+    TX_HEAD_STRUCT = struct.Struct('<4bBBB')
+    # from byte 8: steps and steps per second are big-endian
+    TX_STEPS_STRUCT = struct.Struct('>4I')
+    # from byte 24
+    TX_PID_STRUCT = struct.Struct('<3f')
+    RX_STRUCT = struct.Struct('<B4IBBB')
+
+    def __init__(self):
+        self.tx = bytearray(AlgaritmTitanCodec.TX_LENGTH)
+        self.tx[0] = 1
+        self.tx[40] = 222
+
+    def encode(self, robot_internal) -> bytearray:
+        """ Returns the reused tx buffer, valid until the next encode """
+        tx = self.tx
+        # for ProgramIsRunning and directions
+        AlgaritmTitanCodec.TX_HEAD_STRUCT.pack_into(
+            tx, 1,
+            int(min(max(robot_internal.speed_motor_0, -100), 100)),
+            int(min(max(robot_internal.speed_motor_1, -100), 100)),
+            int(min(max(robot_internal.speed_motor_2, -100), 100)),
+            int(min(max(robot_internal.speed_motor_3, -100), 100)),
+            0b11000001 | (1 if robot_internal.step_motor_1_direction else 0) << 5 |
+            (1 if robot_internal.step_motor_2_direction else 0) << 4 |
+            (1 if robot_internal.use_pid else 0) << 3,
+            int(robot_internal.additional_servo_1),
+            int(robot_internal.additional_servo_2))
+        AlgaritmTitanCodec.TX_STEPS_STRUCT.pack_into(
+            tx, 8,
+            abs(robot_internal.step_motor_1_steps) & 0xffffffff,
+            abs(robot_internal.step_motor_2_steps) & 0xffffffff,
+            abs(robot_internal.step_motor_1_steps_per_s) & 0xffffffff,
+            abs(robot_internal.step_motor_2_steps_per_s) & 0xffffffff)
+        AlgaritmTitanCodec.TX_PID_STRUCT.pack_into(tx, 24, robot_internal.p_pid, robot_internal.i_pid,
+                                                   robot_internal.d_pid)
+        return tx
+
+    @staticmethod
+    def decode(data, robot_internal) -> bool:
+        """ Sets encoders, limits and step motor flags, False if the packet is wrong """
+        if data[0] != 1:
+            return False
+        if data[40] != 222:
+            return True
+        _, enc_0, enc_1, enc_2, enc_3, limits, busy_1, busy_2 = AlgaritmTitanCodec.RX_STRUCT.unpack_from(data)
+        robot_internal.enc_motor_0 = enc_0
+        robot_internal.enc_motor_1 = enc_1
+        robot_internal.enc_motor_2 = enc_2
+        robot_internal.enc_motor_3 = enc_3
+
+        bits = BITS[limits]
+        robot_internal.limit_l_0 = bits[7]
+        robot_internal.limit_h_0 = bits[6]
+        robot_internal.limit_l_1 = bits[5]
+        robot_internal.limit_h_1 = bits[4]
+        robot_internal.limit_l_2 = bits[3]
+        robot_internal.limit_h_2 = bits[2]
+        robot_internal.limit_l_3 = bits[1]
+        robot_internal.limit_h_3 = bits[0]
+
+        robot_internal.is_step_1_busy = busy_1 != 0
+        robot_internal.is_step_2_busy = busy_2 != 0
+        return True
+
+
+def get_angle_diff(new_angle: float, old_angle: float) -> float:
+    """ Difference of two angles in -180..180 with the overflow """
+    delta_angle = new_angle - old_angle
+    if delta_angle < -180:
+        delta_angle = 180 - old_angle
+        delta_angle += 180 + new_angle
+    elif delta_angle > 180:
+        delta_angle = (180 + old_angle) * -1
+        delta_angle += (180 - new_angle) * -1
+    return delta_angle
+
+
+class StudicaVmxCodec:
+    """ VMX SPI pages of Studica. Page id is the first byte of the request and of the answer,
+        every page is read with its own struct straight into the robot internal """
+    PAGES = (1, 2)
+    TX_LENGTH = 10
+    # yaw, ultrasound 1-2, power, flags (yaw sign, flex 0-4)
+    PAGE_1_STRUCT = struct.Struct('<x4HB')
+    # analog 1-4, flags (flex 5-7)
+    PAGE_2_STRUCT = struct.Struct('<x4HB')
+
+    def __init__(self):
+        self.tx = bytearray(StudicaVmxCodec.TX_LENGTH)
+        self.tx[0] = 1
+        self.tx[9] = 222
+
+    def encode(self, robot_internal, page: int = 1) -> bytearray:
+        """ Returns the reused tx buffer, valid until the next encode """
+        self.tx[0] = page
+        return self.tx
+
+    @staticmethod
+    def decode(data, robot_internal, robot) -> int:
+        """ Returns id of the decoded page, 0 for an unknown page """
+        page = data[0]
+        if page == 1:
+            yaw_ui, us1_ui, us2_ui, power_ui, flags = StudicaVmxCodec.PAGE_1_STRUCT.unpack_from(data)
+            robot_internal.ultrasound_1 = us1_ui / 100
+            robot_internal.ultrasound_2 = us2_ui / 100
+            robot.power = power_ui / 100
+
+            bits = BITS[flags]
+            # calc yaw unlim
+            new_yaw = yaw_ui / 100 if bits[1] else -(yaw_ui / 100)
+            robot_internal.yaw_unlim += get_angle_diff(new_yaw, robot_internal.yaw)
+            robot_internal.yaw = new_yaw
+
+            robot_internal.flex_0 = bits[2]
+            robot_internal.flex_1 = bits[3]
+            robot_internal.flex_2 = bits[4]
+            robot_internal.flex_3 = bits[5]
+            robot_internal.flex_4 = bits[6]
+        elif page == 2:
+            (robot_internal.analog_1, robot_internal.analog_2, robot_internal.analog_3, robot_internal.analog_4,
+             flags) = StudicaVmxCodec.PAGE_2_STRUCT.unpack_from(data)
+            bits = BITS[flags]
+            robot_internal.flex_5 = bits[1]
+            robot_internal.flex_6 = bits[2]
+            robot_internal.flex_7 = bits[3]
+        else:
+            return 0
+        return page
+
+
+class AlgaritmVmxCodec:
+    """ VMX SPI pages of Algaritm. Page id is the first byte of the request and of the answer,
+        every page is read with its own struct straight into the robot internal.
+        Servo and outputs commands are sent with every request """
+    PAGES = (1, 2, 3)
+    TX_LENGTH = 16
+    # from byte 1: servo angles, outputs byte
+    TX_STRUCT = struct.Struct('<8BB')
+    # analog 1-7
+    PAGE_1_STRUCT = struct.Struct('<x7H')
+    # analog 8, ultrasound 1-4, inputs
+    PAGE_2_STRUCT = struct.Struct('<x5HB')
+    # yaw, pitch, roll, flags (signs), power
+    PAGE_3_STRUCT = struct.Struct('<x3HBH')
+
+    def __init__(self):
+        self.tx = bytearray(AlgaritmVmxCodec.TX_LENGTH)
+        self.tx[0] = 1
+
+    def encode(self, robot_internal, page: int = 1) -> bytearray:
+        """ Returns the reused tx buffer, valid until the next encode """
+        self.tx[0] = page
+        servo_angles = robot_internal.servo_angles
+        outputs = robot_internal.outputs
+        AlgaritmVmxCodec.TX_STRUCT.pack_into(
+            self.tx, 1,
+            int(servo_angles[0]), int(servo_angles[1]), int(servo_angles[2]), int(servo_angles[3]),
+            int(servo_angles[4]), int(servo_angles[5]), int(servo_angles[6]), int(servo_angles[7]),
+            0b10000001 | (1 if outputs[0] else 0) << 6 | (1 if outputs[1] else 0) << 5 |
+            (1 if outputs[2] else 0) << 4 | (1 if outputs[3] else 0) << 3)
+        return self.tx
+
+    @staticmethod
+    def decode(data, robot_internal, robot) -> int:
+        """ Returns id of the decoded page, 0 for an unknown page """
+        page = data[0]
+        if page == 1:
+            (robot_internal.analog_1, robot_internal.analog_2, robot_internal.analog_3, robot_internal.analog_4,
+             robot_internal.analog_5, robot_internal.analog_6,
+             robot_internal.analog_7) = AlgaritmVmxCodec.PAGE_1_STRUCT.unpack_from(data)
+        elif page == 2:
+            (robot_internal.analog_8, us1_ui, us2_ui, us3_ui, us4_ui,
+             inputs) = AlgaritmVmxCodec.PAGE_2_STRUCT.unpack_from(data)
+            robot_internal.ultrasound_1 = us1_ui / 100
+            robot_internal.ultrasound_2 = us2_ui / 100
+            robot_internal.ultrasound_3 = us3_ui / 100
+            robot_internal.ultrasound_4 = us4_ui / 100
+            robot_internal.inputs[0:4] = FLAGS[inputs][0:4]
+        elif page == 3:
+            yaw_ui, pitch_ui, roll_ui, signs, power_ui = AlgaritmVmxCodec.PAGE_3_STRUCT.unpack_from(data)
+            bits = BITS[signs]
+            new_yaw = yaw_ui / 100 if bits[1] else -(yaw_ui / 100)
+            robot_internal.yaw_unlim += get_angle_diff(new_yaw, robot_internal.yaw)
+            robot_internal.yaw = new_yaw
+
+            new_pitch = pitch_ui / 100 if bits[2] else -(pitch_ui / 100)
+            robot_internal.pitch_unlim += get_angle_diff(new_pitch, robot_internal.pitch)
+            robot_internal.pitch = new_pitch
+
+            new_roll = roll_ui / 100 if bits[3] else -(roll_ui / 100)
+            robot_internal.roll_unlim += get_angle_diff(new_roll, robot_internal.roll)
+            robot_internal.roll = new_roll
+
+            robot.power = power_ui / 100
+        else:
+            return 0
+        return page
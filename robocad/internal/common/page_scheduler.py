@@ -0,0 +1,40 @@
+class PageScheduler:
+    """ Chooses the VMX page requested by each SPI transfer.
+        weights is {page id: weight}, a page gets weight / sum(weights) of the transfers.
+        Smooth weighted round-robin: pages are interleaved and every page is requested
+        at least once per sum(weights) transfers """
+    def __init__(self, weights: dict, pages: tuple):
+        for page, weight in weights.items():
+            if page not in pages:
+                raise ValueError("Unknown VMX page " + str(page) + ", pages are " + str(pages))
+            if weight <= 0:
+                raise ValueError("Weight of VMX page " + str(page) + " should be positive")
+        self.__pages = list(weights.keys())
+        self.__weights = list(weights.values())
+        self.__total = sum(self.__weights)
+        self.__current = [0] * len(self.__pages)
+
+    def next_page(self) -> int:
+        current = self.__current
+        best = 0
+        for i, weight in enumerate(self.__weights):
+            current[i] += weight
+            if current[i] > current[best]:
+                best = i
+        current[best] -= self.__total
+        return self.__pages[best]
+
+
+class PageCounter:
+    """ Counts received VMX pages to report their achieved rates """
+    def __init__(self):
+        self.__counts = {}
+
+    def add(self, page: int) -> None:
+        self.__counts[page] = self.__counts.get(page, 0) + 1
+
+    def rates(self, elapsed: float) -> dict:
+        """ {page id: received pages per second} since the previous call """
+        rates = {page: count / elapsed for page, count in self.__counts.items()}
+        self.__counts = {}
+        return rates
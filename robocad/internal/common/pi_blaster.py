@@ -0,0 +1,90 @@
+import os
+from threading import Thread, Lock, Event
+
+from .rate import Rate
+from .robot import Robot
+
+
+class PiBlasterWriter:
+    """ Writes duty cycles of the GPIO pins to pi-blaster ('gpio=value' lines).
+        The device file is kept open, values set between two flushes are coalesced per pin
+        (only the latest one is written) and flushed in one write by a background thread
+        not more often than hz times per second. path could also be a FIFO or a regular file """
+    def __init__(self, robot: Robot, path: str = '/dev/pi-blaster', hz: float = 100):
+        self.__robot = robot
+        self.path = path
+        self.__rate = Rate(hz)
+        self.__fd: int = None
+        self.__open_failed = False
+
+        # {gpio: value}
+        self.__pending: dict = {}
+        self.__lock = Lock()
+        self.__changed = Event()
+
+        self.__stop_th = False
+        self.__th: Thread = None
+
+    def start(self) -> None:
+        self.__stop_th = False
+        self.__th = Thread(target=self.__write_loop)
+        self.__th.daemon = True
+        self.__th.start()
+
+    def stop(self) -> None:
+        """ Writes the pending values and closes the file """
+        self.__stop_th = True
+        self.__changed.set()
+        if self.__th is not None:
+            self.__th.join()
+            self.__th = None
+        self.flush()
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    def set(self, gpio: int, value) -> None:
+        with self.__lock:
+            self.__pending[gpio] = value
+        self.__changed.set()
+
+    def flush(self) -> bool:
+        """ Writes the pending values now, False if the file could not be written (values are kept) """
+        with self.__lock:
+            if not self.__pending:
+                return True
+            batch = self.__pending
+            self.__pending = {}
+        data = "".join("%d=%s\n" % (gpio, value) for gpio, value in batch.items()).encode()
+        try:
+            if self.__fd is None:
+                # FIFO without pi-blaster reading it fails instead of blocking
+                self.__fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_NONBLOCK)
+                os.set_blocking(self.__fd, True)
+            os.write(self.__fd, data)
+            self.__open_failed = False
+            return True
+        except OSError as e:
+            if not self.__open_failed:
+                self.__robot.write_log("pi-blaster write failed: " + str(e))
+                self.__open_failed = True
+            if self.__fd is not None:
+                try:
+                    os.close(self.__fd)
+                except OSError:
+                    pass  # idc
+                self.__fd = None
+            with self.__lock:
+                # values set meanwhile are newer
+                batch.update(self.__pending)
+                self.__pending = batch
+            return False
+
+    def __write_loop(self) -> None:
+        while not self.__stop_th:
+            self.__changed.wait()
+            self.__changed.clear()
+            if not self.flush():
+                # try again on the next period
+                self.__changed.set()
+            self.__rate.sleep()
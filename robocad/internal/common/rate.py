@@ -0,0 +1,91 @@
+import time
+
+
+class RatePolicies:
+    # a late loop runs the missed iterations back to back (up to CATCH_UP_LIMIT periods)
+    CATCH_UP = 0
+    # a late loop drops the missed iterations and waits for the next deadline on the same grid
+    SKIP = 1
+
+
+class Rate:
+    """ Fixed-rate loop pacing on time.monotonic_ns deadlines.
+        Deadlines are counted from the first call, so the period does not drift with the work time
+        or with oversleeping. hz <= 0 runs the loop without waiting.
+        hz and reset could be called from other threads, the grid is restarted by the loop thread itself.
+        overruns is the number of iterations that started after their deadline,
+        period is the achieved loop period (s) averaged over the last second """
+    CATCH_UP_LIMIT = 10
+    __WINDOW_NS = 1_000_000_000
+
+    def __init__(self, hz: float, policy: int = RatePolicies.SKIP):
+        self.policy = policy
+        self.__period_ns = 0
+        self.hz = hz
+
+        self.overruns = 0
+        self.period = 0.0
+        self.__deadline = None
+        # set by other threads, the loop thread starts a new grid and a new measuring window
+        self.__regrid = False
+        self.__window_start = None
+        self.__window_ticks = 0
+
+    @property
+    def hz(self) -> float:
+        return 1e9 / self.__period_ns if self.__period_ns > 0 else 0
+
+    @hz.setter
+    def hz(self, value: float):
+        self.__period_ns = int(1e9 / value) if value > 0 else 0
+        # new grid starts from the next call
+        self.__regrid = True
+
+    def reset(self) -> None:
+        self.overruns = 0
+        self.period = 0.0
+        self.__regrid = True
+
+    def delay(self) -> float:
+        """ Time (s) until the next deadline, call once per iteration and wait for it """
+        now = time.monotonic_ns()
+        regrid = self.__regrid
+        if regrid:
+            self.__regrid = False
+            self.__window_start = None
+            self.__window_ticks = 0
+        self.__measure(now)
+        period_ns = self.__period_ns
+        # deadline is only changed here, in the loop thread
+        deadline = self.__deadline
+        if period_ns == 0:
+            self.__deadline = None
+            return 0.0
+        if deadline is None or regrid:
+            deadline = now
+        deadline += period_ns
+        late = now - deadline
+        if late > 0:
+            self.overruns += 1
+            if self.policy == RatePolicies.SKIP:
+                deadline += (late // period_ns + 1) * period_ns
+            elif late > Rate.CATCH_UP_LIMIT * period_ns:
+                deadline = now - Rate.CATCH_UP_LIMIT * period_ns
+        self.__deadline = deadline
+        return max(deadline - now, 0) / 1e9
+
+    def sleep(self) -> None:
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    def __measure(self, now: int) -> None:
+        if self.__window_start is None:
+            self.__window_start = now
+            return
+        self.__window_ticks += 1
+        elapsed = now - self.__window_start
+        if elapsed >= Rate.__WINDOW_NS:
+            self.period = elapsed / self.__window_ticks / 1e9
+            self.__window_start = now
+            self.__window_ticks = 0
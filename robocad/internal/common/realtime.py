@@ -0,0 +1,58 @@
+import ctypes
+import ctypes.util
+import os
+
+from .robot import Robot
+from .robot_configuration import RobotConfiguration, SchedPolicies
+
+# flags of mlockall(2)
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def apply_thread_realtime(robot: Robot, conf: RobotConfiguration, name: str) -> None:
+    """ Applies conf.rt_cpu_affinity and conf.rt_sched of the thread name to the calling thread.
+        Linux only, missing privileges are logged and the thread runs as usual """
+    # pid 0 is the calling thread for sched_setaffinity(2) and sched_setscheduler(2)
+    cpus = conf.rt_cpu_affinity.get(name)
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+            robot.write_log("Thread " + name + " runs on CPUs " + str(sorted(cpus)))
+        except (AttributeError, OSError, ValueError) as e:
+            robot.write_log("Warning: CPU affinity of thread " + name + " is not set: " + str(e))
+
+    sched = conf.rt_sched.get(name)
+    if sched is not None:
+        policy, priority = sched
+        try:
+            os_policy = {SchedPolicies.OTHER: os.SCHED_OTHER,
+                         SchedPolicies.FIFO: os.SCHED_FIFO,
+                         SchedPolicies.RR: os.SCHED_RR}[policy]
+            if policy == SchedPolicies.OTHER:
+                priority = 0
+            os.sched_setscheduler(0, os_policy, os.sched_param(priority))
+            robot.write_log("Thread " + name + " scheduling policy " + str(policy) + ", priority " + str(priority))
+        except (AttributeError, KeyError, OSError, ValueError) as e:
+            # PermissionError without CAP_SYS_NICE or an RLIMIT_RTPRIO limit
+            robot.write_log("Warning: scheduling of thread " + name + " is not set: " + str(e))
+
+
+def lock_memory(robot: Robot) -> bool:
+    """ Locks the pages of the process in RAM (mlockall), so the loops do not wait for page faults.
+        Future allocations are locked only without a memlock limit, otherwise they could fail
+        when the limit is reached. Not inherited by forked processes """
+    try:
+        import resource
+        flags = MCL_CURRENT
+        if os.geteuid() == 0 or resource.getrlimit(resource.RLIMIT_MEMLOCK)[0] == resource.RLIM_INFINITY:
+            flags |= MCL_FUTURE
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.mlockall(flags) != 0:
+            robot.write_log("Warning: memory is not locked: " + os.strerror(ctypes.get_errno()))
+            return False
+    except (AttributeError, ImportError, OSError) as e:
+        robot.write_log("Warning: memory is not locked: " + str(e))
+        return False
+    robot.write_log("Memory locked" + (" with future allocations" if flags & MCL_FUTURE else ""))
+    return True
@@ -18,6 +18,12 @@ class RobotInfo:
         self.rx_com_time_dev: float = 0
         self.tx_com_time_dev: float = 0
         self.com_count_dev: float = 0
+        # {VMX page id: received pages per second}
+        self.vmx_page_rates: dict = {}
+        # {loop name: Rate} with overruns and achieved period of the loops
+        self.loop_rates: dict = {}
+        # {loop name: LoopTimings} with p50/p95/p99/max and jitter of every loop phase
+        self.loop_timings: dict = {}
         self.temperature: float = 0
         self.memory_load: float = 0
         self.cpu_load: float = 0
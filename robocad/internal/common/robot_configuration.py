@@ -1,18 +1,96 @@
+import os
+import tempfile
+
+from .rate import RatePolicies
+
+
 class LidarTypes:
     N10_LIDAR = 0
     YD_LIDAR_X2 = 1
 
+class SimTransports:
+    TCP = 0
+    SHARED_MEMORY = 1
+    # all channels and the codec step on one asyncio loop thread
+    ASYNC_TCP = 2
+
+class LibEmulators:
+    # libCommonRPiLibrary with the hardware
+    NONE = 0
+    # Titan and VMX are answered in memory
+    MEMORY = 1
+    # Titan is served behind a pseudo-terminal, so the serial path goes through the tty driver
+    PTY = 2
+
+class SchedPolicies:
+    # default time-sharing scheduler
+    OTHER = 0
+    # real-time policies, need root or CAP_SYS_NICE
+    FIFO = 1
+    RR = 2
+
+class CameraFormats:
+    RGB = 0
+    GRAY = 1
+
 class RobotConfiguration:
     def __init__(self):
         self.camera_index = 0
         self.lib_holder_first_path = '/home/pi'
+        # real robot code path without the hardware, e.g. to measure the loops on a laptop
+        self.lib_emulator = LibEmulators.NONE
         self.with_pi_blaster = True
 
         self.lidar_type = LidarTypes.N10_LIDAR
         self.lidar_port = '/dev/ttyUSB0'
+        # mounting of the lidar for its points: position (x to the right, y forward, in mm)
+        # and rotation (clockwise degrees) of its zero angle relative to the robot
+        self.lidar_offset = (0.0, 0.0)
+        self.lidar_rotation = 0.0
+        # angular bins of a lidar scan (360 is one for each degree),
+        # raw also keeps every sample of the scan (angle, distance, intensity)
+        self.lidar_bins = 360
+        self.lidar_raw = False
+        # N10: packets with a wrong checksum byte are dropped (a warning is logged),
+        # off by default as firmwares differ in how they fill the byte
+        self.lidar_check_crc = False
 
         self.sim_log_path = './robocad.log'
+        # simulator pushes frames instead of answering every request (falls back for older simulators)
+        self.sim_streaming = False
+        # simulator runs on the same host, so data could be exchanged through a memory-mapped file
+        self.sim_transport = SimTransports.TCP
+        self.sim_shm_path = os.path.join(tempfile.gettempdir(), 'robocad_sim.shm')
+        # TCP only: send commands, receive sensors and decode them in one synchronous exchange per tick
+        self.sim_coupled_exchange = False
+        # camera channel is started on the first camera read, 0 is as fast as the simulator gives
+        self.sim_camera_max_fps = 0
+        # requested simulator camera frame, older simulators always give 640x480 RGB
+        self.sim_camera_width = 640
+        self.sim_camera_height = 480
+        self.sim_camera_format = CameraFormats.RGB
+        # simulator waits for robot.step(): every step sends commands and receives sensors of the next tick
+        self.sim_lockstep = False
+        # loop rates (Hz), 0 runs the loop without waiting
+        self.sim_update_hz = 250
+        # polling rate of the simulator channels, the camera channel uses sim_camera_max_fps if it is set
+        self.sim_channel_hz = 250
+        self.rate_policy = RatePolicies.SKIP
         self.real_log_path = '/var/tmp/robocad.log'
+        # real robot: Titan and VMX loops run in a child process, so the user code does not take the GIL from them
+        self.real_bus_process = False
+        # rate of the command and sensor exchange with the bus process
+        self.real_bus_sync_hz = 500
+        self.real_bus_shm_path = os.path.join(tempfile.gettempdir(), 'robocad_bus.shm')
+
+        # real-time options of the I/O threads 'titan', 'vmx', 'lidar', 'sim update' and 'bus' (Linux only),
+        # when they could not be applied a warning is logged and the thread runs as usual
+        # {thread: CPUs}, e.g. {'titan': {3}, 'vmx': {3}}
+        self.rt_cpu_affinity = {}
+        # {thread: (policy, priority)}, e.g. {'titan': (SchedPolicies.FIFO, 50)}, priority is 1-99 for FIFO and RR
+        self.rt_sched = {}
+        # lock the process memory (mlockall), so the loops do not wait for page faults
+        self.rt_lock_memory = False
 
 
 class DefaultStudicaConfiguration(RobotConfiguration):
@@ -20,10 +98,19 @@ class DefaultStudicaConfiguration(RobotConfiguration):
         super().__init__()
         self.titan_port = '/dev/ttyACM0'
         self.titan_baud = 115200
+        # HCDIO values are flushed to pi-blaster not more often than pi_blaster_hz, the latest value per pin
+        self.pi_blaster_path = '/dev/pi-blaster'
+        self.pi_blaster_hz = 100
         self.vmx_port = "/dev/spidev1.2"
         self.vmx_ch = 2
         self.vmx_speed = 1000000
         self.vmx_mode = 0
+        self.titan_hz = 500
+        self.vmx_hz = 500
+        # None: the first page is always requested and the board chooses the answer page.
+        # {page id: weight} requests pages 1 (yaw, ultrasound, power, flex 0-4) and 2 (analog, flex 5-7)
+        # in proportion to their weights, the board should answer with the requested page
+        self.vmx_page_weights = None
 
 
 class DefaultAlgaritmConfiguration(RobotConfiguration):
@@ -38,6 +125,13 @@ class DefaultAlgaritmConfiguration(RobotConfiguration):
         self.vmx_ch = 0
         self.vmx_speed = 1000000
         self.vmx_mode = 0
+        self.titan_hz = 1000
+        self.vmx_hz = 500
+        # None: the first page is always requested and the board chooses the answer page.
+        # {page id: weight} requests pages 1 (analog 1-7), 2 (analog 8, ultrasound, inputs) and 3 (imu, power)
+        # in proportion to their weights, the board should answer with the requested page,
+        # e.g. {3: 4, 1: 2, 2: 1} gives imu 4/7 of the transfers, analog 2/7 and ultrasound 1/7
+        self.vmx_page_weights = None
 
 class DefaultCommonConfiguration(RobotConfiguration):
     def __init__(self):
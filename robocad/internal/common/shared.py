@@ -1,6 +1,36 @@
 import ctypes
 
 
+class TransferBuffers:
+    """ Preallocated buffers of one bus.
+        tx is given to the library as is and rx is copied back with one memmove,
+        the returned bytearray is reused, so it is valid until the next transfer on the bus """
+    def __init__(self):
+        self.__length = -1
+        self.__tx = bytearray()
+        self.__rx = bytearray()
+        self.__tx_c = None
+        self.__rx_c = None
+
+    def __resize(self, length: int) -> None:
+        self.__length = length
+        self.__tx = bytearray(length)
+        self.__rx = bytearray(length)
+        self.__tx_c = (ctypes.c_ubyte * length).from_buffer(self.__tx)
+        self.__rx_c = (ctypes.c_ubyte * length).from_buffer(self.__rx)
+
+    def transfer(self, func, array) -> bytearray:
+        length = len(array)
+        if length != self.__length:
+            self.__resize(length)
+        self.__tx[:] = array
+        returned_array_ptr = func(self.__tx_c, length)
+        if not returned_array_ptr:
+            raise ValueError("NULL pointer access")
+        ctypes.memmove(self.__rx_c, returned_array_ptr, length)
+        return self.__rx
+
+
 class LibHolder:
     def __init__(self, first_path: str):
         self.lib = ctypes.cdll.LoadLibrary(first_path + '/CommonRPiLibrary/CommonRPiLibrary/build/libCommonRPiLibrary.so')
@@ -8,32 +38,28 @@ class LibHolder:
         self.lib.StartSPI.restype = ctypes.c_int
         self.lib.StartUSB.argtypes = [ctypes.c_char_p, ctypes.c_int]
         self.lib.StartUSB.restype = ctypes.c_int
+        # returned buffer belongs to the library, it is only copied, so the address is enough
+        self.lib.ReadWriteSPI.argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.c_uint]
+        self.lib.ReadWriteSPI.restype = ctypes.c_void_p
+        self.lib.ReadWriteUSB.argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.c_uint]
+        self.lib.ReadWriteUSB.restype = ctypes.c_void_p
+
+        self.__spi_buffers = TransferBuffers()
+        self.__usb_buffers = TransferBuffers()
 
     def init_spi(self, path: str, channel: int, speed: int, mode: int) -> int:
-        c_path = path.encode('utf-8') 
-        spi_result = self.lib.StartSPI(c_path, channel, speed, mode)
-        self.lib.ReadWriteSPI.argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.c_uint]
-        self.lib.ReadWriteSPI.restype = ctypes.POINTER(ctypes.c_ubyte)
-        return spi_result
+        c_path = path.encode('utf-8')
+        return self.lib.StartSPI(c_path, channel, speed, mode)
 
     def init_usb(self, path: str, baud: int) -> int:
-        c_path = path.encode('utf-8') 
-        com_result = self.lib.StartUSB(c_path, baud)
-        self.lib.ReadWriteUSB.argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.c_uint]
-        self.lib.ReadWriteUSB.restype = ctypes.POINTER(ctypes.c_ubyte)
-        return com_result
+        c_path = path.encode('utf-8')
+        return self.lib.StartUSB(c_path, baud)
 
     def rw_spi(self, array: bytearray) -> bytearray:
-        data_array = (ctypes.c_ubyte * len(array))(*array)
-        data_length = len(array)
-        returned_array_ptr = self.lib.ReadWriteSPI(data_array, data_length)
-        return bytearray([returned_array_ptr[i] for i in range(data_length)])
+        return self.__spi_buffers.transfer(self.lib.ReadWriteSPI, array)
 
     def rw_usb(self, array: bytearray) -> bytearray:
-        data_array = (ctypes.c_ubyte * len(array))(*array)
-        data_length = len(array)
-        returned_array_ptr = self.lib.ReadWriteUSB(data_array, data_length)
-        return bytearray([returned_array_ptr[i] for i in range(data_length)])
+        return self.__usb_buffers.transfer(self.lib.ReadWriteUSB, array)
 
     def stop_spi(self):
         self.lib.StopSPI()
@@ -0,0 +1,206 @@
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .connection import FrameBuffer, CAMERA_HEADER_STRUCT
+
+
+class SeqlockBlock:
+    """ Block of the shared memory file with seqlock semantics.
+        Layout: seq (u64), length (u32), 4 bytes padding, payload of capacity bytes.
+        Writer makes seq odd while writing and even when the frame is complete,
+        so seq // 2 is the number of frames written into the block """
+    HEADER_STRUCT = struct.Struct('<QI4x')
+    SEQ_STRUCT = struct.Struct('<Q')
+    # attempts to read a consistent frame before giving up until the next call
+    READ_ATTEMPTS = 100
+
+    def __init__(self, mm: mmap.mmap, offset: int, capacity: int):
+        self.__mm = mm
+        self.__offset = offset
+        self.__data_offset = offset + SeqlockBlock.HEADER_STRUCT.size
+        self.capacity = capacity
+        self.__view = memoryview(mm)[self.__data_offset:self.__data_offset + capacity]
+
+    @staticmethod
+    def size_for(capacity: int) -> int:
+        return SeqlockBlock.HEADER_STRUCT.size + capacity
+
+    @property
+    def raw_seq(self) -> int:
+        return SeqlockBlock.SEQ_STRUCT.unpack_from(self.__mm, self.__offset)[0]
+
+    @property
+    def seq(self) -> int:
+        """ Number of completely written frames """
+        return self.raw_seq // 2
+
+    def write(self, data) -> None:
+        length = len(data)
+        if length > self.capacity:
+            raise ValueError("frame of " + str(length) + " bytes does not fit into block of " +
+                             str(self.capacity) + " bytes")
+        seq = self.raw_seq
+        SeqlockBlock.SEQ_STRUCT.pack_into(self.__mm, self.__offset, seq + 1)
+        self.__view[:length] = data
+        SeqlockBlock.HEADER_STRUCT.pack_into(self.__mm, self.__offset, seq + 2, length)
+
+    def read_into(self, frame_buffer: FrameBuffer):
+        """ Copies a consistent frame into the frame buffer.
+            Returns (published view, frame seq) or (None, 0) if the writer was always busy """
+        for _ in range(SeqlockBlock.READ_ATTEMPTS):
+            seq, length = SeqlockBlock.HEADER_STRUCT.unpack_from(self.__mm, self.__offset)
+            if seq & 1 or length > self.capacity:
+                time.sleep(0)
+                continue
+            frame_buffer.reserve(length)[:] = self.__view[:length]
+            if self.raw_seq == seq:
+                return frame_buffer.publish(length), seq // 2
+        return None, 0
+
+    def release(self) -> None:
+        self.__view.release()
+
+
+class SimSharedMemory:
+    """ Memory-mapped file shared with the simulator on the same host.
+        Contains command (robot -> simulator), sensor and camera (simulator -> robot) blocks """
+    MAGIC = b'RCSM'
+    VERSION = 1
+    FILE_HEADER_STRUCT = struct.Struct('<4sI24x')
+    FLAGS_STRUCT = struct.Struct('<I')
+    FLAGS_OFFSET = 8
+    FLAG_CAMERA_SUBSCRIBED = 0x1
+    # requested camera width, height and format
+    CAMERA_REQUEST_STRUCT = struct.Struct('<HHB')
+    CAMERA_REQUEST_OFFSET = 16
+    COMMAND_CAPACITY = 1024
+    SENSOR_CAPACITY = 1024
+    # up to 1280x720 RGB with the frame header
+    CAMERA_CAPACITY = CAMERA_HEADER_STRUCT.size + 1280 * 720 * 3
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__blocks_layout = [SimSharedMemory.COMMAND_CAPACITY,
+                                SimSharedMemory.SENSOR_CAPACITY,
+                                SimSharedMemory.CAMERA_CAPACITY]
+        size = SimSharedMemory.FILE_HEADER_STRUCT.size + \
+            sum(SeqlockBlock.size_for(capacity) for capacity in self.__blocks_layout)
+
+        # whoever comes first (robot or simulator) creates the file, only for the user (it is in the shared temp dir)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.__mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, version = SimSharedMemory.FILE_HEADER_STRUCT.unpack_from(self.__mm, 0)
+        if magic != SimSharedMemory.MAGIC:
+            SimSharedMemory.FILE_HEADER_STRUCT.pack_into(self.__mm, 0, SimSharedMemory.MAGIC, SimSharedMemory.VERSION)
+        elif version != SimSharedMemory.VERSION:
+            raise ValueError("Unsupported shared memory version " + str(version) + " in " + path)
+
+        blocks = []
+        offset = SimSharedMemory.FILE_HEADER_STRUCT.size
+        for capacity in self.__blocks_layout:
+            blocks.append(SeqlockBlock(self.__mm, offset, capacity))
+            offset += SeqlockBlock.size_for(capacity)
+        self.command_block, self.sensor_block, self.camera_block = blocks
+
+    @property
+    def camera_subscribed(self) -> bool:
+        """ Simulator should write camera frames only when the robot is subscribed """
+        flags = SimSharedMemory.FLAGS_STRUCT.unpack_from(self.__mm, SimSharedMemory.FLAGS_OFFSET)[0]
+        return bool(flags & SimSharedMemory.FLAG_CAMERA_SUBSCRIBED)
+
+    @camera_subscribed.setter
+    def camera_subscribed(self, value: bool):
+        flags = SimSharedMemory.FLAGS_STRUCT.unpack_from(self.__mm, SimSharedMemory.FLAGS_OFFSET)[0]
+        if value:
+            flags |= SimSharedMemory.FLAG_CAMERA_SUBSCRIBED
+        else:
+            flags &= ~SimSharedMemory.FLAG_CAMERA_SUBSCRIBED
+        SimSharedMemory.FLAGS_STRUCT.pack_into(self.__mm, SimSharedMemory.FLAGS_OFFSET, flags)
+
+    @property
+    def camera_request(self) -> tuple:
+        """ (width, height, format) of the camera frames requested by the robot """
+        return SimSharedMemory.CAMERA_REQUEST_STRUCT.unpack_from(self.__mm, SimSharedMemory.CAMERA_REQUEST_OFFSET)
+
+    @camera_request.setter
+    def camera_request(self, value: tuple):
+        SimSharedMemory.CAMERA_REQUEST_STRUCT.pack_into(self.__mm, SimSharedMemory.CAMERA_REQUEST_OFFSET, *value)
+
+    def close(self) -> None:
+        for block in (self.command_block, self.sensor_block, self.camera_block):
+            block.release()
+        self.__mm.close()
+
+
+class ShmListenChannel:
+    """ Same interface as ListenPort, but reads frames from a shared memory block """
+    def __init__(self, block: SeqlockBlock):
+        self.__block = block
+        self.__frame_buffer = FrameBuffer(block.capacity)
+        self.__lock = threading.Lock()
+        self.__out_bytes = b''
+        self.__out_seq = 0
+
+    def start_listening(self):
+        pass
+
+    def stop_listening(self):
+        self.reset_out()
+
+    @property
+    def seq(self) -> int:
+        return self.__block.seq
+
+    @property
+    def out_bytes(self):
+        return self.snapshot()[0]
+
+    def snapshot(self) -> tuple:
+        """ out_bytes and seq of the same successful read of the block,
+            a failed read keeps the previous frame with its seq """
+        with self.__lock:
+            if self.__block.seq != self.__out_seq:
+                view, seq = self.__block.read_into(self.__frame_buffer)
+                if view is not None:
+                    self.__out_bytes, self.__out_seq = view, seq
+            return self.__out_bytes, self.__out_seq
+
+    def reset_out(self):
+        with self.__lock:
+            self.__out_bytes = b''
+            self.__out_seq = self.__block.seq
+
+
+class ShmTalkChannel:
+    """ Same interface as TalkPort, but writes frames into a shared memory block """
+    def __init__(self, block: SeqlockBlock):
+        self.__block = block
+        self.out_bytes = b''
+
+    def start_talking(self):
+        pass
+
+    def stop_talking(self):
+        # empty frame tells the simulator that the robot is stopped
+        self.push(b'')
+
+    @property
+    def seq(self) -> int:
+        return self.__block.seq
+
+    def push(self, data: bytes) -> None:
+        if data != self.out_bytes:
+            self.out_bytes = data
+            self.__block.write(data)
+
+    def reset_out(self):
+        self.out_bytes = b''
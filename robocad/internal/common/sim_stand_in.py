@@ -0,0 +1,170 @@
+import argparse
+import socket
+import struct
+import threading
+import time
+from typing import Callable
+
+from .connection import FrameBuffer, recv_exact_into, CAMERA_MAGIC, CAMERA_HEADER_STRUCT, STEP_HEADER_STRUCT
+from .robot_configuration import CameraFormats
+from .shm_connection import SimSharedMemory
+
+
+class ShmSimulatorStandIn:
+    """ Stand-in for the simulator side of the shared memory transport.
+        Publishes synthetic sensor and camera frames and reads robot commands,
+        so ConnectionSim could be run and measured without the real simulator """
+    def __init__(self, path: str, sensor_size: int, with_camera: bool = True):
+        self.shm = SimSharedMemory(path)
+        self.sensor_size = sensor_size
+        self.with_camera = with_camera
+        self.__sensors = bytearray(sensor_size)
+        self.__camera = bytearray(SimSharedMemory.CAMERA_CAPACITY)
+        self.__camera_request = None
+        self.__camera_size = 0
+        self.__command_buffer = FrameBuffer(SimSharedMemory.COMMAND_CAPACITY)
+
+    @property
+    def commands(self) -> bytes:
+        """ Last commands written by the robot """
+        view, _ = self.shm.command_block.read_into(self.__command_buffer)
+        return b'' if view is None else bytes(view)
+
+    def publish_sensors(self, data) -> None:
+        self.shm.sensor_block.write(data)
+
+    def publish_camera(self, data) -> None:
+        self.shm.camera_block.write(data)
+
+    def __prepare_camera(self) -> None:
+        request = self.shm.camera_request
+        if request == self.__camera_request:
+            return
+        self.__camera_request = request
+        width, height, fmt = request
+        if width == 0 or height == 0:
+            width, height, fmt = 640, 480, CameraFormats.RGB
+        channels = 1 if fmt == CameraFormats.GRAY else 3
+        CAMERA_HEADER_STRUCT.pack_into(self.__camera, 0, CAMERA_MAGIC, width, height, fmt)
+        self.__camera_size = CAMERA_HEADER_STRUCT.size + width * height * channels
+
+    def step(self, tick: int) -> None:
+        """ Writes one frame of synthetic data: first int of sensors is the tick,
+            first pixel byte of the camera frame is the tick too """
+        struct.pack_into('<i', self.__sensors, 0, tick)
+        self.publish_sensors(self.__sensors)
+        if self.with_camera and self.shm.camera_subscribed:
+            self.__prepare_camera()
+            self.__camera[CAMERA_HEADER_STRUCT.size] = tick & 0xff
+            self.publish_camera(memoryview(self.__camera)[:self.__camera_size])
+
+    def run(self, hz: float = 250, duration: float = 0) -> None:
+        period = 1 / hz
+        st_time = time.monotonic()
+        tick = 0
+        while duration <= 0 or time.monotonic() - st_time < duration:
+            tick += 1
+            self.step(tick)
+            time.sleep(period)
+
+    def close(self) -> None:
+        self.shm.close()
+
+
+class LockstepServerStandIn:
+    """ Stand-in for the simulator side of the lockstep mode.
+        Every received command frame advances the tick by one and is answered with the sensors of that tick,
+        simulate(commands, tick) could give the sensors, by default the first int of sensors is the tick """
+    def __init__(self, port: int, sensor_size: int, simulate: Callable[[bytes, int], bytes] = None):
+        self.port = port
+        self.sensor_size = sensor_size
+        self.simulate = simulate
+        self.tick = 0
+        self.commands = b''
+        self.__sensors = bytearray(sensor_size)
+        self.__stop = False
+        self.__client = None
+
+        self.__server = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        self.__server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__server.bind(('127.0.0.1', port))
+        self.__server.listen(1)
+        self.__thread = threading.Thread(target=self.serve, daemon=True)
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def __step(self, commands: bytes) -> bytes:
+        self.tick += 1
+        self.commands = commands
+        if self.simulate is not None:
+            return self.simulate(commands, self.tick)
+        struct.pack_into('<i', self.__sensors, 0, self.tick)
+        return self.__sensors
+
+    def serve(self) -> None:
+        """ Serves robots one after another until close """
+        header = bytearray(STEP_HEADER_STRUCT.size)
+        commands = FrameBuffer()
+        while not self.__stop:
+            try:
+                self.__client, _ = self.__server.accept()
+            except OSError:
+                break
+            self.__client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                while True:
+                    recv_exact_into(self.__client, memoryview(header))
+                    length, _ = STEP_HEADER_STRUCT.unpack_from(header)
+                    recv_exact_into(self.__client, commands.reserve(length))
+                    sensors = self.__step(bytes(commands.publish(length)))
+                    self.__client.sendall(STEP_HEADER_STRUCT.pack(len(sensors), self.tick) + sensors)
+            except (ConnectionAbortedError, BrokenPipeError, OSError):
+                # возникает при отключении сокета
+                pass
+            try:
+                self.__client.close()
+            except (OSError, Exception): pass  # idc
+
+    def close(self) -> None:
+        self.__stop = True
+        for sct in (self.__server, self.__client):
+            if sct is None:
+                continue
+            try:
+                sct.shutdown(socket.SHUT_RDWR)
+            except (OSError, Exception): pass  # idc
+            try:
+                sct.close()
+            except (OSError, Exception): pass  # idc
+        if self.__thread.is_alive():
+            self.__thread.join(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="robocad simulator stand-in")
+    parser.add_argument('path', nargs='?', help="shared memory file, same as RobotConfiguration.sim_shm_path")
+    parser.add_argument('--lockstep', type=int, metavar='PORT',
+                        help="serve the lockstep mode on the port (65433) instead of the shared memory")
+    parser.add_argument('--sensor-size', type=int, default=76, help="76 common, 52 studica, 74 algaritm")
+    parser.add_argument('--hz', type=float, default=250)
+    parser.add_argument('--duration', type=float, default=0)
+    parser.add_argument('--no-camera', action='store_true')
+    args = parser.parse_args()
+
+    if args.lockstep is not None:
+        stand_in = LockstepServerStandIn(args.lockstep, args.sensor_size)
+        try:
+            stand_in.serve()
+        except KeyboardInterrupt:
+            pass
+        stand_in.close()
+    else:
+        if args.path is None:
+            parser.error("path is required without --lockstep")
+        stand_in = ShmSimulatorStandIn(args.path, args.sensor_size, not args.no_camera)
+        try:
+            stand_in.run(args.hz, args.duration)
+        except KeyboardInterrupt:
+            pass
+        stand_in.close()
@@ -0,0 +1,117 @@
+import math
+
+
+class Histogram:
+    """ Fixed-memory histogram of durations (ns) with log-linear (HDR-style) buckets.
+        Every power of two is split into 2 ** SUB_BITS buckets, so a bucket is within
+        1 / 2 ** SUB_BITS (~3 %) of the recorded value.
+        Values above 2 ** MAX_BITS ns (~69 s) are counted in the last bucket, max stays exact """
+    SUB_BITS = 5
+    MAX_BITS = 36
+    __SUB_COUNT = 1 << SUB_BITS
+    __BUCKETS = (MAX_BITS - SUB_BITS + 1) * __SUB_COUNT
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.__counts = [0] * Histogram.__BUCKETS
+        self.count = 0
+        self.max = 0
+        self.__sum = 0
+        self.__sum_sq = 0
+
+    def record(self, value: int) -> None:
+        if value < 0:
+            value = 0
+        if value < Histogram.__SUB_COUNT:
+            index = value
+        else:
+            shift = value.bit_length() - Histogram.SUB_BITS - 1
+            index = (shift + 1) * Histogram.__SUB_COUNT + (value >> shift) - Histogram.__SUB_COUNT
+            if index >= Histogram.__BUCKETS:
+                index = Histogram.__BUCKETS - 1
+        self.__counts[index] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        self.__sum += value
+        self.__sum_sq += value * value
+
+    def percentile(self, p: float) -> int:
+        """ Highest value (ns) of the bucket that holds the p-th percentile, 0 if nothing is recorded """
+        counts = list(self.__counts)
+        total = sum(counts)
+        if total == 0:
+            return 0
+        rank = max(math.ceil(total * p / 100), 1)
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return min(Histogram.__bucket_top(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.__sum / self.count if self.count > 0 else 0.0
+
+    @property
+    def jitter(self) -> float:
+        """ Standard deviation (ns) of the recorded values """
+        count = self.count
+        if count < 2:
+            return 0.0
+        mean = self.__sum / count
+        return math.sqrt(max(self.__sum_sq / count - mean * mean, 0.0))
+
+    def summary(self) -> dict:
+        """ count, mean, p50, p95, p99, max and jitter, times are in microseconds """
+        return {'count': self.count,
+                'mean': self.mean / 1000,
+                'p50': self.percentile(50) / 1000,
+                'p95': self.percentile(95) / 1000,
+                'p99': self.percentile(99) / 1000,
+                'max': self.max / 1000,
+                'jitter': self.jitter / 1000}
+
+    @staticmethod
+    def __bucket_top(index: int) -> int:
+        if index < 2 * Histogram.__SUB_COUNT:
+            return index
+        shift = index // Histogram.__SUB_COUNT - 1
+        return ((index % Histogram.__SUB_COUNT + Histogram.__SUB_COUNT + 1) << shift) - 1
+
+
+class LoopTimings:
+    """ Timings of the phases of a bus loop iteration (time.perf_counter_ns):
+        tx - building the tx packet, rw - bus transfer, rx - parsing the answer,
+        sleep - waiting for the next iteration, loop - whole iteration period """
+    PHASES = ('tx', 'rw', 'rx', 'sleep', 'loop')
+
+    def __init__(self):
+        self.tx = Histogram()
+        self.rw = Histogram()
+        self.rx = Histogram()
+        self.sleep = Histogram()
+        self.loop = Histogram()
+        self.__last_end: int = None
+
+    def record(self, tx_start: int, rw_start: int, rx_start: int, sleep_start: int, end: int) -> None:
+        """ Records one iteration from the timestamps of its phases """
+        self.tx.record(rw_start - tx_start)
+        self.rw.record(rx_start - rw_start)
+        self.rx.record(sleep_start - rx_start)
+        self.sleep.record(end - sleep_start)
+        if self.__last_end is not None:
+            self.loop.record(end - self.__last_end)
+        self.__last_end = end
+
+    def reset(self) -> None:
+        for phase in LoopTimings.PHASES:
+            getattr(self, phase).reset()
+        self.__last_end = None
+
+    def summary(self) -> dict:
+        """ {phase: Histogram.summary()} """
+        return {phase: getattr(self, phase).summary() for phase in LoopTimings.PHASES}
@@ -8,18 +8,20 @@ import numpy as np
 import threading
 
 from .robot import Robot
+from .robot_configuration import RobotConfiguration
+from .realtime import apply_thread_realtime
 from .lidar import LidarBase
 
 class YDLidarX2(LidarBase):
-    def __init__(self, robot: Robot, port, chunk_size=2000):
+    def __init__(self, robot: Robot, port, chunk_size=2000, conf: RobotConfiguration = None):
         self.__robot = robot
+        self.__conf = conf
         self.__version = 1.03
         self._port = port                # string denoting the serial interface
         self._ser = None
         self._chunk_size = chunk_size    # reasonable range: 1000 ... 10000
         self._min_range = 10			 # minimal measurable distance
         self._max_range = 8000			 # maximal measurable distance
-        self._max_data = 20              # maximum number of datapoints per angle
         self._out_of_range = 32768       # indicates invalid data
         self._is_connected = False
         self._is_scanning = False
@@ -27,16 +29,17 @@ class YDLidarX2(LidarBase):
         self._availability_flag = False
         self._debug_level = 0
         self._error_cnt = 0
-        self._lock = threading.Lock()
         self._last_chunk = None
-        # 2D array capturing the distances for angles from 0 to 359
-        self._distances = np.array([[self._out_of_range for _ in range(self._max_data)] for l in range(360)], dtype=np.uint32)
-        # 1D array capturing the number of measurements for angles from 0 to 359
-        self._distances_pnt = np.array([0 for _ in range(360)], dtype=np.uint32)
         # predefined list of angle corrections for distances from 0 to 8000
         self._corrections = np.array([0.0] + [math.atan(21.8*((155.3-dist)/(155.3*dist)))*(180/math.pi) for dist in range(1, 8001)])
-        # measured distances for angles from 0 to 359
-        self._result = np.array([self._out_of_range for _ in range(360)], dtype=np.int32)
+        # measured distances for angles from 0 to 359, each chunk is a scan
+        if conf is not None:
+            super().__init__(conf.lidar_bins, self._out_of_range, np.int32, conf.lidar_raw)
+        else:
+            super().__init__(360, self._out_of_range, np.int32)
+        self._raw_samples: tuple = None
+        self.min_range = self._min_range
+        self.max_range = self._max_range
         # operating variables for plot functions
         self._org_x, self._org_y = 0, 0
         self._scale_factor = 0.2
@@ -110,6 +113,8 @@ class YDLidarX2(LidarBase):
     def _scan(self):
         """ Core routine to retrieve and decode lidar data.
             Availaility flag is set after each successful decoding process. """
+        if self.__conf is not None:
+            apply_thread_realtime(self.__robot, self.__conf, 'lidar')
         self._scan_is_active = True
         while self._is_scanning:
             # Retrieve data
@@ -117,109 +122,110 @@ class YDLidarX2(LidarBase):
             if self._last_chunk is not None:
                 data[0] = self._last_chunk + data[0]
             self._last_chunk = data.pop()
-            # Clear array for new scan
-            distances_pnt = np.array([0 for _ in range(360)], dtype=np.uint32)
-            error_cnt = 0
-            # Decode data
-            for idx, d in enumerate(data):
-                # Reasonable length of the data slice?
-                l = len(d)
-                if l < 10:
-                    error_cnt += 1
-                    if self._debug_level > 0:
-                        print("Idx:", idx, "ignored - len:", len(d))
-                    continue
-                # Get sample count and start and end angle
-                sample_cnt = d[1]
-                # Do we have any samples?
-                if sample_cnt == 0:
-                    error_cnt += 1
-                    if self._debug_level > 0:
-                        print("Idx:", idx, "ignored - sample_cnt: 0")
-                    continue
-                # Get start and end angle
-                start_angle = ((d[2] + 256 * d[3]) >> 1) / 64
-                end_angle = ((d[4] + 256 * d[5]) >> 1) / 64
- 
-                # Start data block
-                if sample_cnt == 1:
-                    dist = round((d[8] + 256*d[9]) / 4)
-                    if self._debug_level > 1:
-                        print("Start package: angle:", start_angle, "   dist:", dist)
-                    if dist > self._min_range:
-                        if dist > self._max_range: dist = self._max_range
-                        angle = round(start_angle + self._corrections[dist])
-                        if angle < 0: angle += 360
-                        if angle >= 360: angle -= 360
-                        self._distances[angle][distances_pnt[angle]] = dist
-                        if distances_pnt[angle] < self._max_data - 1:
-                            distances_pnt[angle] += 1
-                        else:
-                            if self._debug_level > 0:
-                                print("Idx:", idx, " - pointer overflow")
-                            error_cnt += 1
-
-                # Cloud data block
-                else:
-                    if start_angle == end_angle:
-                        if self._debug_level > 0:
-                            print("Idx:", idx, "ignored - start angle equals end angle for cloud package")
-                        error_cnt += 1
-                        continue
-                    if l != 8 + 2 * sample_cnt:
-                        if self._debug_level > 0:
-                            print("Idx:", idx, "ignored - len does not match sample count - len:", l, " - sample_cnt:", sample_cnt)
-                        error_cnt += 1
-                        continue
-                    if self._debug_level > 1:
-                        print("Cloud package: angle:", start_angle, "-", end_angle)
-                    if end_angle < start_angle:
-                        step_angle = (end_angle + 360 - start_angle) / (sample_cnt - 1)
-                    else:
-                        step_angle = (end_angle - start_angle) / (sample_cnt - 1)
-                    pnt = 8
-                    while pnt < l:
-                        dist = round((d[pnt] + 256*d[pnt+1]) / 4)
-                        if dist > self._min_range:
-                            if dist > self._max_range: dist = self._max_range
-                            angle = round(start_angle + self._corrections[dist])
-                            if angle < 0: angle += 360
-                            if angle >= 360: angle -= 360
-                            self._distances[angle][distances_pnt[angle]] = dist
-                            if distances_pnt[angle] < self._max_data - 1:
-                                distances_pnt[angle] += 1
-                            else:
-                                if self._debug_level > 0:
-                                    print("Idx:", idx, " - pointer overflow")
-                                error_cnt += 1
-                        start_angle += step_angle
-                        if start_angle >= 360: start_angle -= 360
-                        pnt += 2
+            error_cnt = self._decode(data)
+            self._publish_scan(self._raw_samples)
             # calculate result
             if self._debug_level > 0 and error_cnt > 0:
                 print("Error cnt:", error_cnt)
-            
-            for angle in range(360):
-                if distances_pnt[angle] == 0:
-                    self._result[angle] = self._out_of_range
-                else:
-                    self._result[angle] = self._distances[angle][:distances_pnt[angle]].mean()
             self._error_cnt = error_cnt
             self._availability_flag = True
         # end of decoding loop        
         self._scan_is_active = False
         
         
+    def _decode(self, data):
+        """ Decodes the packets of a chunk into the per-bin mean distances of the back scan buffer.
+            Packets are only validated one by one, their samples are decoded in one batch.
+            Returns the error count """
+        error_cnt = 0
+        samples = []
+        start_angles = []
+        step_angles = []
+        sample_cnts = []
+        for idx, d in enumerate(data):
+            # Reasonable length of the data slice?
+            l = len(d)
+            if l < 10:
+                error_cnt += 1
+                if self._debug_level > 0:
+                    print("Idx:", idx, "ignored - len:", len(d))
+                continue
+            # Get sample count and start and end angle
+            sample_cnt = d[1]
+            # Do we have any samples?
+            if sample_cnt == 0:
+                error_cnt += 1
+                if self._debug_level > 0:
+                    print("Idx:", idx, "ignored - sample_cnt: 0")
+                continue
+            # Get start and end angle
+            start_angle = ((d[2] + 256 * d[3]) >> 1) / 64
+            end_angle = ((d[4] + 256 * d[5]) >> 1) / 64
+
+            # Start data block
+            if sample_cnt == 1:
+                if self._debug_level > 1:
+                    print("Start package: angle:", start_angle, "   dist:", round((d[8] + 256 * d[9]) / 4))
+                samples.append(d[8:10])
+                step_angle = 0.0
+
+            # Cloud data block
+            else:
+                if start_angle == end_angle:
+                    if self._debug_level > 0:
+                        print("Idx:", idx, "ignored - start angle equals end angle for cloud package")
+                    error_cnt += 1
+                    continue
+                if l != 8 + 2 * sample_cnt:
+                    if self._debug_level > 0:
+                        print("Idx:", idx, "ignored - len does not match sample count - len:", l, " - sample_cnt:", sample_cnt)
+                    error_cnt += 1
+                    continue
+                if self._debug_level > 1:
+                    print("Cloud package: angle:", start_angle, "-", end_angle)
+                if end_angle < start_angle:
+                    step_angle = (end_angle + 360 - start_angle) / (sample_cnt - 1)
+                else:
+                    step_angle = (end_angle - start_angle) / (sample_cnt - 1)
+                samples.append(d[8:])
+            start_angles.append(start_angle)
+            step_angles.append(step_angle)
+            sample_cnts.append(sample_cnt)
+
+        if samples:
+            # little-endian words of all the samples, distance is word / 4
+            dist = np.round(np.frombuffer(b"".join(samples), dtype='<u2') / 4)
+            sample_cnts = np.array(sample_cnts)
+            # index of each sample inside its packet
+            sample_idx = np.arange(dist.size) - np.repeat(np.cumsum(sample_cnts) - sample_cnts, sample_cnts)
+            angles = np.repeat(start_angles, sample_cnts) + np.repeat(step_angles, sample_cnts) * sample_idx
+            valid = dist > self._min_range
+            dist = np.minimum(dist[valid], self._max_range).astype(np.intp)
+            angles = angles[valid] + self._corrections[dist]
+            bins = self._bin_index(angles)
+            counts = np.bincount(bins, minlength=self.bins)
+            sums = np.bincount(bins, weights=dist, minlength=self.bins)
+            result = self._back_scan
+            result.fill(self._out_of_range)
+            measured = counts > 0
+            result[measured] = sums[measured] / counts[measured]
+            if self.raw:
+                # X2 gives no intensities
+                self._raw_samples = ((angles % 360).astype(np.float32), dist.astype(np.uint16), None)
+        else:
+            self._back_scan.fill(self._out_of_range)
+            if self.raw:
+                self._raw_samples = (np.empty(0, np.float32), np.empty(0, np.uint16), None)
+        return error_cnt
+
     def get_data(self):
-        """ Returns an array of distance data (360 values, one for each degree).
+        """ Returns an array of distance data (one value for each bin, 360 by default).
             Resets availability flag"""
         if not self._is_scanning:
             pass
             # warnings.warn("get_data: Lidar is not scanning", RuntimeWarning)
-        self._lock.acquire()
-        distances = self._result.copy()
+        distances = self.get_scan().ranges
         self._availability_flag = False
-        self._lock.release()
         return distances
     
     
@@ -239,11 +245,9 @@ class YDLidarX2(LidarBase):
             pass
             # warnings.warn("get_sectors40: Lidar is not scanning", RuntimeWarning)
        
-        self._lock.acquire()
-        sectors = np.array([self._result[_ * 9 : _ * 9 + 9].min() for _ in range(40)])
+        sectors = self.__sectors(40)
         sectors[sectors > self._max_range] = self._min_range
         self._availability_flag = False
-        self._lock.release()
         return sectors
     
     
@@ -263,13 +267,15 @@ class YDLidarX2(LidarBase):
             pass
             # warnings.warn("get_sectors20: Lidar is not scanning", RuntimeWarning)
         
-        self._lock.acquire()
-        sectors = np.array([self._result[_ * 18 : _ * 18 + 18].min() for _ in range(20)])
+        sectors = self.__sectors(20)
         sectors[sectors > self._max_range] = self._min_range
         self._availability_flag = False
-        self._lock.release()
         return sectors        
 
+    def __sectors(self, count):
+        """ Minimum distances of count equal sectors of the latest scan """
+        return np.minimum.reduceat(self.get_scan().ranges, np.arange(count) * self.bins // count)
+
     def _xy_coords(self, dist, angle):
         """ Calculates a coordinate on the canvas """
         angle = round(angle)
@@ -1,10 +1,7 @@
-import struct
-import time
-from threading import Thread
-
 from .common.robot import Robot
 from .common.connection_base import ConnectionBase
 from .common.connection_sim import ConnectionSim
+from .common.channel_codec import ChannelMap, ChannelCodec, Register, RegisterKinds, registers
 from .common.robot_configuration import DefaultCommonConfiguration
 
 
@@ -58,9 +55,12 @@ class CommonRobotInternal:
         self.led_3: bool = False
         self.servo_values: list = [0.0] * 10
 
+        # id of the simulator frame the sensor values came from
+        self.sensors_tick: int = 0
+
         self.__connection: ConnectionBase = None
         if not self.__robot.on_real_robot:
-            self.__connection = ConnectionSim(self.__robot)
+            self.__connection = ConnectionSim(self.__robot, conf)
             self.__robocad_conn = RobocadConnection()
             self.__robocad_conn.start(self.__connection, self.__robot, self)
         else:
@@ -75,6 +75,15 @@ class CommonRobotInternal:
     def get_camera(self):
         return self.__connection.get_camera()
 
+    def subscribe_camera(self, max_fps: float = None):
+        self.__connection.subscribe_camera(max_fps)
+
+    def unsubscribe_camera(self):
+        self.__connection.unsubscribe_camera()
+
+    def step(self):
+        self.__connection.step()
+
     def set_servo_angle(self, angle: float, pin: int):
         dut: float = 0.000666 * angle + 0.05
         self.servo_values[pin] = dut
@@ -85,11 +94,22 @@ class CommonRobotInternal:
 
     def disable_servo(self, pin: int):
         self.servo_values[pin] = 0.0
-    
+
+
+COMMON_CHANNEL = ChannelMap(
+    commands=registers('speed_motor_{}', 'f', 8) +
+    registers('servo_values[{}]', 'f', 10) +
+    registers('led_{}', 'f', 4, kind=RegisterKinds.FLAG),
+    sensors=registers('enc_motor_{}', 'i', 8) +
+    registers('ultrasound_{}', 'f', 4, first=1) +
+    registers('analog_{}', 'H', 8, first=1) +
+    [Register('yaw', 'f')] +
+    registers('button_{}', 'B', 8, kind=RegisterKinds.FLAG))
+
+
 class RobocadConnection:
     def __init__(self):
-        self.__update_thread = None
-        self.__stop_update_thread = False
+        self.__connection: ConnectionSim = None
 
     def start(self, connection: ConnectionSim, robot: Robot, robot_internal: CommonRobotInternal):
         self.__connection: ConnectionSim = connection
@@ -98,86 +118,35 @@ class RobocadConnection:
 
         self.__robot.power = 12  # todo: control from ConnectionSim from robocad
 
-        self.__stop_update_thread = False
-        self.__update_thread = Thread(target=self.__update)
-        self.__update_thread.daemon = True
-        self.__update_thread.start()
+        self.__codec = ChannelCodec(COMMON_CHANNEL)
+        self.__sensors_tick = -1
+        # the loop (thread or asyncio) is run by the connection
+        self.__connection.start_update(self.__update)
 
     def stop(self):
-        self.__stop_update_thread = True
-        if self.__update_thread is not None:
-            self.__update_thread.join()
-    
-    def __set_data(self, values: tuple) -> None:
-        self.__connection.set_data(RobocadConnection.join_common_channel(values))
-
-    def __get_data(self) -> tuple:
-        return RobocadConnection.parse_common_channel(self.__connection.get_data())
-    
+        if self.__connection is not None:
+            self.__connection.stop_update()
+
     def __update(self):
-        while not self.__stop_update_thread:
-            # set data
-            values = [self.__robot_internal.speed_motor_0,
-                      self.__robot_internal.speed_motor_1,
-                      self.__robot_internal.speed_motor_2,
-                      self.__robot_internal.speed_motor_3,
-                      self.__robot_internal.speed_motor_4,
-                      self.__robot_internal.speed_motor_5,
-                      self.__robot_internal.speed_motor_6,
-                      self.__robot_internal.speed_motor_7]
-            values.extend(self.__robot_internal.servo_values)
-            values.append(1 if self.__robot_internal.led_0 else 0)
-            values.append(1 if self.__robot_internal.led_1 else 0)
-            values.append(1 if self.__robot_internal.led_2 else 0)
-            values.append(1 if self.__robot_internal.led_3 else 0)
-            self.__set_data(tuple(values))
-
-            # get data
-            values = self.__get_data()
-            if len(values) > 0:
-                self.__robot_internal.enc_motor_0 = values[0]
-                self.__robot_internal.enc_motor_1 = values[1]
-                self.__robot_internal.enc_motor_2 = values[2]
-                self.__robot_internal.enc_motor_3 = values[3]
-                self.__robot_internal.enc_motor_4 = values[4]
-                self.__robot_internal.enc_motor_5 = values[5]
-                self.__robot_internal.enc_motor_6 = values[6]
-                self.__robot_internal.enc_motor_7 = values[7]
-                self.__robot_internal.ultrasound_1 = values[8]
-                self.__robot_internal.ultrasound_2 = values[9]
-                self.__robot_internal.ultrasound_3 = values[10]
-                self.__robot_internal.ultrasound_4 = values[11]
-                self.__robot_internal.analog_1 = values[12]
-                self.__robot_internal.analog_2 = values[13]
-                self.__robot_internal.analog_3 = values[14]
-                self.__robot_internal.analog_4 = values[15]
-                self.__robot_internal.analog_5 = values[16]
-                self.__robot_internal.analog_6 = values[17]
-                self.__robot_internal.analog_7 = values[18]
-                self.__robot_internal.analog_8 = values[19]
-                self.__robot_internal.yaw = values[20]
-
-                self.__robot_internal.button_0 = values[21] == 1
-                self.__robot_internal.button_1 = values[22] == 1
-                self.__robot_internal.button_2 = values[23] == 1
-                self.__robot_internal.button_3 = values[24] == 1
-                self.__robot_internal.button_4 = values[25] == 1
-                self.__robot_internal.button_5 = values[26] == 1
-                self.__robot_internal.button_6 = values[27] == 1
-                self.__robot_internal.button_7 = values[28] == 1
-            
-            # задержка для слабых компов
-            time.sleep(0.004)
-    
+        # set data
+        self.__connection.set_data(self.__codec.encode(self.__robot_internal))
+
+        # get data, the same frame is not decoded again
+        data = self.__connection.get_data()
+        tick = self.__connection.data_tick
+        if tick != self.__sensors_tick and self.__codec.decode(data, self.__robot_internal):
+            self.__sensors_tick = tick
+            # id of the simulator frame the values came from
+            self.__robot_internal.sensors_tick = tick
+
     @staticmethod
     def join_common_channel(lst: tuple) -> bytes:
         if len(lst) < 22:
             return b''
-        return struct.pack('22f', *lst)
-    
+        return COMMON_CHANNEL.command_struct.pack(*lst)
+
     @staticmethod
     def parse_common_channel(data: bytes) -> tuple:
         if len(data) < 76:
             return tuple()
-        return struct.unpack('<8i4f8Hf8B', data)
-    
\ No newline at end of file
+        return COMMON_CHANNEL.sensor_struct.unpack_from(data)
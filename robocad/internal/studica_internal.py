@@ -1,15 +1,20 @@
-import struct
 import sys
 import os
 import time
 from threading import Thread
 
-from funcad.funcad import Funcad
-
 from .common.shared import LibHolder
 from .common.robot import Robot
 from .common.connection_base import ConnectionBase
 from .common.connection_sim import ConnectionSim
+from .common.packet_codec import StudicaTitanCodec, StudicaVmxCodec
+from .common.rate import Rate
+from .common.timing import LoopTimings
+from .common.bus_process import BusProcess, BusSpec
+from .common.realtime import apply_thread_realtime
+from .common.pi_blaster import PiBlasterWriter
+from .common.page_scheduler import PageScheduler, PageCounter
+from .common.channel_codec import ChannelMap, ChannelCodec, Register, RegisterKinds, registers
 from .common.connection_real import ConnectionReal
 from .common.updaters import RpiUpdater
 from .common.robot_configuration import DefaultStudicaConfiguration
@@ -63,18 +68,32 @@ class StudicaInternal:
         self.flex_7: bool = False
         self.hcdio_values: list = [0.0] * 10
 
+        # id of the simulator frame the sensor values came from
+        self.sensors_tick: int = 0
+
         self.__connection: ConnectionBase = None
+        self.__pi_blaster: PiBlasterWriter = None
         if not self.__robot.on_real_robot:
-            self.__connection = ConnectionSim(self.__robot)
+            self.__connection = ConnectionSim(self.__robot, conf)
             self.__robocad_conn = RobocadConnection()
             self.__robocad_conn.start(self.__connection, self.__robot, self)
         else:
+            self.__titan: TitanCOM = None
+            self.__vmx: VMXSPI = None
+            self.__bus: BusProcess = None
+            if conf.real_bus_process:
+                # forked before the threads of the connection are started
+                self.__bus = BusProcess()
+                self.__bus.start_bus(self.__robot, self, conf, StudicaBus)
             updater = RpiUpdater(self.__robot)
             self.__connection = ConnectionReal(self.__robot, updater, conf)
-            self.__titan = TitanCOM()
-            self.__titan.start_com(self.__connection, self.__robot, self, conf)
-            self.__vmx = VMXSPI()
-            self.__vmx.start_spi(self.__connection, self.__robot, self, conf)
+            self.__pi_blaster = PiBlasterWriter(self.__robot, conf.pi_blaster_path, conf.pi_blaster_hz)
+            self.__pi_blaster.start()
+            if self.__bus is None:
+                self.__titan = TitanCOM()
+                self.__titan.start_com(self.__connection, self.__robot, self, conf)
+                self.__vmx = VMXSPI()
+                self.__vmx.start_spi(self.__connection, self.__robot, self, conf)
 
     def stop(self):
         self.__connection.stop()
@@ -86,42 +105,70 @@ class StudicaInternal:
                 self.__titan.stop()
             if self.__vmx is not None:
                 self.__vmx.stop()
+            if self.__bus is not None:
+                self.__bus.stop()
+            if self.__pi_blaster is not None:
+                self.__pi_blaster.stop()
 
     def get_camera(self):
         return self.__connection.get_camera()
 
+    def subscribe_camera(self, max_fps: float = None):
+        self.__connection.subscribe_camera(max_fps)
+
+    def unsubscribe_camera(self):
+        self.__connection.unsubscribe_camera()
+
+    def step(self):
+        self.__connection.step()
+
     def set_servo_angle(self, angle: float, pin: int):
         dut: float = 0.000666 * angle + 0.05
         self.hcdio_values[pin] = dut
-        self.echo_to_file(str(self.HCDIO_CONST_ARRAY[pin]) + "=" + str(dut))
+        self.write_hcdio(pin, dut)
 
     def set_led_state(self, state: bool, pin: int):
         dut: float = 0.2 if state else 0.0
         self.hcdio_values[pin] = dut
-        self.echo_to_file(str(self.HCDIO_CONST_ARRAY[pin]) + "=" + str(dut))
+        self.write_hcdio(pin, dut)
 
     def set_servo_pwm(self, pwm: float, pin: int):
         dut: float = pwm
         self.hcdio_values[pin] = dut
-        self.echo_to_file(str(self.HCDIO_CONST_ARRAY[pin]) + "=" + str(dut))
+        self.write_hcdio(pin, dut)
 
     def disable_servo(self, pin: int):
         self.hcdio_values[pin] = 0.0
-        self.echo_to_file(str(self.HCDIO_CONST_ARRAY[pin]) + "=" + "0.0")
+        self.write_hcdio(pin, 0.0)
+
+    def write_hcdio(self, pin: int, dut: float):
+        """ Value is written to pi-blaster by its writer thread """
+        if self.__pi_blaster is None:
+            return None
+        self.__pi_blaster.set(self.HCDIO_CONST_ARRAY[pin], dut)
 
     def echo_to_file(self, st: str):
-        if not self.__robot.on_real_robot:
+        """ Writes a 'gpio=value' line to pi-blaster """
+        if self.__pi_blaster is None:
             return None
-        original_stdout = sys.stdout
-        with open('/dev/pi-blaster', 'w') as f:
-            sys.stdout = f  # Change the standard output to the file we created.
-            print(st)
-            sys.stdout = original_stdout  # Reset the standard output to its original value
-    
+        gpio, value = st.split('=', 1)
+        self.__pi_blaster.set(int(gpio), value.strip())
+
+
+STUDICA_CHANNEL = ChannelMap(
+    commands=registers('speed_motor_{}', 'f', 4) +
+    registers('hcdio_values[{}]', 'f', 10),
+    sensors=registers('enc_motor_{}', 'i', 4) +
+    registers('ultrasound_{}', 'f', 2, first=1) +
+    registers('analog_{}', 'H', 4, first=1) +
+    [Register('yaw', 'f')] +
+    [Register(name % i, 'B', RegisterKinds.FLAG) for i in range(4) for name in ('limit_h_%d', 'limit_l_%d')] +
+    registers('flex_{}', 'B', 8, kind=RegisterKinds.FLAG))
+
+
 class RobocadConnection:
     def __init__(self):
-        self.__update_thread = None
-        self.__stop_update_thread = False
+        self.__connection: ConnectionSim = None
 
     def start(self, connection: ConnectionSim, robot: Robot, robot_internal: StudicaInternal):
         self.__connection: ConnectionSim = connection
@@ -130,80 +177,40 @@ class RobocadConnection:
 
         self.__robot.power = 12  # todo: control from ConnectionSim from robocad
 
-        self.__stop_update_thread = False
-        self.__update_thread = Thread(target=self.__update)
-        self.__update_thread.daemon = True
-        self.__update_thread.start()
+        self.__codec = ChannelCodec(STUDICA_CHANNEL)
+        self.__sensors_tick = -1
+        # the loop (thread or asyncio) is run by the connection
+        self.__connection.start_update(self.__update)
 
     def stop(self):
-        self.__stop_update_thread = True
-        if self.__update_thread is not None:
-            self.__update_thread.join()
-    
-    def __set_data(self, values: tuple) -> None:
-        self.__connection.set_data(RobocadConnection.join_studica_channel(values))
-
-    def __get_data(self) -> tuple:
-        return RobocadConnection.parse_studica_channel(self.__connection.get_data())
-    
+        if self.__connection is not None:
+            self.__connection.stop_update()
+
     def __update(self):
-        while not self.__stop_update_thread:
-            # set data
-            values = [self.__robot_internal.speed_motor_0,
-                      self.__robot_internal.speed_motor_1,
-                      self.__robot_internal.speed_motor_2,
-                      self.__robot_internal.speed_motor_3]
-            values.extend(self.__robot_internal.hcdio_values)
-            self.__set_data(tuple(values))
-
-            # get data
-            values = self.__get_data()
-            if len(values) > 0:
-                self.__robot_internal.enc_motor_0 = values[0]
-                self.__robot_internal.enc_motor_1 = values[1]
-                self.__robot_internal.enc_motor_2 = values[2]
-                self.__robot_internal.enc_motor_3 = values[3]
-                self.__robot_internal.ultrasound_1 = values[4]
-                self.__robot_internal.ultrasound_2 = values[5]
-                self.__robot_internal.analog_1 = values[6]
-                self.__robot_internal.analog_2 = values[7]
-                self.__robot_internal.analog_3 = values[8]
-                self.__robot_internal.analog_4 = values[9]
-                self.__robot_internal.yaw = values[10]
-
-                self.__robot_internal.limit_h_0 = values[11] == 1
-                self.__robot_internal.limit_l_0 = values[12] == 1
-                self.__robot_internal.limit_h_1 = values[13] == 1
-                self.__robot_internal.limit_l_1 = values[14] == 1
-                self.__robot_internal.limit_h_2 = values[15] == 1
-                self.__robot_internal.limit_l_2 = values[16] == 1
-                self.__robot_internal.limit_h_3 = values[17] == 1
-                self.__robot_internal.limit_l_3 = values[18] == 1
-
-                self.__robot_internal.flex_0 = values[19] == 1
-                self.__robot_internal.flex_1 = values[20] == 1
-                self.__robot_internal.flex_2 = values[21] == 1
-                self.__robot_internal.flex_3 = values[22] == 1
-                self.__robot_internal.flex_4 = values[23] == 1
-                self.__robot_internal.flex_5 = values[24] == 1
-                self.__robot_internal.flex_6 = values[25] == 1
-                self.__robot_internal.flex_7 = values[26] == 1
-            
-            # задержка для слабых компов
-            time.sleep(0.004)
-    
+        # set data
+        self.__connection.set_data(self.__codec.encode(self.__robot_internal))
+
+        # get data, the same frame is not decoded again
+        data = self.__connection.get_data()
+        tick = self.__connection.data_tick
+        if tick != self.__sensors_tick and self.__codec.decode(data, self.__robot_internal):
+            self.__sensors_tick = tick
+            # id of the simulator frame the values came from
+            self.__robot_internal.sensors_tick = tick
+
     @staticmethod
     def join_studica_channel(lst: tuple) -> bytes:
         if len(lst) < 14:
             return b''
-        return struct.pack('14f', *lst)
-    
+        return STUDICA_CHANNEL.command_struct.pack(*lst)
+
     @staticmethod
     def parse_studica_channel(data: bytes) -> tuple:
         if len(data) < 52:
             return tuple()
-        return struct.unpack('<4i2f4Hf16B', data)
-    
+        return STUDICA_CHANNEL.sensor_struct.unpack_from(data)
+
+
 class TitanCOM:
     def __init__(self):
         self.__th: Thread = None
@@ -214,6 +221,12 @@ class TitanCOM:
         self.__robot: Robot = robot
         self.__robot_internal: StudicaInternal = robot_internal
         self.__conf: DefaultStudicaConfiguration = conf
+        self.__codec = StudicaTitanCodec()
+
+        self.__rate = Rate(conf.titan_hz, conf.rate_policy)
+        self.__robot.robot_info.loop_rates['titan'] = self.__rate
+        self.__timings = LoopTimings()
+        self.__robot.robot_info.loop_timings['titan'] = self.__timings
 
         self.__stop_th: bool = False
         self.__th: Thread = Thread(target=self.com_loop)
@@ -226,25 +239,25 @@ class TitanCOM:
             self.__th.join()
 
     def com_loop(self) -> None:
+        apply_thread_realtime(self.__robot, self.__conf, 'titan')
         try:
             com_result = self.__connection.com_ini(self.__conf.titan_port, self.__conf.titan_baud)
             if com_result != 0:
                 self.__robot.write_log("Failed to open COM")
                 return
 
-            start_time: int = round(time.time() * 10000)
             send_count_time: float = time.time()
             comm_counter = 0
             while not self.__stop_th:
-                tx_time: float = round(time.time() * 10000)
+                tx_time = time.perf_counter_ns()
                 tx_data = self.set_up_tx_data()
-                self.__robot.robot_info.tx_com_time_dev = round(time.time() * 10000) - tx_time
 
+                rw_time = time.perf_counter_ns()
                 rx_data: bytearray = self.__connection.com_rw(tx_data)
 
-                rx_time: float = round(time.time() * 10000)
+                rx_time = time.perf_counter_ns()
                 self.set_up_rx_data(rx_data)
-                self.__robot.robot_info.rx_com_time_dev = round(time.time() * 10000) - rx_time
+                sleep_time = time.perf_counter_ns()
 
                 comm_counter += 1
                 if time.time() - send_count_time > 1:
@@ -252,9 +265,15 @@ class TitanCOM:
                     self.__robot.robot_info.com_count_dev = comm_counter
                     comm_counter = 0
 
-                time.sleep(0.002)
-                self.__robot.robot_info.com_time_dev = round(time.time() * 10000) - start_time
-                start_time = round(time.time() * 10000)
+                self.__rate.sleep()
+                end_time = time.perf_counter_ns()
+                self.__timings.record(tx_time, rw_time, rx_time, sleep_time, end_time)
+
+                # legacy last values in 0.1 ms
+                robot_info = self.__robot.robot_info
+                robot_info.tx_com_time_dev = (rw_time - tx_time) // 100000
+                robot_info.rx_com_time_dev = (sleep_time - rx_time) // 100000
+                robot_info.com_time_dev = (end_time - tx_time) // 100000
         except Exception as e:
             self.__connection.com_stop()
             exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -263,79 +282,13 @@ class TitanCOM:
             self.__robot.write_log(str(e))
 
     def set_up_rx_data(self, data: bytearray) -> None:
-        if data[42] != 33:
-            if data[0] == 1:
-                if data[24] == 111:
-                    raw_enc_0: int = (data[2] & 0xff) << 8 | (data[1] & 0xff)
-                    raw_enc_1: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
-                    raw_enc_2: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
-                    raw_enc_3: int = (data[8] & 0xff) << 8 | (data[7] & 0xff)
-                    self.set_up_encoders(raw_enc_0, raw_enc_1, raw_enc_2, raw_enc_3)
-
-                    self.__robot_internal.limit_l_0 = Funcad.access_bit(data[9], 1)
-                    self.__robot_internal.limit_h_0 = Funcad.access_bit(data[9], 2)
-                    self.__robot_internal.limit_l_1 = Funcad.access_bit(data[9], 3)
-                    self.__robot_internal.limit_h_1 = Funcad.access_bit(data[9], 4)
-                    self.__robot_internal.limit_l_2 = Funcad.access_bit(data[9], 5)
-                    self.__robot_internal.limit_h_2 = Funcad.access_bit(data[9], 6)
-                    self.__robot_internal.limit_l_3 = Funcad.access_bit(data[10], 1)
-                    self.__robot_internal.limit_h_3 = Funcad.access_bit(data[10], 2)
-
-        else:
+        if not self.__codec.decode(data, self.__robot_internal):
             self.__robot.write_log("received wrong data " + " ".join(map(str, data)))
 
     def set_up_tx_data(self) -> bytearray:
-        tx_data: bytearray = bytearray([0] * 48)
-        tx_data[0] = 1
-
-        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.__robot_internal.speed_motor_0 / 100 * 65535)))
-        tx_data[2] = motor_speeds[2]
-        tx_data[3] = motor_speeds[3]
-
-        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.__robot_internal.speed_motor_1 / 100 * 65535)))
-        tx_data[4] = motor_speeds[2]
-        tx_data[5] = motor_speeds[3]
-
-        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.__robot_internal.speed_motor_2 / 100 * 65535)))
-        tx_data[6] = motor_speeds[2]
-        tx_data[7] = motor_speeds[3]
-
-        motor_speeds: bytearray = Funcad.int_to_4_bytes(abs(int(self.__robot_internal.speed_motor_3 / 100 * 65535)))
-        tx_data[8] = motor_speeds[2]
-        tx_data[9] = motor_speeds[3]
-
-        tx_data[10] = int('1' + ("1" if self.__robot_internal.speed_motor_0 >= 0 else "0") +
-                                ("1" if self.__robot_internal.speed_motor_1 >= 0 else "0") +
-                                ("1" if self.__robot_internal.speed_motor_2 >= 0 else "0") +
-                                ("1" if self.__robot_internal.speed_motor_3 >= 0 else "0") + '001', 2)
-
-        # third bit is for ProgramIsRunning
-        tx_data[11] = int('1' + '0100001', 2)
+        return self.__codec.encode(self.__robot_internal)
 
-        tx_data[20] = 222
 
-        return tx_data
-
-    def set_up_encoders(self, enc_0: int, enc_1: int, enc_2: int, enc_3: int) -> None:
-        self.__robot_internal.enc_motor_0 -= TitanCOM.get_normal_diff(enc_0, self.__robot_internal.raw_enc_motor_0)
-        self.__robot_internal.enc_motor_1 -= TitanCOM.get_normal_diff(enc_1, self.__robot_internal.raw_enc_motor_1)
-        self.__robot_internal.enc_motor_2 -= TitanCOM.get_normal_diff(enc_2, self.__robot_internal.raw_enc_motor_2)
-        self.__robot_internal.enc_motor_3 -= TitanCOM.get_normal_diff(enc_3, self.__robot_internal.raw_enc_motor_3)
-
-        self.__robot_internal.raw_enc_motor_0 = enc_0
-        self.__robot_internal.raw_enc_motor_1 = enc_1
-        self.__robot_internal.raw_enc_motor_2 = enc_2
-        self.__robot_internal.raw_enc_motor_3 = enc_3
-
-    @staticmethod
-    def get_normal_diff(curr: int, last: int) -> int:
-        diff: int = curr - last
-        if diff > 30000:
-            diff = -(last + (65535 - curr))
-        elif diff < -30000:
-            diff = curr + (65535 - last)
-        return diff
-    
 class VMXSPI:
     def __init__(self):
         self.__th: Thread = None
@@ -347,7 +300,15 @@ class VMXSPI:
         self.__robot_internal: StudicaInternal = robot_internal
         self.__conf: DefaultStudicaConfiguration = conf
 
-        self.__toggler: int = 0
+        self.__codec = StudicaVmxCodec()
+        self.__page_scheduler: PageScheduler = None
+        if conf.vmx_page_weights:
+            self.__page_scheduler = PageScheduler(conf.vmx_page_weights, StudicaVmxCodec.PAGES)
+        self.__page_counter = PageCounter()
+        self.__rate = Rate(conf.vmx_hz, conf.rate_policy)
+        self.__robot.robot_info.loop_rates['vmx'] = self.__rate
+        self.__timings = LoopTimings()
+        self.__robot.robot_info.loop_timings['vmx'] = self.__timings
         self.__stop_th: bool = False
         self.__th: Thread = Thread(target=self.spi_loop)
         self.__th.daemon = True
@@ -359,35 +320,42 @@ class VMXSPI:
             self.__th.join()
 
     def spi_loop(self) -> None:
+        apply_thread_realtime(self.__robot, self.__conf, 'vmx')
         try:
             spi_result = self.__connection.spi_ini(self.__conf.vmx_port, self.__conf.vmx_ch, self.__conf.vmx_speed, self.__conf.vmx_mode)
             if spi_result != 0:
                 self.__robot.write_log("Failed to open SPI")
                 return
 
-            start_time: float = round(time.time() * 10000)
             send_count_time: float = time.time()
             comm_counter = 0
             while not self.__stop_th:
-                tx_time: float = round(time.time() * 10000)
+                tx_time = time.perf_counter_ns()
                 tx_list = self.set_up_tx_data()
-                self.__robot.robot_info.tx_spi_time_dev = round(time.time() * 10000) - tx_time
 
+                rw_time = time.perf_counter_ns()
                 rx_list: bytearray = self.__connection.spi_rw(tx_list)
 
-                rx_time: float = round(time.time() * 10000)
+                rx_time = time.perf_counter_ns()
                 self.set_up_rx_data(rx_list)
-                self.__robot.robot_info.rx_spi_time_dev = round(time.time() * 10000) - rx_time
+                sleep_time = time.perf_counter_ns()
 
                 comm_counter += 1
                 if time.time() - send_count_time > 1:
+                    self.__robot.robot_info.vmx_page_rates = self.__page_counter.rates(time.time() - send_count_time)
                     send_count_time = time.time()
                     self.__robot.robot_info.spi_count_dev = comm_counter
                     comm_counter = 0
 
-                time.sleep(0.002)
-                self.__robot.robot_info.spi_time_dev = round(time.time() * 10000) - start_time
-                start_time = round(time.time() * 10000)
+                self.__rate.sleep()
+                end_time = time.perf_counter_ns()
+                self.__timings.record(tx_time, rw_time, rx_time, sleep_time, end_time)
+
+                # legacy last values in 0.1 ms
+                robot_info = self.__robot.robot_info
+                robot_info.tx_spi_time_dev = (rw_time - tx_time) // 100000
+                robot_info.rx_spi_time_dev = (sleep_time - rx_time) // 100000
+                robot_info.spi_time_dev = (end_time - tx_time) // 100000
         except (Exception, EOFError) as e:
             self.__connection.spi_stop()
             exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -396,51 +364,27 @@ class VMXSPI:
             self.__robot.write_log(str(e))
 
     def set_up_rx_data(self, data: bytearray) -> None:
-        if data[0] == 1:
-            yaw_ui: int = (data[2] & 0xff) << 8 | (data[1] & 0xff)
-            us1_ui: int = (data[4] & 0xff) << 8 | (data[3] & 0xff)
-            self.__robot_internal.ultrasound_1 = us1_ui / 100
-            us2_ui: int = (data[6] & 0xff) << 8 | (data[5] & 0xff)
-            self.__robot_internal.ultrasound_2 = us2_ui / 100
-
-            power: float = ((data[8] & 0xff) << 8 | (data[7] & 0xff)) / 100
-            self.__robot.power = power
-
-            # calc yaw unlim
-            new_yaw = (yaw_ui / 100) * (1 if Funcad.access_bit(data[9], 1) else -1)
-            self.calc_yaw_unlim(new_yaw, self.__robot_internal.yaw)
-            self.__robot_internal.yaw = new_yaw
-
-            self.__robot_internal.flex_0 = Funcad.access_bit(data[9], 2)
-            self.__robot_internal.flex_1 = Funcad.access_bit(data[9], 3)
-            self.__robot_internal.flex_2 = Funcad.access_bit(data[9], 4)
-            self.__robot_internal.flex_3 = Funcad.access_bit(data[9], 5)
-            self.__robot_internal.flex_4 = Funcad.access_bit(data[9], 6)
-        elif data[0] == 2:
-            self.__robot_internal.analog_1 = (data[2] & 0xff) << 8 | (data[1] & 0xff)
-            self.__robot_internal.analog_2 = (data[4] & 0xff) << 8 | (data[3] & 0xff)
-            self.__robot_internal.analog_3 = (data[6] & 0xff) << 8 | (data[5] & 0xff)
-            self.__robot_internal.analog_4 = (data[8] & 0xff) << 8 | (data[7] & 0xff)
-
-            self.__robot_internal.flex_5 = Funcad.access_bit(data[9], 1)
-            self.__robot_internal.flex_6 = Funcad.access_bit(data[9], 2)
-            self.__robot_internal.flex_7 = Funcad.access_bit(data[9], 3)
+        page = self.__codec.decode(data, self.__robot_internal, self.__robot)
+        if page != 0:
+            self.__page_counter.add(page)
 
     def set_up_tx_data(self) -> bytearray:
-        tx_list: bytearray = bytearray([0x00] * 10)
-
-        if self.__toggler == 0:
-            tx_list[0] = 1
-
-            tx_list[9] = 222
-        return tx_list
-
-    def calc_yaw_unlim(self, new_yaw: float, old_yaw: float):
-        delta_yaw = new_yaw - old_yaw
-        if delta_yaw < -180:
-            delta_yaw = 180 - old_yaw
-            delta_yaw += 180 + new_yaw
-        elif delta_yaw > 180:
-            delta_yaw = (180 + old_yaw) * -1
-            delta_yaw += (180 - new_yaw) * -1
-        self.__robot_internal.yaw_unlim += delta_yaw
\ No newline at end of file
+        if self.__page_scheduler is None:
+            return self.__codec.encode(self.__robot_internal)
+        return self.__codec.encode(self.__robot_internal, self.__page_scheduler.next_page())
+
+
+STUDICA_BUS = ChannelMap(
+    commands=registers('speed_motor_{}', 'd', 4),
+    sensors=registers('enc_motor_{}', 'q', 4) +
+    [Register(name % i, 'B', RegisterKinds.FLAG) for i in range(4) for name in ('limit_h_%d', 'limit_l_%d')] +
+    [Register('yaw', 'd'), Register('yaw_unlim', 'd')] +
+    registers('ultrasound_{}', 'd', 2, first=1) +
+    registers('analog_{}', 'H', 4, first=1) +
+    registers('flex_{}', 'B', 8, kind=RegisterKinds.FLAG))
+
+
+class StudicaBus(BusSpec):
+    TITAN = TitanCOM
+    VMX = VMXSPI
+    MAP = STUDICA_BUS
@@ -0,0 +1,16 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def wait_until():
+    """ Polls the condition until it is true or the timeout is over, returns the last result """
+    def wait(condition, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            result = condition()
+            if result or time.monotonic() > deadline:
+                return result
+            time.sleep(0.005)
+    return wait
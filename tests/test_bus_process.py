@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from robocad.internal.common.bus_process import BusProcess
+from robocad.internal.common.robot_configuration import DefaultStudicaConfiguration, LibEmulators
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="the bus process is forked")
+
+
+@pytest.fixture
+def bus_conf(tmp_path):
+    """ Real Studica robot with the bus process, Titan and VMX are answered by the emulator """
+    conf = DefaultStudicaConfiguration()
+    conf.lib_emulator = LibEmulators.MEMORY
+    conf.with_pi_blaster = False
+    conf.pi_blaster_path = str(tmp_path / 'pi-blaster')
+    conf.real_log_path = str(tmp_path / 'robocad.log')
+    conf.real_bus_process = True
+    conf.real_bus_shm_path = str(tmp_path / 'robocad_bus.shm')
+    return conf
+
+
+def test_values_go_through_the_bus_process(bus_conf, wait_until):
+    from robocad.studica import RobotVmxTitan
+
+    robot = RobotVmxTitan(True, bus_conf)
+    try:
+        assert len(multiprocessing.active_children()) == 1
+        robot.motor_speed_0 = 50
+        # the emulated motor turns in the child, its encoder comes back through the shared memory
+        assert wait_until(lambda: robot.motor_enc_0 > 0)
+        assert wait_until(lambda: robot.power > 0)
+        assert wait_until(lambda: robot.robot_info.com_count_dev > 0)
+    finally:
+        robot.stop()
+    assert not os.path.exists(bus_conf.real_bus_shm_path)
+    assert multiprocessing.active_children() == []
+
+
+def test_bus_process_forked_while_the_log_is_held(bus_conf, monkeypatch, wait_until):
+    """ A parent thread holds the log locks during the fork, the child logs right away and must not hang """
+    from robocad.studica import RobotVmxTitan
+
+    # the first thing the child does is to log its CPU affinity
+    bus_conf.rt_cpu_affinity = {'bus': {min(os.sched_getaffinity(0))}}
+    start_bus = BusProcess.start_bus
+
+    def start_bus_with_held_log(self, robot, *args, **kwargs):
+        held = threading.Event()
+
+        def hold_log():
+            with robot.log_lock:
+                for handler in robot.logger.handlers:
+                    handler.acquire()
+                held.set()
+                time.sleep(0.3)
+                for handler in robot.logger.handlers:
+                    handler.release()
+
+        threading.Thread(target=hold_log).start()
+        held.wait()
+        start_bus(self, robot, *args, **kwargs)
+
+    monkeypatch.setattr(BusProcess, 'start_bus', start_bus_with_held_log)
+    robot = RobotVmxTitan(True, bus_conf)
+    try:
+        robot.motor_speed_0 = 50
+        assert wait_until(lambda: robot.motor_enc_0 > 0)
+    finally:
+        robot.stop()
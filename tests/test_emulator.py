@@ -0,0 +1,85 @@
+import sys
+
+import pytest
+
+from robocad.internal.common import connection_real
+from robocad.internal.common.emulator import EmulatedBoard, EmulatorLib
+from robocad.internal.common.robot_configuration import DefaultStudicaConfiguration, DefaultAlgaritmConfiguration, \
+    LibEmulators
+
+
+@pytest.fixture(params=[LibEmulators.MEMORY, LibEmulators.PTY], ids=['memory', 'pty'])
+def board(request, monkeypatch):
+    """ Board of the robot created by the test, in memory or behind a pseudo-terminal """
+    if request.param == LibEmulators.PTY and sys.platform == 'win32':
+        pytest.skip("pty is POSIX only")
+    emulated_board = EmulatedBoard()
+    monkeypatch.setattr(connection_real, 'create_lib',
+                        lambda conf: EmulatorLib(conf.lib_holder_first_path, emulated_board,
+                                                 pty=request.param == LibEmulators.PTY))
+    return emulated_board
+
+
+def real_conf(conf, tmp_path):
+    conf.lib_emulator = LibEmulators.MEMORY
+    conf.with_pi_blaster = False
+    conf.pi_blaster_path = str(tmp_path / 'pi-blaster')
+    conf.real_log_path = str(tmp_path / 'robocad.log')
+    return conf
+
+
+def test_studica(board, tmp_path, wait_until):
+    from robocad.studica import RobotVmxTitan
+
+    board.yaw = -30.0
+    board.ultrasound[:2] = [12.5, 40.0]
+    board.analog[:4] = [100, 200, 300, 400]
+    board.limits_h[0] = True
+    robot = RobotVmxTitan(True, real_conf(DefaultStudicaConfiguration(), tmp_path))
+    try:
+        robot.motor_speed_0 = 50
+        robot.motor_speed_1 = -25
+        assert wait_until(lambda: robot.motor_enc_0 > 0 and robot.motor_enc_1 < 0)
+        assert board.speeds[0] == pytest.approx(50, abs=0.1)
+        assert board.speeds[1] == pytest.approx(-25, abs=0.1)
+
+        # VMX pages come one after another
+        assert wait_until(lambda: robot.analog_4 == 400 and robot.us_2 == 40.0)
+        assert robot.yaw == pytest.approx(-30.0)
+        assert (robot.us_1, robot.us_2) == (12.5, 40.0)
+        assert robot.power == pytest.approx(12.0)
+        # high limit of motor 0 first
+        assert wait_until(lambda: robot.titan_limits[:2] == [True, False])
+    finally:
+        robot.stop()
+
+
+def test_algaritm(board, tmp_path, wait_until):
+    from robocad.algaritm import RobotAlgaritm
+
+    board.pitch = 5.0
+    board.ultrasound = [10.0, 20.0, 30.0, 40.0]
+    board.analog = [1, 2, 3, 4, 5, 6, 7, 8]
+    board.inputs[2] = True
+    robot = RobotAlgaritm(True, real_conf(DefaultAlgaritmConfiguration(), tmp_path))
+    try:
+        robot.motor_speed_0 = 50
+        robot.additional_servo_1 = 20
+        robot.set_pid_settings(True, 1.0, 0.5, 0.25)
+        assert wait_until(lambda: robot.motor_enc_0 > 0)
+        assert board.speeds[0] == 50
+        assert wait_until(lambda: board.additional_servos[0] == 20 and board.use_pid)
+        assert board.pid == (1.0, 0.5, 0.25)
+
+        # VMX pages come one after another
+        assert wait_until(lambda: robot.analog_8 == 8 and robot.us_4 == 40.0 and robot.pitch != 0)
+        assert robot.pitch == pytest.approx(5.0)
+        assert robot.inputs[2]
+        assert robot.power == pytest.approx(12.0)
+
+        # 100 steps at 400 steps/s: busy for about a quarter of a second
+        robot.step_motor_move(1, 100, 400, True)
+        assert wait_until(lambda: robot.is_step_1_busy)
+        assert wait_until(lambda: not robot.is_step_1_busy)
+    finally:
+        robot.stop()
@@ -0,0 +1,64 @@
+import socket
+import struct
+
+import pytest
+
+from robocad.internal.common.connection_sim import ConnectionSim
+from robocad.internal.common.robot_configuration import DefaultStudicaConfiguration
+from robocad.internal.common.sim_stand_in import LockstepServerStandIn
+
+STUDICA_SENSORS = struct.Struct('<4i2f4Hf16B')
+
+
+@pytest.fixture
+def step_port(monkeypatch):
+    with socket.socket() as sct:
+        sct.bind(('127.0.0.1', 0))
+        port = sct.getsockname()[1]
+    monkeypatch.setattr(ConnectionSim, '_ConnectionSim__port_step', port)
+    return port
+
+
+@pytest.fixture
+def lockstep_robot(step_port, tmp_path):
+    """ Studica robot in lockstep with a simulator that adds the speed of motor 0 to its encoder every tick """
+    from robocad.studica import RobotVmxTitan
+
+    encoder = [0]
+
+    def simulate(commands: bytes, tick: int) -> bytes:
+        encoder[0] += int(struct.unpack_from('<f', commands)[0])
+        return STUDICA_SENSORS.pack(encoder[0], tick, 0, 0, 1.5, 2.5, 1, 2, 3, 4, 45.0, *([0] * 16))
+
+    server = LockstepServerStandIn(step_port, STUDICA_SENSORS.size, simulate)
+    server.start()
+    conf = DefaultStudicaConfiguration()
+    conf.sim_log_path = str(tmp_path / 'robocad.log')
+    conf.sim_lockstep = True
+    robot = RobotVmxTitan(False, conf)
+    yield robot, server
+    robot.stop()
+    server.close()
+
+
+def test_every_step_is_one_simulator_tick(lockstep_robot):
+    robot, server = lockstep_robot
+    for i in range(1, 101):
+        robot.step()
+        assert server.tick == i
+        assert robot.sensors_tick == i
+        assert robot.motor_enc_1 == i
+
+
+def test_commands_and_sensors_of_the_same_tick(lockstep_robot):
+    robot, server = lockstep_robot
+    robot.motor_speed_0 = 2
+    for _ in range(50):
+        robot.step()
+    robot.motor_speed_0 = 0
+    for _ in range(10):
+        robot.step()
+    # nothing is lost or applied twice between the robot and the simulator
+    assert robot.motor_enc_0 == 100
+    assert server.commands[:4] == struct.pack('<f', 0)
+    assert robot.yaw == 45.0
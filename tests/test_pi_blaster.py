@@ -0,0 +1,97 @@
+import os
+import sys
+
+import pytest
+
+from robocad.internal.common.pi_blaster import PiBlasterWriter
+from robocad.internal.common.robot_configuration import DefaultStudicaConfiguration, LibEmulators
+
+
+class LogRobot:
+    def __init__(self):
+        self.log = []
+
+    def write_log(self, s: str):
+        self.log.append(s)
+
+
+def lines(path) -> list:
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+@pytest.fixture
+def blaster_path(tmp_path):
+    path = tmp_path / 'pi-blaster'
+    path.touch()
+    return str(path)
+
+
+def test_values_of_a_pin_are_coalesced(blaster_path):
+    writer = PiBlasterWriter(LogRobot(), blaster_path)
+    writer.set(4, 0.1)
+    writer.set(17, 0.3)
+    writer.set(4, 0.2)
+    assert writer.flush()
+    assert lines(blaster_path) == ['4=0.2', '17=0.3']
+    # nothing pending, nothing written
+    assert writer.flush()
+    assert lines(blaster_path) == ['4=0.2', '17=0.3']
+    writer.stop()
+
+
+def test_writer_thread_writes_the_latest_values(blaster_path):
+    writer = PiBlasterWriter(LogRobot(), blaster_path, hz=50)
+    writer.start()
+    for i in range(1000):
+        writer.set(4, i)
+        writer.set(18, -i)
+    writer.stop()
+
+    written = lines(blaster_path)
+    # far less writes than sets, the last one of each pin is not lost
+    assert len(written) < 200
+    assert [line for line in written if line.startswith('4=')][-1] == '4=999'
+    assert [line for line in written if line.startswith('18=')][-1] == '18=-999'
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="FIFO")
+def test_fifo_without_reader_keeps_the_values(tmp_path):
+    path = str(tmp_path / 'pi-blaster')
+    os.mkfifo(path)
+    robot = LogRobot()
+    writer = PiBlasterWriter(robot, path)
+    writer.set(4, 0.1)
+    # nobody reads the FIFO: the write fails at once and is logged once
+    assert not writer.flush()
+    writer.set(17, 0.2)
+    assert not writer.flush()
+    assert len(robot.log) == 1
+
+    reader = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        writer.set(4, 0.15)
+        assert writer.flush()
+        assert sorted(os.read(reader, 1024).decode().splitlines()) == ['17=0.2', '4=0.15']
+    finally:
+        writer.stop()
+        os.close(reader)
+
+
+def test_studica_hcdio_goes_to_pi_blaster(tmp_path, blaster_path):
+    from robocad.studica import RobotVmxTitan
+
+    conf = DefaultStudicaConfiguration()
+    conf.lib_emulator = LibEmulators.MEMORY
+    conf.with_pi_blaster = False
+    conf.pi_blaster_path = blaster_path
+    conf.real_log_path = str(tmp_path / 'robocad.log')
+    robot = RobotVmxTitan(True, conf)
+    try:
+        robot.set_pwm_hcdio(0.1, 1)
+        robot.set_pwm_hcdio(0.3, 2)
+        robot.set_pwm_hcdio(0.2, 1)
+    finally:
+        robot.stop()
+    # ports 1 and 2 are GPIO 4 and 18, the latest line of a pin is its value
+    assert dict(line.split('=') for line in lines(blaster_path)) == {'4': '0.2', '18': '0.3'}
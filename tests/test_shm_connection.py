@@ -0,0 +1,124 @@
+import os
+import struct
+import sys
+import threading
+
+import pytest
+
+from robocad.internal.common.robot_configuration import DefaultStudicaConfiguration, SimTransports
+from robocad.internal.common.shm_connection import SimSharedMemory, ShmListenChannel, ShmTalkChannel
+from robocad.internal.common.sim_stand_in import ShmSimulatorStandIn
+
+STUDICA_SENSOR_SIZE = 52
+
+
+@pytest.fixture
+def shm_path(tmp_path):
+    return str(tmp_path / 'robocad_sim.shm')
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="posix file modes")
+def test_file_is_created_for_the_user_only(shm_path):
+    shm = SimSharedMemory(shm_path)
+    try:
+        assert os.stat(shm_path).st_mode & 0o777 == 0o600
+    finally:
+        shm.close()
+
+
+def test_sensor_frames_reach_the_listen_channel(shm_path):
+    stand_in = ShmSimulatorStandIn(shm_path, STUDICA_SENSOR_SIZE, with_camera=False)
+    robot_side = SimSharedMemory(shm_path)
+    try:
+        channel = ShmListenChannel(robot_side.sensor_block)
+        assert channel.snapshot() == (b'', 0)
+
+        stand_in.step(7)
+        data, seq = channel.snapshot()
+        assert len(data) == STUDICA_SENSOR_SIZE
+        assert struct.unpack_from('<i', data)[0] == 7
+        assert seq == 1
+
+        # nothing new: the same frame and seq
+        assert channel.snapshot()[1] == 1
+        stand_in.step(8)
+        data, seq = channel.snapshot()
+        assert struct.unpack_from('<i', data)[0] == 8
+        assert seq == 2
+    finally:
+        robot_side.close()
+        stand_in.close()
+
+
+def test_commands_reach_the_simulator(shm_path):
+    stand_in = ShmSimulatorStandIn(shm_path, STUDICA_SENSOR_SIZE, with_camera=False)
+    robot_side = SimSharedMemory(shm_path)
+    try:
+        channel = ShmTalkChannel(robot_side.command_block)
+        channel.push(b'\x01\x02\x03')
+        assert stand_in.commands == b'\x01\x02\x03'
+        # the same frame is not written again
+        channel.push(b'\x01\x02\x03')
+        assert channel.seq == 1
+        channel.stop_talking()
+        assert stand_in.commands == b''
+    finally:
+        robot_side.close()
+        stand_in.close()
+
+
+def test_snapshot_keeps_frame_and_seq_together(shm_path):
+    """ Every frame carries its own number, a snapshot taken while the simulator writes must match its seq """
+    stand_in = ShmSimulatorStandIn(shm_path, STUDICA_SENSOR_SIZE, with_camera=False)
+    robot_side = SimSharedMemory(shm_path)
+    stop = threading.Event()
+
+    def write():
+        tick = 0
+        while not stop.is_set():
+            tick += 1
+            stand_in.step(tick)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    try:
+        channel = ShmListenChannel(robot_side.sensor_block)
+        checked = 0
+        while checked < 2000:
+            data, seq = channel.snapshot()
+            if seq == 0:
+                continue
+            assert struct.unpack_from('<i', data)[0] == seq
+            checked += 1
+    finally:
+        stop.set()
+        writer.join()
+        robot_side.close()
+        stand_in.close()
+
+
+def test_robot_over_shared_memory(shm_path, tmp_path, wait_until):
+    from robocad.studica import RobotVmxTitan
+
+    conf = DefaultStudicaConfiguration()
+    conf.sim_log_path = str(tmp_path / 'robocad.log')
+    conf.sim_transport = SimTransports.SHARED_MEMORY
+    conf.sim_shm_path = shm_path
+    stand_in = ShmSimulatorStandIn(shm_path, STUDICA_SENSOR_SIZE)
+    simulator = threading.Thread(target=stand_in.run, args=(250, 1.5), daemon=True)
+    simulator.start()
+    robot = RobotVmxTitan(False, conf)
+    try:
+        # the first int of the stand-in sensors is its tick, decoded as the encoder of motor 0
+        assert wait_until(lambda: robot.motor_enc_0 > 0)
+        robot.motor_speed_1 = 33
+        assert wait_until(lambda: stand_in.commands[4:8] == struct.pack('<f', 33))
+
+        assert wait_until(lambda: robot.camera_image is not None)
+        image = robot.camera_image
+        assert image.shape == (480, 640, 3)
+        assert not image.flags.writeable
+    finally:
+        robot.stop()
+        simulator.join()
+        stand_in.close()